@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.file_loader import load_document_pages
+from utils.segmenter import segment_clauses, clause_chunks
+from utils.document import DocumentText
+from utils.serialization import jsonl_line
+from verifier import run_document_verifier_rules
+
+# ========== CONFIG ==========
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 2)))   # ingestion processes
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))        # documents in LLM stages at once
+BATCH_STAGES = ("rules", "briefings")   # "verifier" adds corpus similarity per clause (embeds every clause)
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".doc", ".docx", ".jpg", ".jpeg", ".png")
+# ============================
+
+
+# -----------------------------
+# Inputs & checkpoints
+# -----------------------------
+def collect_paths(source):
+    """
+    Files to process from a directory (recursive) or a manifest: a text file
+    with one path per line, or .jsonl with a "path" field per line.
+    Relative manifest paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths += [os.path.join(root, f) for f in files if f.lower().endswith(SUPPORTED_EXTENSIONS)]
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+
+def fingerprint(path):
+    """Cheap change detector used to decide whether a checkpointed result is still valid."""
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def load_checkpoints(output):
+    """path -> fingerprint of documents already written successfully to the NDJSON output."""
+    done = {}
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            if rec.get("status") == "ok":
+                done[rec["path"]] = rec.get("fingerprint")
+    return done
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def ingest(path):
+    """
+    CPU-bound stage, run in a worker process: extraction (+ OCR of scanned
+    pages), clause segmentation and rule checks.
+    """
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        doc_hash = hashlib.sha256(f.read()).hexdigest()
+    text, pages = load_document_pages(path)
+    doc = DocumentText(text)
+    segments = segment_clauses(doc)
+    rules, score = run_document_verifier_rules(text)
+    return {
+        "doc_id": doc_hash[:16],
+        "text": text,
+        "segments": segments,
+        "pages": len(pages),
+        "ocr_pages": [p["page"] for p in pages if p["ocr"]],
+        "clauses": len(segments),
+        "word_count": doc.word_count,
+        "rule_checklist": rules,
+        "sufficiency_score": score,
+        "ingest_seconds": time.perf_counter() - start,
+    }
+
+
+async def _llm_stages(doc, stages, corpus_meta):
+    # Imported here so ingestion worker processes never start an LLM client
+    from briefings import run_brief_mode_async
+    from verifier import run_document_verifier
+    from utils.embeddings import embed_texts_async
+    from utils.vector_index import build_index
+
+    out, timings = {}, {}
+    if "briefings" in stages:
+        start = time.perf_counter()
+        out["briefings"] = await run_brief_mode_async("brief mode", doc["text"], segments=doc["segments"],
+                                                      priority="batch")
+        timings["briefings"] = time.perf_counter() - start
+    if "verifier" in stages and doc["segments"]:
+        start = time.perf_counter()
+        chunks = clause_chunks(DocumentText(doc["text"]), doc["segments"])
+        embeddings = await embed_texts_async(list(chunks), priority="batch")
+        if embeddings is None:
+            raise RuntimeError("failed to embed document clauses")
+        index = build_index(embeddings.reshape(len(chunks), -1).astype("float32"), metric="l2")
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: run_document_verifier(doc["text"], chunks, index, corpus_meta,
+                                                doc_segments=doc["segments"]))
+        out["verifier"] = result["chunks"]
+        timings["verifier"] = time.perf_counter() - start
+    return out, timings
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+class BatchRun:
+    """
+    One batch over many documents: ingestion in a process pool, LLM stages
+    with bounded concurrency, one NDJSON line per document.
+
+    The output file doubles as the checkpoint: documents already written
+    with status "ok" (and unchanged since) are skipped, so re-running the
+    same command after a crash resumes where it stopped. Failed documents
+    are retried on the next run.
+    """
+
+    def __init__(self, paths, output, stages=BATCH_STAGES, workers=BATCH_WORKERS,
+                 llm_concurrency=BATCH_LLM_CONCURRENCY):
+        self.paths = list(paths)
+        self.output = output
+        self.stages = set(stages)
+        self.workers = workers
+        self.llm_concurrency = llm_concurrency
+        self.status = "pending"
+        self.total = len(self.paths)
+        self.skipped = 0
+        self.ok = 0
+        self.failed = []          # [{"path", "error"}]
+        self.pages = 0
+        self.stage_seconds = {}
+        self.started = None
+        self.finished = None
+
+    @property
+    def processed(self):
+        return self.ok + len(self.failed)
+
+    def progress(self):
+        return {"status": self.status, "total": self.total, "skipped": self.skipped,
+                "processed": self.processed, "ok": self.ok, "failed": len(self.failed)}
+
+    def report(self):
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        return {
+            **self.progress(),
+            "output": self.output,
+            "elapsed_seconds": round(elapsed, 2),
+            "docs_per_second": round(self.processed / elapsed, 3) if elapsed else 0.0,
+            "pages_per_second": round(self.pages / elapsed, 3) if elapsed else 0.0,
+            "stage_seconds": {k: round(v, 2) for k, v in self.stage_seconds.items()},
+            "failures": self.failed,
+        }
+
+    def _write(self, out, record):
+        out.write(jsonl_line(record))
+        out.flush()
+
+    async def run(self):
+        self.status = "running"
+        self.started = time.time()
+        done = load_checkpoints(self.output)
+        todo = []
+        for path in self.paths:
+            try:
+                fp = fingerprint(path)
+            except OSError as e:
+                self.failed.append({"path": path, "error": str(e)})
+                continue
+            if done.get(path) == fp:
+                self.skipped += 1
+            else:
+                todo.append((path, fp))
+
+        corpus_meta = None
+        if "verifier" in self.stages:
+            from sharding import load_corpus
+            corpus_meta = load_corpus().meta
+
+        loop = asyncio.get_running_loop()
+        llm_slots = asyncio.Semaphore(self.llm_concurrency)
+        # Backpressure: bound documents held in memory between ingestion and writing
+        pending = asyncio.Semaphore(self.workers * 2 + self.llm_concurrency)
+        os.makedirs(os.path.dirname(os.path.abspath(self.output)), exist_ok=True)
+
+        with open(self.output, "a", encoding="utf-8") as out, \
+                ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+            async def process(path, fp):
+                record = {"path": path, "fingerprint": fp}
+                try:
+                    doc = await loop.run_in_executor(pool, ingest, path)
+                    self.pages += doc["pages"]
+                    self._add_time("ingest", doc.pop("ingest_seconds"))
+                    if self.stages - {"rules"}:
+                        async with llm_slots:
+                            results, timings = await _llm_stages(doc, self.stages, corpus_meta)
+                        record.update(results)
+                        for stage, seconds in timings.items():
+                            self._add_time(stage, seconds)
+                    doc.pop("text")
+                    doc.pop("segments")
+                    record.update(doc, status="ok")
+                    self.ok += 1
+                except Exception as e:
+                    record.update(status="error", error=f"{type(e).__name__}: {e}")
+                    self.failed.append({"path": path, "error": record["error"]})
+                self._write(out, record)
+
+            async def bounded(path, fp):
+                try:
+                    await process(path, fp)
+                finally:
+                    pending.release()
+
+            tasks = []
+            for path, fp in todo:
+                await pending.acquire()
+                tasks.append(asyncio.ensure_future(bounded(path, fp)))
+            await asyncio.gather(*tasks)
+
+        self.finished = time.time()
+        self.status = "done"
+        return self.report()
+
+    def _add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+
+def print_report(report):
+    print(f"\n📊 Batch report → {report['output']}")
+    print(f"   Documents:   {report['total']} total, {report['ok']} ok, {report['failed']} failed, "
+          f"{report['skipped']} skipped (already done)")
+    print(f"   Elapsed:     {report['elapsed_seconds']:.1f}s "
+          f"({report['docs_per_second']:.2f} docs/s, {report['pages_per_second']:.2f} pages/s)")
+    for stage, seconds in report["stage_seconds"].items():
+        print(f"   {stage:<12} {seconds:.1f}s total")
+    for failure in report["failures"]:
+        print(f"   ❌ {failure['path']}: {failure['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run extraction, rule checks and briefings over many documents")
+    parser.add_argument("source", help="directory of documents, or a manifest (.txt paths / .jsonl with 'path')")
+    parser.add_argument("--output", default="batch_results.ndjson", help="NDJSON results (also the checkpoint)")
+    parser.add_argument("--stages", default=",".join(BATCH_STAGES),
+                        help="comma-separated: rules, briefings, verifier")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    args = parser.parse_args()
+
+    paths = collect_paths(args.source)
+    print(f"📂 {len(paths)} documents from {args.source}")
+    run = BatchRun(paths, args.output, stages=[s.strip() for s in args.stages.split(",") if s.strip()],
+                   workers=args.workers, llm_concurrency=args.llm_concurrency)
+    report = asyncio.run(run.run())
+    print_report(report)
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,533 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from types import SimpleNamespace
+from contextlib import contextmanager
+import numpy as np
+import faiss
+
+# ========== CONFIG ==========
+BENCH_DIR = os.getenv("BENCH_DIR", "data/benchmarks")
+BENCH_SEED = 1234
+BENCH_DIM = 768                 # embedding-001 dimensionality
+BENCH_QUERIES = 100             # queries per FAISS search case
+REGRESSION_THRESHOLD = 0.20     # compare: flag cases >20% slower (or heavier) than the baseline
+MIN_SECONDS = 0.005             # compare: timings below this are too noisy to flag
+ACCURACY_DROP = 0.02            # compare: flag OCR cases whose character accuracy fell by more than this
+PROFILES = {
+    # full needs ~8 GB RAM for the 1M-vector corpus
+    "quick": {"contract_sizes": [1_000, 100_000, 1_000_000], "scanned_pages": [4],
+              "photo_angles": [3.0], "corpus_sizes": [10_000],
+              "json_records": [10_000], "repeat": 3},
+    "full": {"contract_sizes": [1_000, 100_000, 1_000_000, 10_000_000], "scanned_pages": [4, 20],
+             "photo_angles": [0.0, 3.0, -4.5],
+             "corpus_sizes": [10_000, 100_000, 1_000_000], "json_records": [10_000, 100_000], "repeat": 5},
+}
+# ============================
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+_PARTIES = ["Acme Infrastructure Pvt Ltd", "Blue River Traders LLP", "Sunrise Logistics Limited",
+            "Mehta Textiles", "Orion Software Services Pvt Ltd", "Kaveri Agro Exports"]
+_TOPICS = ["Payment", "Term and Termination", "Confidentiality", "Governing Law and Jurisdiction", "Indemnity",
+           "Force Majeure", "Notices", "Assignment", "Warranties", "Limitation of Liability"]
+_TERMS = ["Agreement", "Services", "Effective Date", "Confidential Information", "Deliverables", "Fees"]
+_WORDS = ("the party shall within such period as may be agreed in writing and subject to the provisions of this "
+          "agreement provide notice to the other party of any claim arising under or in connection with the "
+          "services fees deliverables obligations rights remedies liability court state high supreme").split()
+
+
+def _sentence(rng, lo=15, hi=60):
+    words = rng.choices(_WORDS, k=rng.randint(lo, hi))
+    if rng.random() < 0.2:
+        words.append(f"on {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2015, 2025)}")
+    return " ".join(words).capitalize() + "."
+
+
+def _clause_block(rng, n):
+    lines = []
+    if n % 12 == 0:
+        lines.append(f"SCHEDULE {n // 12}")
+    topic = _TOPICS[n % len(_TOPICS)]
+    lines.append(f"{n}. {topic}")
+    for j in range(1, rng.randint(2, 5)):
+        lines.append(f"{n}.{j} {_sentence(rng)}")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_contract(size_bytes, seed=BENCH_SEED):
+    """
+    Contract-shaped text of about size_bytes: title, parties, recitals,
+    definitions, numbered clauses with sub-clauses, schedules, signatures.
+    Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    a, b = rng.sample(_PARTIES, 2)
+    head = [f"SERVICES AGREEMENT\nThis agreement is made on 01/04/2024 between {a} and {b}.\n",
+            "WHEREAS " + _sentence(rng) + "\n", "WHEREAS " + _sentence(rng) + "\n",
+            "1. DEFINITIONS\n"] + [f"\"{term}\" means {_sentence(rng, 8, 20)}\n" for term in _TERMS]
+    tail = (f"IN WITNESS WHEREOF the parties have signed this agreement. Subject to the jurisdiction of the "
+            f"High Court.\nSigned by {a}\nSigned by {b}\n")
+    parts, size, n = head, sum(map(len, head)) + len(tail), 1
+    while size < size_bytes:
+        n += 1
+        block = _clause_block(rng, n)
+        parts.append(block)
+        size += len(block)
+    parts.append(tail)
+    return "".join(parts)
+
+
+def synthetic_scanned_pdf(path, pages, seed=BENCH_SEED, dpi=100):
+    """Image-only PDF (no text layer), like a scanned contract; returns the text drawn on each page."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images, texts = [], []
+    width, height = int(8.27 * dpi), int(11.69 * dpi)   # A4
+    for _ in range(pages):
+        lines = [_sentence(rng, 8, 14) for _ in range(height // 24 - 4)]
+        img = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(img)
+        for i, line in enumerate(lines):
+            draw.text((40, 40 + 24 * i), line, fill=0)
+        images.append(img)
+        texts.append("\n".join(lines))
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return texts
+
+
+def synthetic_photo(angle=3.0, seed=BENCH_SEED, size=(3000, 4000)):
+    """
+    12 MP phone photo of a printed page: slightly rotated, lit unevenly
+    (darker towards one side) and noisy. Returns (RGB image, text drawn).
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    width, height = size
+    font = ImageFont.load_default(size=40)
+    lines = [_sentence(rng, 6, 9) for _ in range((height - 600) // 60)]
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((300, 300 + 60 * i), line, fill=0, font=font)
+    img = img.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+    pixels = np.asarray(img, dtype=np.float32) * np.linspace(0.55, 1.0, width, dtype=np.float32)[None, :]
+    pixels += np.random.default_rng(seed).normal(0, 8, pixels.shape).astype(np.float32)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB"), "\n".join(lines)
+
+
+def char_accuracy(text, truth):
+    """Similarity of OCR output to the ground truth, ignoring whitespace layout (1.0 = identical)."""
+    from difflib import SequenceMatcher
+    return round(SequenceMatcher(None, " ".join(text.split()), " ".join(truth.split()), autojunk=False).ratio(), 4)
+
+
+def synthetic_payloads(records, seed=BENCH_SEED):
+    """
+    JSON payloads shaped like the real ones, for `records` corpus records:
+    corpus metadata (faiss_index.bin.meta.json), a verifier result with
+    three similar cases per chunk, and embeddings.jsonl lines (768-d).
+    """
+    rng = random.Random(seed)
+    texts = [" ".join(_sentence(rng) for _ in range(6)) for _ in range(records)]
+    ids = [f"case-{i}" for i in range(records)]
+    meta = {"ids": ids, "texts": texts, "duplicates": {}, "index_config": {"quantize": "flat", "pca": None}}
+    chunks = records // 10
+    verifier = {"sufficiency_score": 0.8, "rule_checklist": {"parties": True, "signatures": True, "dates": False},
+                "chunks": [{"chunk_index": i, "heading": f"{i}. {_TOPICS[i % len(_TOPICS)]}", "kind": "clause",
+                            "similar_cases": [{"id": ids[j], "summary": texts[j][:300] + "...",
+                                               "similarity_score": rng.random()}
+                                              for j in rng.sample(range(records), 3)]}
+                           for i in range(chunks)]}
+    vectors = random_vectors(min(records, 2_000))
+    lines = [json.dumps({"id": ids[i], "text": texts[i], "embedding": vectors[i].tolist()})
+             for i in range(len(vectors))]
+    return {"meta": meta, "verifier": verifier, "embeddings": lines}
+
+
+def random_vectors(n, dim=BENCH_DIM, seed=BENCH_SEED):
+    """Unit-norm float32 vectors standing in for corpus embeddings."""
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+# -----------------------------
+# Offline backends
+# -----------------------------
+class FakeLLM:
+    """
+    Stand-in for Gemini: deterministic embeddings (seeded by the text) and a
+    canned JSON briefing, with an optional fixed latency per call.
+    """
+
+    def __init__(self, dim=BENCH_DIM, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def vector(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim, dtype=np.float32)
+
+    def embed(self, content):
+        time.sleep(self.latency)
+        if isinstance(content, str):
+            return {"embedding": self.vector(content).tolist()}
+        return {"embedding": [self.vector(t).tolist() for t in content]}
+
+    def generate(self, prompt):
+        time.sleep(self.latency)
+        return json.dumps({"document": {"summary": prompt[-200:], "key_sections": []}})
+
+
+def _render_pdf_pages(path, dpi=200, first_page=None, last_page=None):
+    """pdf2image.convert_from_path replacement rendering with pypdfium2 (no poppler needed)."""
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(path)
+    try:
+        last = last_page or len(pdf)
+        return [pdf[i].render(scale=dpi / 72).to_pil() for i in range((first_page or 1) - 1, last)]
+    finally:
+        pdf.close()
+
+
+@contextmanager
+def fake_backends(llm, ocr_text="Signed by the parties."):
+    """
+    Route Gemini calls (through the shared LLM client) and OCR to offline
+    fakes for the duration of the block. Page rasterization stays real.
+    """
+    from llm_client import llm_client
+    from utils import file_loader
+
+    def image_to_string(img, lang="eng", **kwargs):
+        img.convert("L").getextrema()  # touch every pixel, as a real OCR pass would
+        return ocr_text
+
+    saved = file_loader.pytesseract, file_loader.convert_from_path
+    llm_client._generate_blocking = lambda prompt, model, timeout, key=None: llm.generate(prompt)
+    llm_client._embed_blocking = lambda content, task_type, model, timeout, key=None: llm.embed(content)
+    file_loader.pytesseract = SimpleNamespace(image_to_string=image_to_string)
+    file_loader.convert_from_path = _render_pdf_pages
+    try:
+        yield
+    finally:
+        del llm_client._generate_blocking, llm_client._embed_blocking
+        file_loader.pytesseract, file_loader.convert_from_path = saved
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def measure(fn, repeat=3):
+    """
+    Median / min wall time over `repeat` runs, then peak traced memory
+    (Python + NumPy allocations) from one extra run under tracemalloc.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "min_seconds": min(times), "runs": repeat,
+            "peak_mb": round(peak / 1e6, 3)}
+
+
+def _size_label(n, unit=""):
+    for factor, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if n >= factor:
+            return f"{n / factor:g}{suffix}{unit}"
+    return f"{n}{unit}"
+
+
+# -----------------------------
+# Cases: (name, fn, repeat)
+# -----------------------------
+def contract_cases(sizes, repeat, llm, workdir):
+    from utils.helpers import chunk_text
+    from utils.document import DocumentText
+    from utils.segmenter import segment_clauses, clause_chunks
+    from utils.file_loader import load_document_pages
+    from utils.vector_index import build_index
+    from verifier import run_document_verifier, run_document_verifier_rules
+    from rules import run_rule_checks
+
+    faiss_docs = {"ids": [f"case-{i}" for i in range(10_000)],
+                  "texts": [_sentence(random.Random(i)) for i in range(10_000)]}
+    for size in sizes:
+        label = _size_label(size, "B")
+        n = repeat if size < 5_000_000 else 1
+        text = synthetic_contract(size)
+        path = os.path.join(workdir, f"contract-{label}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        yield f"load_document/txt-{label}", lambda: load_document_pages(path), n
+        yield f"chunk_text/{label}", lambda: chunk_text(text, max_words=500, overlap=50), n
+        yield f"segment_clauses/{label}", lambda: segment_clauses(DocumentText(text)), n
+        yield f"verifier_rules/{label}", lambda: run_document_verifier_rules(text), n
+        yield f"rule_checks/{label}", lambda: run_rule_checks(text), n
+
+        doc = DocumentText(text)
+        segments = segment_clauses(doc)
+        chunks = clause_chunks(doc, segments)
+        embeddings = np.stack([llm.vector(c) for c in chunks])
+        index = build_index(embeddings, metric="l2")
+        yield (f"verifier/{label}",
+               lambda: run_document_verifier(text, chunks, index, faiss_docs, doc_segments=segments), n)
+
+
+def scanned_cases(page_counts, repeat, workdir):
+    from utils.file_loader import load_document_pages
+
+    for pages in page_counts:
+        path = os.path.join(workdir, f"scanned-{pages}p.pdf")
+        synthetic_scanned_pdf(path, pages)
+        yield f"load_document/scanned-{pages}p", lambda: load_document_pages(path), max(1, repeat // 2)
+
+
+def ocr_cases(angles, repeat):
+    """
+    Image preprocessing on phone photos, and, where Tesseract is installed,
+    OCR of the raw vs preprocessed photo with character accuracy against the
+    text drawn (a 4th tuple element adds those metrics to the result).
+    """
+    from utils.ocr_preprocess import preprocess
+
+    try:
+        import pytesseract  # the real one: fake_backends only patches utils.file_loader's reference
+    except ImportError:
+        pytesseract = None
+    tesseract = pytesseract is not None and shutil.which("tesseract") is not None
+    for angle in angles:
+        label = f"photo-12MP-{angle:g}deg"
+        img, truth = synthetic_photo(angle)
+        yield f"ocr_preprocess/{label}", lambda: preprocess(img, "photo"), repeat
+        if not tesseract:
+            continue
+        for variant, source in (("raw", "none"), ("preprocessed", "photo")):
+            ocr = lambda: pytesseract.image_to_string(preprocess(img, source), lang="eng")
+            yield f"ocr/{label}-{variant}", ocr, 1, lambda: {"char_accuracy": char_accuracy(ocr(), truth)}
+
+
+def corpus_cases(sizes, repeat):
+    from utils.vector_index import build_index
+
+    queries = random_vectors(BENCH_QUERIES, seed=BENCH_SEED + 1)
+    for size in sizes:
+        label = _size_label(size)
+        n = repeat if size < 500_000 else 1
+        vectors = random_vectors(size)
+        yield f"faiss_build/{label}", lambda: build_index(vectors, metric="ip"), n
+        index = build_index(vectors, metric="ip")
+        yield f"faiss_search/{label}x{BENCH_QUERIES}", lambda: index.search(queries, 10), n
+        del vectors
+
+
+def serialization_cases(sizes, repeat):
+    """
+    Parse / serialize time of real-size payloads through utils.serialization
+    (orjson when installed) next to stdlib json, and response compression
+    (gzip / brotli) of the verifier payload with the compressed size.
+    """
+    import gzip
+    from utils import serialization
+    from utils.responses import GZIP_LEVEL, BROTLI_QUALITY, brotli
+
+    backends = {"stdlib": (lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8"), json.loads)}
+    if serialization.JSON_BACKEND != "json":
+        backends[serialization.JSON_BACKEND] = (serialization.dumps_bytes, serialization.loads)
+    for records in sizes:
+        payloads = synthetic_payloads(records)
+        label = _size_label(records)
+        for name in ("meta", "verifier"):
+            obj = payloads[name]
+            encoded = backends["stdlib"][0](obj)
+            size = {"bytes": len(encoded)}
+            for backend, (dumps, loads) in backends.items():
+                yield f"json_dumps/{name}-{label}-{backend}", lambda: dumps(obj), repeat, lambda: size
+                yield f"json_loads/{name}-{label}-{backend}", lambda: loads(encoded), repeat, lambda: size
+        lines = payloads["embeddings"]
+        for backend, (_, loads) in backends.items():
+            yield (f"json_loads/embeddings-jsonl-{_size_label(len(lines))}-{backend}",
+                   lambda: [loads(line) for line in lines], repeat)
+
+        body = serialization.dumps_bytes(payloads["verifier"])
+        compressors = {"gzip": lambda: gzip.compress(body, GZIP_LEVEL)}
+        if brotli is not None:
+            compressors["br"] = lambda: brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        for encoding, compress in compressors.items():
+            yield (f"compress/verifier-{label}-{encoding}", compress, repeat,
+                   lambda: {"bytes": len(compress()), "ratio": round(len(compress()) / len(body), 4)})
+
+
+def llm_cases(repeat):
+    """LLM-client overhead (queueing, retries policy, parsing) with the network taken out."""
+    from llm_client import llm_client
+    from briefings import run_brief_mode
+    from utils.document import DocumentText
+    from utils.segmenter import segment_clauses
+
+    text = synthetic_contract(100_000)
+    segments = segment_clauses(DocumentText(text))
+    batch = [_sentence(random.Random(i)) for i in range(100)]
+    yield "llm_embed/batch-100", lambda: llm_client.embed_sync(batch, task_type="retrieval_document"), repeat
+    yield "briefings/100kB", lambda: run_brief_mode("brief mode", text, segments=segments), repeat
+
+
+def run_suite(profile="quick", only=None, repeat=None, llm_latency=0.0):
+    from utils import serialization
+
+    config = PROFILES[profile]
+    repeat = repeat or config["repeat"]
+    llm = FakeLLM(latency=llm_latency)
+    pattern = re.compile(only) if only else None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir, fake_backends(llm):
+        groups = [
+            contract_cases(config["contract_sizes"], repeat, llm, workdir),
+            scanned_cases(config["scanned_pages"], repeat, workdir),
+            ocr_cases(config["photo_angles"], repeat),
+            serialization_cases(config["json_records"], repeat),
+            corpus_cases(config["corpus_sizes"], repeat),
+            llm_cases(repeat),
+        ]
+        for group in groups:
+            for name, fn, n, *metrics in group:
+                if pattern and not pattern.search(name):
+                    continue
+                try:
+                    results[name] = measure(fn, n)
+                    for extra in metrics:
+                        results[name].update(extra())
+                except Exception as e:
+                    results[name] = {"error": f"{type(e).__name__}: {e}"}
+                    print(f"   ❌ {name:<36} {results[name]['error']}")
+                    continue
+                r = results[name]
+                extra = "".join(f"   accuracy {v:.2%}" if key == "char_accuracy" else f"   {key} {v}"
+                                for key, v in r.items() if key not in ("seconds", "min_seconds", "runs", "peak_mb"))
+                print(f"   {name:<36} {r['seconds'] * 1000:10.2f} ms   peak {r['peak_mb']:9.2f} MB{extra}")
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "profile": profile,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "faiss": getattr(faiss, "__version__", "unknown"),
+            "vector_quantization": os.getenv("VECTOR_QUANTIZATION", "flat"),
+            "json_backend": serialization.JSON_BACKEND,
+        },
+        "results": results,
+    }
+
+
+# -----------------------------
+# Baselines
+# -----------------------------
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD, min_seconds=MIN_SECONDS):
+    """
+    Per-case time / peak-memory ratios (current ÷ baseline). A case regresses
+    when either ratio exceeds 1 + threshold (timings under min_seconds are
+    only compared on memory), or when its OCR character accuracy dropped by
+    more than ACCURACY_DROP.
+    """
+    rows, regressions = [], []
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or "error" in base or "error" in cur:
+            rows.append({"case": name, "status": "error" if "error" in cur else "new"})
+            continue
+        time_ratio = cur["seconds"] / base["seconds"] if base["seconds"] else None
+        mem_ratio = cur["peak_mb"] / base["peak_mb"] if base["peak_mb"] >= 0.1 else None
+        slower = time_ratio is not None and base["seconds"] >= min_seconds and time_ratio > 1 + threshold
+        heavier = mem_ratio is not None and mem_ratio > 1 + threshold
+        accuracy_delta = (cur["char_accuracy"] - base["char_accuracy"]
+                          if "char_accuracy" in cur and "char_accuracy" in base else None)
+        worse = accuracy_delta is not None and accuracy_delta < -ACCURACY_DROP
+        row = {"case": name, "time_ratio": time_ratio, "mem_ratio": mem_ratio, "accuracy_delta": accuracy_delta,
+               "status": "regression" if slower or heavier or worse else "ok"}
+        rows.append(row)
+        if slower or heavier or worse:
+            regressions.append(row)
+    for name in baseline["results"].keys() - current["results"].keys():
+        rows.append({"case": name, "status": "missing"})
+    return rows, regressions
+
+
+def print_comparison(rows, threshold):
+    icons = {"ok": "✅", "regression": "❌", "new": "🆕", "missing": "➖", "error": "⚠️"}
+    fmt = lambda r: f"{r:6.2f}x" if r is not None else "    - "
+    print(f"\n📊 Benchmark comparison (threshold +{threshold:.0%})")
+    for row in rows:
+        print(f"   {icons[row['status']]} {row['case']:<36} time {fmt(row.get('time_ratio'))}   "
+              f"memory {fmt(row.get('mem_ratio'))}"
+              + (f"   accuracy {row['accuracy_delta']:+.2%}" if row.get("accuracy_delta") is not None else ""))
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    """
+    python benchmark.py run                                   # quick profile → data/benchmarks/latest.json
+    python benchmark.py run --output data/benchmarks/baseline.json
+    python benchmark.py compare                               # latest vs baseline, exit 1 on regressions
+    """
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for ingestion, rules and retrieval")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run the suite and write a JSON result file")
+    run.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    run.add_argument("--only", help="regex; run only matching cases (e.g. 'faiss|chunk_text')")
+    run.add_argument("--repeat", type=int, help="timed runs per case (default from profile)")
+    run.add_argument("--llm-latency", type=float, default=0.0, help="seconds added to each fake LLM call")
+    run.add_argument("--output", default=os.path.join(BENCH_DIR, "latest.json"))
+    cmp = sub.add_parser("compare", help="compare a result file with a baseline")
+    cmp.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    cmp.add_argument("--current", default=os.path.join(BENCH_DIR, "latest.json"))
+    cmp.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(f"⏱️ Running '{args.profile}' benchmarks")
+        report = run_suite(args.profile, args.only, args.repeat, args.llm_latency)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved → {args.output}")
+        return
+
+    rows, regressions = compare(_load(args.baseline), _load(args.current), args.threshold)
+    print_comparison(rows, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) above +{args.threshold:.0%}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
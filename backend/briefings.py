@@ -1,7 +1,8 @@
-import google.generativeai as genai
 import json
 import re
 
+from llm_client import llm_client
+
 def clean_empty(d):
     if isinstance(d, dict):
         return {k: clean_empty(v) for k, v in d.items() if v not in [None, [], {}, ""]}
@@ -21,11 +22,24 @@ def extract_json(text):
     except Exception:
         return None
 
-def run_brief_mode(query: str, document_text: str, model="gemini-1.5-flash"):
-    if not document_text:
-        return None
+def clause_context(text, segments):
+    """
+    Document text as clause blocks under [bracketed] parent headings, so sections
+    can be cited by heading. Each parent heading is emitted once, not per clause.
+    Segments carry (start, end) offsets into text.
+    """
+    parts, parent = [], None
+    for seg in segments:
+        if seg["path"][:-1] != parent:
+            parent = seg["path"][:-1]
+            if parent:
+                parts.append(f"[{' › '.join(parent)}]")
+        parts.append(text[seg["start"]:seg["end"]])
+    return "\n\n".join(parts)
+
 
-    prompt = f"""
+def _brief_prompt(query: str, document_text: str):
+    return f"""
 You are a **Legal Document Briefing Assistant**.
 
 Mode: **Briefings (Structured Dictionary Mode)**.
@@ -33,7 +47,8 @@ Mode: **Briefings (Structured Dictionary Mode)**.
 Task:
 - Extract metadata: document_type, issuer, date, recipient, recipient_address, PAN, subject, reference numbers.
 - Summarize the document in plain language.
-- Extract key_sections as objects with 'section' and 'content'.
+- Extract key_sections as objects with 'section' and 'content'; when the context is split into
+  [bracketed] clause headings, use the clause heading as 'section'.
 - Include obligations, risks, definitions, and notes.
 - Remove any empty fields automatically.
 - Do NOT provide advice or recommendations.
@@ -46,15 +61,33 @@ User Query:
 {query}
 """
 
-    model_instance = genai.GenerativeModel(model)
-    response = model_instance.generate_content(prompt)
 
+def _parse_brief(text: str):
     # Try parsing JSON from the model output
-    result_json = extract_json(response.text)
+    result_json = extract_json(text)
 
     if not result_json:
         # fallback if parsing fails
-        result_json = {"document": {"summary": response.text.strip()}}
+        result_json = {"document": {"summary": text.strip()}}
+
+    return clean_empty(result_json)
 
-    result_json = clean_empty(result_json)
-    return result_json
+
+def run_brief_mode(query: str, document_text: str, model="gemini-1.5-flash", segments=None, priority="briefings"):
+    if not document_text:
+        return None
+    if segments:
+        document_text = clause_context(document_text, segments)
+    text = llm_client.generate_sync(_brief_prompt(query, document_text), model=model, priority=priority)
+    return _parse_brief(text)
+
+
+async def run_brief_mode_async(query: str, document_text: str, model="gemini-1.5-flash", segments=None,
+                               priority="briefings"):
+    """Same as run_brief_mode, without blocking the event loop."""
+    if not document_text:
+        return None
+    if segments:
+        document_text = clause_context(document_text, segments)
+    text = await llm_client.generate(_brief_prompt(query, document_text), model=model, priority=priority)
+    return _parse_brief(text)
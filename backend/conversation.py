@@ -0,0 +1,128 @@
+import os
+import asyncio
+
+from llm_client import llm_client, estimate_tokens, GEMINI_MODEL
+
+# ========== CONFIG ==========
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "1500"))  # conversation context per prompt
+CHAT_SUMMARY_TOKENS = 300      # rolling summary of older turns is kept under this
+CHAT_TURN_TOKENS = 250         # an answer is remembered up to this many tokens
+CHAT_KEEP_TURNS = 2            # newest turns never folded into the summary
+CHAT_QUERY_TURNS = 2           # earlier questions added to the retrieval query
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", str(24 * 3600)))  # idle sessions are dropped after this
+# ============================
+
+
+def _clip(text, tokens):
+    """text cut to about `tokens` tokens (estimate_tokens counts ~4 characters per token)."""
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _turn_text(turn):
+    return f"User: {turn['q']}\nAssistant: {turn['a']}"
+
+
+def render_memory(conversation, budget=CHAT_MEMORY_TOKENS):
+    """
+    Conversation context for the prompt: the rolling summary, then as many
+    of the newest turns as fit the token budget (oldest dropped first).
+    None for a new session. The size is bounded whatever the session length.
+    """
+    summary = _clip(conversation["summary"], CHAT_SUMMARY_TOKENS) if conversation["summary"] else ""
+    budget -= estimate_tokens(summary)
+    recent = []
+    for turn in reversed(conversation["turns"]):
+        text = _turn_text(turn)
+        budget -= estimate_tokens(text)
+        if budget < 0:
+            break
+        recent.append(text)
+    if not summary and not recent:
+        return None
+    parts = [f"Summary of the earlier conversation: {summary}"] if summary else []
+    return "\n\n".join(parts + recent[::-1])
+
+
+def retrieval_query(conversation, query, turns=CHAT_QUERY_TURNS):
+    """
+    Search text for a follow-up: the last few questions, then this one, so
+    "and what about clause 12?" is searched together with what it follows up on.
+    """
+    earlier = [turn["q"] for turn in conversation["turns"][-turns:]] if turns else []
+    return "\n".join(earlier + [query])
+
+
+def _summary_prompt(summary, turns):
+    words = CHAT_SUMMARY_TOKENS * 3 // 4
+    return (f"You maintain the running summary of a conversation between a user and a legal document assistant.\n"
+            f"Update the summary with the new turns. Keep the documents, clauses, parties, dates, amounts and open "
+            f"questions the user asked about; drop pleasantries. Plain text, at most {words} words.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n"
+            + "\n\n".join(_turn_text(t) for t in turns) + "\n\nUpdated summary:")
+
+
+class ConversationMemory:
+    """
+    Per-session chat memory kept in the document store (shared by all
+    workers). Each turn is stored with its answer clipped; once the verbatim
+    turns outgrow the budget, the older ones are folded into a rolling
+    summary by a background LLM call, so answering never waits for it.
+    """
+
+    def __init__(self, store, model=GEMINI_MODEL):
+        self.store = store
+        self.model = model
+        self._folding = {}  # session_id -> background summarization task
+        self.summaries = 0
+        self.summary_failures = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def load(self, session_id):
+        """{"summary", "turns", "folded", "created"} of the session (empty for a new one)."""
+        return await self._run(self.store.get_conversation, session_id)
+
+    async def record(self, session_id, question, answer):
+        """Remember a turn; start folding older turns into the summary when they no longer fit."""
+        turn = {"q": _clip(question, CHAT_TURN_TOKENS), "a": _clip(answer or "", CHAT_TURN_TOKENS)}
+        conversation = await self._run(self.store.append_turn, session_id, turn, CHAT_SESSION_TTL)
+        if self._needs_fold(conversation) and session_id not in self._folding:
+            task = asyncio.create_task(self._fold(session_id, conversation))
+            self._folding[session_id] = task
+            task.add_done_callback(lambda t: self._folding.pop(session_id) if self._folding.get(session_id) is t
+                                   else None)
+        return conversation
+
+    @staticmethod
+    def _needs_fold(conversation):
+        verbatim = sum(estimate_tokens(_turn_text(t)) for t in conversation["turns"])
+        return len(conversation["turns"]) > CHAT_KEEP_TURNS and \
+            verbatim > CHAT_MEMORY_TOKENS - CHAT_SUMMARY_TOKENS
+
+    async def _fold(self, session_id, conversation):
+        turns = conversation["turns"][:-CHAT_KEEP_TURNS]
+        try:
+            summary = await llm_client.generate(_summary_prompt(conversation["summary"], turns), model=self.model,
+                                                priority="batch")
+        except Exception as e:
+            # The turns stay verbatim (render_memory still bounds the prompt); the next turn retries
+            self.summary_failures += 1
+            print(f"⚠️ Conversation summary failed for session {session_id}: {e}")
+            return
+        upto = conversation["folded"] + len(turns)
+        await self._run(self.store.fold_turns, session_id, _clip(summary.strip(), CHAT_SUMMARY_TOKENS), upto,
+                        conversation["created"])
+        self.summaries += 1
+
+    async def forget(self, session_id):
+        """Drop the session; a summary still being written for it is cancelled (fold_turns also checks created)."""
+        task = self._folding.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+        return await self._run(self.store.delete_conversation, session_id)
+
+    def stats(self):
+        return {"summarizing": len(self._folding), "summaries": self.summaries,
+                "summary_failures": self.summary_failures}
@@ -0,0 +1,542 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+import faiss
+
+from utils.vector_index import RerankIndex
+from utils.case_fields import CaseFields, extract_fields, bitmap_params
+from utils.serialization import read_json, write_json, read_jsonl
+
+# ========== CONFIG ==========
+CORPUS_DIR = os.getenv("CORPUS_DIR", "data")
+CORPUS_NAME = "faiss_index"
+COMPACT_INTERVAL = 60        # seconds between background compaction checks
+COMPACT_MAX_DELTA = 5000     # compact once the delta holds this many records
+COMPACT_MAX_TOMBSTONES = 5000
+FILTER_CACHE_SIZE = 64       # filter bitmaps kept per generation
+# ============================
+
+# Layout inside CORPUS_DIR:
+#   faiss_index.bin / faiss_index.bin.meta.json   legacy main index (indexing.py output)
+#   faiss_index.manifest.json                     current generation, switched atomically
+#   faiss_index.g<N>.bin / .meta.json             main index of generation N
+#   faiss_index[.g<N>].bin.fields.npz             court / year / statutes / jurisdiction columns (utils/case_fields.py)
+#   faiss_index.g<N>.delta.bin / .delta.meta.json appended records not yet compacted
+#   faiss_index.g<N>.tombstones.json              deleted / superseded ids
+
+
+def _write_index_atomic(index, path):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _file_lock(path, timeout=30.0, stale_after=3600):
+    """
+    Cross-process lock via an O_EXCL lock file (works on Linux and Windows).
+    timeout=0 means try once; raises TimeoutError if the lock is busy.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, f"{os.getpid()} {time.time()}".encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.remove(path)  # holder died without cleaning up
+                    continue
+            except OSError:
+                continue
+            if time.time() >= deadline:
+                raise TimeoutError(f"Lock busy: {path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class CorpusIndex:
+    """
+    Corpus search over a large main index plus a small append-only delta.
+    New records land in the delta within seconds; deletions are
+    tombstoned; compact() folds everything into a new main generation
+    and switches the manifest atomically. Searches merge main + delta.
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR, name=CORPUS_NAME):
+        self.dir = corpus_dir
+        self.name = name
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._versions = None
+        self.load()
+
+    # -----------------------------
+    # Paths / persistence
+    # -----------------------------
+    def _path(self, suffix):
+        return os.path.join(self.dir, f"{self.name}{suffix}")
+
+    def _gen_paths(self, gen):
+        if gen == 0:  # generation 0 is the legacy indexing.py output
+            main = (self._path(".bin"), self._path(".bin.meta.json"))
+        else:
+            main = (self._path(f".g{gen}.bin"), self._path(f".g{gen}.bin.meta.json"))
+        return {
+            "index": main[0],
+            "meta": main[1],
+            "vectors": f"{main[0]}.vectors.npy",  # optional full-precision copy for re-ranking
+            "fields": f"{main[0]}.fields.npz",
+            "delta_index": self._path(f".g{gen}.delta.bin"),
+            "delta_meta": self._path(f".g{gen}.delta.meta.json"),
+            "tombstones": self._path(f".g{gen}.tombstones.json"),
+        }
+
+    def _read_generation(self):
+        manifest = self._path(".manifest.json")
+        if os.path.exists(manifest):
+            return read_json(manifest)["generation"]
+        return 0
+
+    def _watched_versions(self):
+        paths = self._gen_paths(self.generation)
+        return (_mtime(self._path(".manifest.json")), _mtime(paths["delta_meta"]), _mtime(paths["tombstones"]))
+
+    def load(self):
+        """(Re)load the current generation from disk."""
+        with self._lock:
+            self.generation = self._read_generation()
+            paths = self._gen_paths(self.generation)
+
+            self.main = None
+            self.meta = {"ids": [], "texts": []}
+            if os.path.exists(paths["index"]):
+                self.main = faiss.read_index(paths["index"])
+                if os.path.exists(paths["vectors"]):
+                    # Compressed index + memory-mapped float32 vectors for exact re-ranking
+                    self.main = RerankIndex(self.main, np.load(paths["vectors"], mmap_mode="r"), metric="ip")
+                self.meta = read_json(paths["meta"])
+            self._main_rows = None
+            self._fields = None
+            self._load_delta()
+
+    def _load_delta(self):
+        """Reload only the (small) delta and tombstones of the current generation."""
+        with self._lock:
+            paths = self._gen_paths(self.generation)
+            self.delta = None
+            self.delta_meta = {"ids": [], "texts": [], "seqs": [], "next_seq": 0, "tomb_seqs": {}}
+            if os.path.exists(paths["delta_index"]):
+                self.delta = faiss.read_index(paths["delta_index"])
+                self.delta_meta = read_json(paths["delta_meta"])
+
+            self.tombstones = set()
+            if os.path.exists(paths["tombstones"]):
+                self.tombstones = set(read_json(paths["tombstones"])["ids"])
+
+            self._tomb_selector = None
+            self._delta_fields = None
+            self._filters = {}
+            self._versions = self._watched_versions()
+
+    def refresh_if_changed(self):
+        """Cheap stat check so other processes pick up appends and compactions."""
+        versions = self._watched_versions()
+        if versions == self._versions:
+            return
+        try:
+            if versions[0] != self._versions[0]:
+                self.load()         # new generation (compaction elsewhere)
+            else:
+                self._load_delta()  # appends / deletes elsewhere
+        except FileNotFoundError:
+            # Raced with a compaction removing the old generation; retry once
+            time.sleep(0.05)
+            self.load()
+
+    def _persist_delta(self):
+        os.makedirs(self.dir, exist_ok=True)
+        paths = self._gen_paths(self.generation)
+        if self.delta is not None:
+            _write_index_atomic(self.delta, paths["delta_index"])
+        write_json(paths["delta_meta"], self.delta_meta)
+        write_json(paths["tombstones"], {"ids": sorted(self.tombstones)})
+        self._versions = self._watched_versions()
+
+    @property
+    def dim(self):
+        for idx in (self.main, self.delta):
+            if idx is not None:
+                return idx.d
+        return None
+
+    @property
+    def ntotal(self):
+        main = 0 if self.main is None else self.main.ntotal
+        return main + len(self.delta_meta["ids"]) - len(self._tombstoned_rows())
+
+    # -----------------------------
+    # Tombstones
+    # -----------------------------
+    def _rows_by_id(self):
+        if self._main_rows is None:
+            rows = {}
+            for row, case_id in enumerate(self.meta["ids"]):
+                rows.setdefault(case_id, []).append(row)
+            self._main_rows = rows
+        return self._main_rows
+
+    def _tombstoned_rows(self):
+        if not self.tombstones:
+            return []
+        rows = self._rows_by_id()
+        return [r for case_id in self.tombstones for r in rows.get(case_id, [])]
+
+    def _main_search_params(self):
+        if self._tomb_selector is None:
+            dead = self._tombstoned_rows()
+            if not dead:
+                return None
+            self._tomb_selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.array(dead, dtype="int64")))
+        return faiss.SearchParameters(sel=self._tomb_selector)
+
+    # -----------------------------
+    # Structured-field filters
+    # -----------------------------
+    def _main_fields(self):
+        if self._fields is None:
+            path = self._gen_paths(self.generation)["fields"]
+            # Corpora indexed before fields existed are extracted once, on the first filtered search
+            self._fields = CaseFields.load(path) if os.path.exists(path) else CaseFields.extract(self.meta["texts"])
+        return self._fields
+
+    def _filter_params(self, where):
+        """(main params, delta params) restricting both indexes to rows matching `where`; False = no row matches."""
+        key = tuple((field, op, tuple(values)) for field, op, values in where)
+        if key not in self._filters:
+            main = self._main_fields().mask(where) if self.main is not None else np.zeros(0, dtype=bool)
+            main[self._tombstoned_rows()] = False
+            if self._delta_fields is None:
+                self._delta_fields = CaseFields.extract(self.delta_meta["texts"])
+            delta = self._delta_fields.mask(where)
+            if len(self._filters) >= FILTER_CACHE_SIZE:
+                self._filters.pop(next(iter(self._filters)))
+            self._filters[key] = (bitmap_params(main) if main.any() else False,
+                                  bitmap_params(delta) if delta.any() else False)
+        return self._filters[key]
+
+    def field_stats(self):
+        with self._lock:
+            self.refresh_if_changed()
+            return self._main_fields().stats()
+
+    def _remove_from_delta(self, ids):
+        keep = [i for i, case_id in enumerate(self.delta_meta["ids"]) if case_id not in ids]
+        if len(keep) == len(self.delta_meta["ids"]):
+            return
+        vectors = self.delta.reconstruct_n(0, self.delta.ntotal)[keep]
+        self.delta.reset()
+        if len(keep):
+            self.delta.add(vectors)
+        for key in ("ids", "texts", "seqs"):
+            self.delta_meta[key] = [self.delta_meta[key][i] for i in keep]
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def append(self, ids, texts, embeddings):
+        """
+        Append (or replace) records. Older versions of the same ids are
+        tombstoned in the main index and dropped from the delta.
+        """
+        vectors = np.array(embeddings, dtype="float32").reshape(len(ids), -1)
+        faiss.normalize_L2(vectors)
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, _file_lock(self._path(".write.lock")):
+            self.refresh_if_changed()
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != corpus dim {self.dim}")
+            if self.delta is None:
+                self.delta = faiss.IndexFlatIP(vectors.shape[1])
+
+            replaced = self._existing(set(ids))
+            seq = self.delta_meta["next_seq"]
+            self._remove_from_delta(replaced)
+            self._tombstone(replaced, seq)
+
+            self.delta.add(vectors)
+            self.delta_meta["ids"].extend(ids)
+            self.delta_meta["texts"].extend(texts)
+            self.delta_meta["seqs"].extend(range(seq, seq + len(ids)))
+            self.delta_meta["next_seq"] = seq + len(ids)
+            self._persist_delta()
+
+    def delete(self, ids):
+        ids = set(ids)
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, _file_lock(self._path(".write.lock")):
+            self.refresh_if_changed()
+            ids = self._existing(ids)
+            if self.delta is not None:
+                self._remove_from_delta(ids)
+            self._tombstone(ids, self.delta_meta["next_seq"])
+            self.delta_meta["next_seq"] += 1
+            self._persist_delta()
+
+    def _existing(self, ids):
+        """The ids that have a row in main or delta (only those need a tombstone)."""
+        return {case_id for case_id in ids if case_id in self._rows_by_id()} | (ids & set(self.delta_meta["ids"]))
+
+    def _tombstone(self, ids, seq):
+        """
+        Tombstone ids, journaling the write sequence number: a compaction
+        re-applies the tombstones written after its snapshot even for ids
+        that were already tombstoned when it started.
+        """
+        self.tombstones |= ids
+        journal = self.delta_meta.setdefault("tomb_seqs", {})
+        for case_id in ids:
+            journal[case_id] = seq
+        self._tomb_selector = None
+        self._delta_fields = None
+        self._filters = {}
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def search_embeddings(self, q_emb, k=5, where=None):
+        """
+        Search main + delta with query embeddings; returns one hit list per query.
+        where: parsed filter (utils.case_fields.parse_filter), applied inside
+        FAISS as an ID selector, so up to k matching hits come back.
+        """
+        queries = np.array(np.atleast_2d(q_emb), dtype="float32")
+        faiss.normalize_L2(queries)
+        with self._lock:
+            self.refresh_if_changed()
+            candidates = [[] for _ in range(len(queries))]
+            main_params, delta_params = self._filter_params(where) if where else (self._main_search_params(), None)
+
+            if self.main is not None and self.main.ntotal and main_params is not False:
+                kk = min(k, self.main.ntotal)
+                D, I = self.main.search(queries, kk, params=main_params) if main_params else \
+                    self.main.search(queries, kk)
+                for q, (scores, rows) in enumerate(zip(D, I)):
+                    candidates[q] += [(float(s), self.meta["ids"][r], self.meta["texts"][r])
+                                      for s, r in zip(scores, rows) if r >= 0]
+
+            if self.delta is not None and self.delta.ntotal and delta_params is not False:
+                kk = min(k, self.delta.ntotal)
+                D, I = self.delta.search(queries, kk, params=delta_params) if delta_params else \
+                    self.delta.search(queries, kk)
+                for q, (scores, rows) in enumerate(zip(D, I)):
+                    candidates[q] += [(float(s), self.delta_meta["ids"][r], self.delta_meta["texts"][r])
+                                      for s, r in zip(scores, rows) if r >= 0]
+
+        results = []
+        for cands in candidates:
+            cands.sort(key=lambda c: c[0], reverse=True)
+            results.append([{"id": case_id, "score": score, "text": text} for score, case_id, text in cands[:k]])
+        return results
+
+    def duplicates_of(self, case_id):
+        """Near-duplicate ids folded into case_id by the dedup pass (utils/dedup.py)."""
+        return self.meta.get("duplicates", {}).get(case_id, [])
+
+    # -----------------------------
+    # Compaction
+    # -----------------------------
+    def needs_compaction(self):
+        return (len(self.delta_meta["ids"]) >= COMPACT_MAX_DELTA
+                or len(self.tombstones) >= COMPACT_MAX_TOMBSTONES)
+
+    def compact(self):
+        """
+        Fold delta + tombstones into a new main generation. The expensive
+        rebuild runs without the lock; writes that arrive meanwhile are
+        carried over into the new generation's delta / tombstones.
+        Returns False if there was nothing to do or another process is compacting.
+        """
+        with self._compact_lock:
+            try:
+                with _file_lock(self._path(".compact.lock"), timeout=0):
+                    return self._compact()
+            except TimeoutError:
+                return False
+
+    def _compact(self):
+        with self._lock:
+            self.refresh_if_changed()
+            if not self.delta_meta["ids"] and not self.tombstones:
+                return False
+            main, meta = self.main, self.meta
+            main_fields = self._main_fields() if main is not None else None
+            dead_rows = self._tombstoned_rows()
+            snap_tombstones = set(self.tombstones)
+            snap_seq = self.delta_meta["next_seq"]
+            delta_vectors = (self.delta.reconstruct_n(0, self.delta.ntotal)
+                             if self.delta is not None and self.delta.ntotal else None)
+            delta_ids = list(self.delta_meta["ids"])
+            delta_texts = list(self.delta_meta["texts"])
+            dim = self.dim
+
+        # --- heavy part: build the next main index ---
+        base = main.index if isinstance(main, RerankIndex) else main
+        new_index = faiss.clone_index(base) if base is not None else faiss.IndexFlatIP(dim)
+        dead = set(dead_rows)
+        if dead:
+            new_index.remove_ids(faiss.IDSelectorBatch(np.array(sorted(dead), dtype="int64")))
+        new_meta = {
+            **{key: v for key, v in meta.items() if key not in ("ids", "texts", "duplicates")},
+            "ids": [c for r, c in enumerate(meta["ids"]) if r not in dead] + delta_ids,
+            "texts": [t for r, t in enumerate(meta["texts"]) if r not in dead] + delta_texts,
+        }
+        if meta.get("duplicates"):
+            # Near-duplicate provenance survives unless its representative was deleted
+            replaced = set(delta_ids)
+            new_meta["duplicates"] = {rep: dups for rep, dups in meta["duplicates"].items()
+                                      if rep not in snap_tombstones or rep in replaced}
+        if delta_vectors is not None:
+            new_index.add(delta_vectors)
+        alive_rows = [r for r in range(len(meta["ids"])) if r not in dead]
+        new_fields = CaseFields.from_records((main_fields.records(alive_rows) if main_fields else [])
+                                             + [extract_fields(t) for t in delta_texts])
+
+        new_gen = self.generation + 1
+        paths = self._gen_paths(new_gen)
+        _write_index_atomic(new_index, paths["index"])
+        write_json(paths["meta"], new_meta)
+        new_fields.save(paths["fields"])
+        if isinstance(main, RerankIndex):
+            alive = np.setdiff1d(np.arange(main.ntotal), np.fromiter(dead, dtype="int64", count=len(dead)))
+            n_delta = 0 if delta_vectors is None else len(delta_vectors)
+            tmp = f"{paths['vectors']}.tmp-{os.getpid()}.npy"
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32", shape=(len(alive) + n_delta, dim))
+            for start in range(0, len(alive), 65536):  # stream in blocks, never the whole matrix
+                block = alive[start:start + 65536]
+                out[start:start + len(block)] = main.vectors[block]
+            if n_delta:
+                out[len(alive):] = delta_vectors
+            out.flush()
+            del out
+            os.replace(tmp, paths["vectors"])
+            new_index = RerankIndex(new_index, np.load(paths["vectors"], mmap_mode="r"), main.factor, "ip")
+
+        # --- carry over concurrent writes, then switch the manifest ---
+        with self._lock, _file_lock(self._path(".write.lock")):
+            self.refresh_if_changed()  # pick up appends from other processes
+            old_gen = self.generation
+            old_paths = self._gen_paths(old_gen)
+            keep = [i for i, s in enumerate(self.delta_meta["seqs"]) if s >= snap_seq]
+            new_delta = faiss.IndexFlatIP(dim)
+            if keep:
+                new_delta.add(self.delta.reconstruct_n(0, self.delta.ntotal)[keep])
+            # Deletes / replacements written during the rebuild: the snapshot's copies of those ids were
+            # folded into the new main, so they are tombstoned again there (already tombstoned or not)
+            journal = {case_id: s for case_id, s in self.delta_meta.get("tomb_seqs", {}).items() if s >= snap_seq}
+            new_delta_meta = {
+                "ids": [self.delta_meta["ids"][i] for i in keep],
+                "texts": [self.delta_meta["texts"][i] for i in keep],
+                "seqs": [self.delta_meta["seqs"][i] for i in keep],
+                "next_seq": self.delta_meta["next_seq"],
+                "tomb_seqs": journal,
+            }
+            new_tombstones = (self.tombstones - snap_tombstones) | set(journal)
+
+            _write_index_atomic(new_delta, paths["delta_index"])
+            write_json(paths["delta_meta"], new_delta_meta)
+            write_json(paths["tombstones"], {"ids": sorted(new_tombstones)})
+            write_json(self._path(".manifest.json"), {"generation": new_gen, "created": time.time()})
+
+            self.generation = new_gen
+            self.main, self.meta = new_index, new_meta
+            self.delta, self.delta_meta = new_delta, new_delta_meta
+            self.tombstones = new_tombstones
+            self._main_rows = None
+            self._tomb_selector = None
+            self._fields, self._delta_fields, self._filters = new_fields, None, {}
+            self._versions = self._watched_versions()
+
+        # Old generation files are no longer referenced (keep the legacy gen 0 files)
+        for key, path in old_paths.items():
+            if old_gen == 0 and key in ("index", "meta", "vectors", "fields"):
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    def start_background_compaction(self, interval=COMPACT_INTERVAL):
+        """Run compact() in a daemon thread whenever the delta grows too large."""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh_if_changed()
+                    if self.needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    print(f"❌ Corpus compaction failed: {e}")
+
+        thread = threading.Thread(target=loop, name="corpus-compactor", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "main": 0 if self.main is None else self.main.ntotal,
+            "delta": len(self.delta_meta["ids"]),
+            "tombstones": len(self.tombstones),
+        }
+
+
+def main():
+    """
+    python corpus.py append embeddings_new.jsonl   # records with id, text, embedding
+    python corpus.py delete <id> [<id> ...]
+    python corpus.py compact
+    python corpus.py stats
+    """
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    corpus = CorpusIndex()
+    cmd = sys.argv[1]
+    if cmd == "append":
+        records = read_jsonl(sys.argv[2])
+        corpus.append([r["id"] for r in records],
+                      [r.get("text", "") for r in records],
+                      [r["embedding"] for r in records])
+        print(f"✅ Appended {len(records)} records to the delta index")
+    elif cmd == "delete":
+        corpus.delete(sys.argv[2:])
+        print(f"🗑️ Tombstoned {len(sys.argv) - 2} ids")
+    elif cmd == "compact":
+        done = corpus.compact()
+        print("✅ Compacted into generation", corpus.generation if done else "(nothing to do)")
+    print("📊", corpus.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+import faiss
+
+from utils.document import DocumentText
+from utils.segmenter import clause_chunks
+from utils.serialization import dumps, loads
+
+# ========== CONFIG ==========
+# Shared by every worker on the machine; point it at a shared volume to share across instances
+DOCSTORE_DIR = os.getenv("DOCSTORE_DIR", "data/docstore")
+DOCSTORE_TIMEOUT = 30.0   # seconds to wait for another worker's write lock
+# ============================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id   TEXT PRIMARY KEY,
+    filename TEXT,
+    text     TEXT NOT NULL,
+    words    BLOB NOT NULL,      -- int32 word start offsets (DocumentText.starts)
+    segments TEXT NOT NULL,      -- JSON clause segments (path, kind, start, end)
+    pages    TEXT NOT NULL,      -- JSON page offsets
+    chunks   INTEGER NOT NULL,
+    created  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    doc_id  TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    result  TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (doc_id, name)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    doc_id    TEXT PRIMARY KEY,  -- a revised document ...
+    parent_id TEXT NOT NULL,     -- ... uploaded as the next version of this one
+    changes   TEXT NOT NULL,     -- JSON clause diff against the parent (versions.diff_versions)
+    created   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_parent ON versions (parent_id);
+CREATE TABLE IF NOT EXISTS conversations (
+    session_id TEXT PRIMARY KEY,
+    summary    TEXT NOT NULL,    -- rolling summary of the folded turns
+    turns      TEXT NOT NULL,    -- JSON [{"q", "a"}] not yet folded, oldest first
+    folded     INTEGER NOT NULL, -- turns already folded into the summary
+    updated    REAL NOT NULL,
+    created    REAL NOT NULL DEFAULT 0  -- session start: a late fold of a forgotten session with the same id is dropped
+);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class DocumentStore:
+    """
+    Uploaded documents shared by all API workers and kept across restarts.
+
+    Text, word offsets, clause segments, page offsets, finished artifacts
+    and the active-document pointer live in one SQLite database (WAL mode,
+    so readers never block on a writer). Embeddings are .npy files opened
+    memory-mapped and per-document FAISS indexes are serialized next to
+    them; both are written atomically before the row that refers to them.
+
+    Every write bumps a generation counter, so a worker only has to read
+    one row per request to know whether its local copy is stale.
+    """
+
+    def __init__(self, root=DOCSTORE_DIR):
+        self.root = root
+        self.db_path = os.path.join(root, "documents.sqlite")
+        os.makedirs(os.path.join(root, "vectors"), exist_ok=True)
+        os.makedirs(os.path.join(root, "indexes"), exist_ok=True)
+        self._local = threading.local()
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            if "created" not in {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}:
+                conn.execute("ALTER TABLE conversations ADD COLUMN created REAL NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _db(self):
+        # One connection per thread, reused; `with conn` commits or rolls back
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=DOCSTORE_TIMEOUT)
+        with conn:
+            yield conn
+
+    def _vectors_path(self, doc_id):
+        return os.path.join(self.root, "vectors", f"{doc_id}.npy")
+
+    def _index_path(self, doc_id):
+        return os.path.join(self.root, "indexes", f"{doc_id}.faiss")
+
+    @staticmethod
+    def _bump(conn):
+        conn.execute("INSERT INTO state (key, value) VALUES ('generation', '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    # -----------------------------
+    # Documents
+    # -----------------------------
+    def generation(self):
+        with self._db() as conn:
+            row = conn.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def put(self, doc_id, filename, doc, segments, pages, embeddings, index):
+        """Store an ingested document (replacing an earlier copy) for every worker."""
+        tag = f"tmp-{os.getpid()}-{threading.get_ident()}"
+        vectors_tmp = f"{self._vectors_path(doc_id)}.{tag}.npy"
+        index_tmp = f"{self._index_path(doc_id)}.{tag}"
+        np.save(vectors_tmp, np.asarray(embeddings, dtype="float32"))
+        faiss.write_index(index, index_tmp)
+        os.replace(vectors_tmp, self._vectors_path(doc_id))
+        os.replace(index_tmp, self._index_path(doc_id))
+        with self._db() as conn:
+            conn.execute("DELETE FROM artifacts WHERE doc_id = ?", (doc_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, filename, text, words, segments, pages, chunks, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, filename, doc.text, np.asarray(doc.starts, dtype="int32").tobytes(),
+                 dumps(segments), dumps(pages or []), len(segments), time.time()))
+            self._bump(conn)
+
+    def list_documents(self):
+        with self._db() as conn:
+            rows = conn.execute("SELECT doc_id, filename, chunks FROM documents ORDER BY created").fetchall()
+        return [{"doc_id": d, "filename": f, "chunks": n} for d, f, n in rows]
+
+    def __contains__(self, doc_id):
+        with self._db() as conn:
+            return conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def load(self, doc_id, with_index=False):
+        """
+        A stored document: {"doc_id", "filename", "doc", "segments", "chunks",
+        "pages", "embeddings" (memory-mapped), "index" (if with_index)}, or None.
+        """
+        with self._db() as conn:
+            row = conn.execute("SELECT filename, text, words, segments, pages FROM documents WHERE doc_id = ?",
+                               (doc_id,)).fetchone()
+        if row is None:
+            return None
+        filename, text, words, segments, pages = row
+        doc = DocumentText(text, np.frombuffer(words, dtype="int32"))
+        segments = loads(segments)
+        return {
+            "doc_id": doc_id,
+            "filename": filename,
+            "doc": doc,
+            "segments": segments,
+            "chunks": clause_chunks(doc, segments),
+            "pages": loads(pages),
+            "embeddings": np.load(self._vectors_path(doc_id), mmap_mode="r"),
+            "index": faiss.read_index(self._index_path(doc_id)) if with_index else None,
+        }
+
+    def delete(self, doc_id):
+        """Remove a document everywhere. Returns False if unknown."""
+        with self._db() as conn:
+            deleted = conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            conn.execute("DELETE FROM artifacts WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM versions WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM state WHERE key = 'active_doc_id' AND value = ?", (doc_id,))
+            self._bump(conn)
+        # Workers that still map the old files keep reading them until they drop them
+        for path in (self._vectors_path(doc_id), self._index_path(doc_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return bool(deleted)
+
+    def clear(self):
+        for doc in self.list_documents():
+            self.delete(doc["doc_id"])
+        with self._db() as conn:
+            conn.execute("DELETE FROM state WHERE key = 'active_doc_id'")
+            conn.execute("DELETE FROM conversations")
+            self._bump(conn)
+
+    # -----------------------------
+    # Versions
+    # -----------------------------
+    def put_version(self, doc_id, parent_id, changes):
+        """Record doc_id as a revision of parent_id (changes: clause diff against it)."""
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO versions (doc_id, parent_id, changes, created) VALUES (?, ?, ?, ?)",
+                         (doc_id, parent_id, dumps(changes), time.time()))
+
+    def version_of(self, doc_id):
+        """{"parent_id", "changes"} if doc_id was uploaded as a revision, else None."""
+        with self._db() as conn:
+            row = conn.execute("SELECT parent_id, changes FROM versions WHERE doc_id = ?", (doc_id,)).fetchone()
+        return {"parent_id": row[0], "changes": loads(row[1])} if row else None
+
+    @staticmethod
+    def _version_entry(conn, doc_id):
+        row = conn.execute("SELECT d.filename, d.created, v.parent_id FROM documents d LEFT JOIN versions v "
+                           "ON v.doc_id = d.doc_id WHERE d.doc_id = ?", (doc_id,)).fetchone()
+        return {"doc_id": doc_id, "filename": row[0], "parent_id": row[2], "created": row[1]} if row else None
+
+    def history(self, doc_id):
+        """
+        Version chain through doc_id, whichever version is asked for: its
+        parents, then itself and all later revisions (branches included),
+        oldest first: [{"doc_id", "filename", "parent_id", "created"}].
+        """
+        ancestors, later, seen = [], [], {doc_id}
+        with self._db() as conn:
+            entry = self._version_entry(conn, doc_id)
+            if entry is None:
+                return []
+            parent_id = entry["parent_id"]
+            while parent_id and parent_id not in seen:
+                seen.add(parent_id)
+                parent = self._version_entry(conn, parent_id)
+                if parent is None:
+                    break
+                ancestors.append(parent)
+                parent_id = parent["parent_id"]
+            pending = [doc_id]
+            while pending:
+                children = conn.execute("SELECT doc_id FROM versions WHERE parent_id = ?", (pending.pop(),)).fetchall()
+                for (child_id,) in children:
+                    if child_id in seen:
+                        continue
+                    seen.add(child_id)
+                    child = self._version_entry(conn, child_id)
+                    if child is not None:
+                        later.append(child)
+                        pending.append(child_id)
+        return ancestors[::-1] + [entry] + sorted(later, key=lambda e: e["created"])
+
+    # -----------------------------
+    # Chat sessions (see conversation.py)
+    # -----------------------------
+    @staticmethod
+    def _conversation(conn, session_id):
+        row = conn.execute("SELECT summary, turns, folded, created FROM conversations WHERE session_id = ?",
+                           (session_id,)).fetchone()
+        if row is None:
+            return {"summary": "", "turns": [], "folded": 0, "created": None}
+        return {"summary": row[0], "turns": loads(row[1]), "folded": row[2], "created": row[3]}
+
+    def get_conversation(self, session_id):
+        """{"summary", "turns", "folded", "created"} of a chat session (empty if unknown)."""
+        with self._db() as conn:
+            return self._conversation(conn, session_id)
+
+    def append_turn(self, session_id, turn, ttl):
+        """Append a turn and return the updated session. Sessions idle for more than ttl seconds are dropped."""
+        now = time.time()
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # read-modify-write: another worker may append to the same session
+            conn.execute("DELETE FROM conversations WHERE updated < ?", (now - ttl,))
+            conversation = self._conversation(conn, session_id)
+            conversation["turns"].append(turn)
+            if conversation["created"] is None:
+                conversation["created"] = now
+            conn.execute("INSERT OR REPLACE INTO conversations (session_id, summary, turns, folded, updated, created) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (session_id, conversation["summary"], dumps(conversation["turns"]),
+                          conversation["folded"], now, conversation["created"]))
+        return conversation
+
+    def fold_turns(self, session_id, summary, upto, created):
+        """
+        Replace the summary and drop the turns it now covers (turn numbers
+        below upto, counted from the start of the session). A no-op if
+        another worker already folded them, or if the session was forgotten
+        since (created no longer matches).
+        """
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT turns, folded, created FROM conversations WHERE session_id = ?",
+                               (session_id,)).fetchone()
+            if row is None or row[2] != created or row[1] >= upto:
+                return False
+            turns = loads(row[0])[upto - row[1]:]
+            conn.execute("UPDATE conversations SET summary = ?, turns = ?, folded = ? WHERE session_id = ?",
+                         (summary, dumps(turns), upto, session_id))
+        return True
+
+    def delete_conversation(self, session_id):
+        with self._db() as conn:
+            return conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    # -----------------------------
+    # Active document & artifacts
+    # -----------------------------
+    def active_doc_id(self):
+        with self._db() as conn:
+            row = conn.execute("SELECT value FROM state WHERE key = 'active_doc_id'").fetchone()
+        return row[0] if row else None
+
+    def set_active(self, doc_id):
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('active_doc_id', ?)", (doc_id,))
+            self._bump(conn)
+
+    def put_artifact(self, doc_id, name, result):
+        """Store a result; dropped if the document was deleted meanwhile (returns False)."""
+        with self._db() as conn:
+            cur = conn.execute("INSERT OR REPLACE INTO artifacts (doc_id, name, result, created) "
+                               "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM documents WHERE doc_id = ?)",
+                               (doc_id, name, dumps(result), time.time(), doc_id))
+        return cur.rowcount > 0
+
+    def get_artifact(self, doc_id, name):
+        with self._db() as conn:
+            row = conn.execute("SELECT result FROM artifacts WHERE doc_id = ? AND name = ?",
+                               (doc_id, name)).fetchone()
+        return loads(row[0]) if row else None
+
+    def stats(self):
+        with self._db() as conn:
+            docs = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            stored = conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+            sessions = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        return {"documents": docs, "artifacts": stored, "chat_sessions": sessions, "generation": self.generation(),
+                "active_doc_id": self.active_doc_id()}
@@ -1,20 +1,48 @@
+import argparse
 import faiss
-import json
 import numpy as np
 
+import os
+import glob
+
+from utils.vector_index import build_index, train_pca, bytes_per_vector, compression_report, print_report
+from sharding import shard_for, load_corpus
+from utils.knn_graph import build_knn_graph, save_knn_graph, KnnGraph
+from utils.case_fields import CaseFields
+from utils.serialization import loads, read_json, write_json
+
+parser = argparse.ArgumentParser(description="Build the corpus FAISS index from embeddings.jsonl")
+parser.add_argument("--input", default="embeddings.jsonl")
+parser.add_argument("--output", default="faiss_index.bin")
+parser.add_argument("--quantize", choices=["flat", "fp16", "int8"], default="flat",
+                    help="vector storage: float32, float16 or int8 scalar quantization")
+parser.add_argument("--pca", type=int, default=0, help="reduce dimensionality with PCA trained on the corpus")
+parser.add_argument("--rerank", action="store_true",
+                    help="keep full-precision vectors on disk to re-rank the compressed index's top candidates")
+parser.add_argument("--shards", type=int, default=1,
+                    help="split the corpus into N shard indexes searched in parallel (scatter-gather)")
+parser.add_argument("--knn", type=int, default=0,
+                    help="also precompute each record's K nearest neighbours (related-case graph)")
+parser.add_argument("--report", action="store_true",
+                    help="print memory/vector and recall@k of every storage option before building")
+args = parser.parse_args()
+
 # ===============================
 # Step 1: Load embeddings.jsonl
 # ===============================
 embeddings = []
 ids = []
 texts = []
+duplicates = {}  # representative id -> near-duplicate ids skipped at embedding time
 
-with open("embeddings.jsonl", "r", encoding="utf-8") as f:
+with open(args.input, "rb") as f:
     for line in f:
-        obj = json.loads(line)
+        obj = loads(line)
         ids.append(obj["id"])
         texts.append(obj.get("text", ""))  # store original text if available
         embeddings.append(obj["embedding"])
+        if obj.get("duplicates"):
+            duplicates[obj["id"]] = obj["duplicates"]
 
 embeddings = np.array(embeddings, dtype="float32")
 print(f"✅ Loaded {len(embeddings)} embeddings with dimension {embeddings.shape[1]}")
@@ -27,44 +55,125 @@ dimension = embeddings.shape[1]
 # Normalize embeddings for cosine similarity (better for semantic search)
 faiss.normalize_L2(embeddings)
 
-index = faiss.IndexFlatIP(dimension)
-index.add(embeddings)
-print(f"✅ FAISS index built with {index.ntotal} vectors")
-
-# ===============================
-# Step 3: Save FAISS index + Metadata
-# ===============================
-faiss.write_index(index, "faiss_index.bin")
-
-metadata = {
-    "ids": ids,
-    "texts": texts
-}
-
-with open("faiss_index.bin.meta.json", "w", encoding="utf-8") as f:
-    json.dump(metadata, f, ensure_ascii=False, indent=2)
-
-print("💾 Saved index as faiss_index.bin and metadata as faiss_index.bin.meta.json")
-
-# ===============================
-# Step 4: Example Query
-# ===============================
-index = faiss.read_index("faiss_index.bin")
-
-query = embeddings[0].reshape(1, -1)
-
-k = 5
-scores, neighbors = index.search(query, k)
-
-print("\n🔎 Example Query:")
-print("Nearest neighbor indices:", neighbors[0])
-print("Scores:", scores[0])
-
-with open("faiss_index.bin.meta.json", "r", encoding="utf-8") as f:
-    meta = json.load(f)
-
-neighbor_ids = [meta["ids"][i] for i in neighbors[0]]
-neighbor_texts = [meta["texts"][i] for i in neighbors[0]]
-
-print("Neighbor IDs:", neighbor_ids)
-print("Neighbor Texts:", neighbor_texts)
+if args.report:
+    print("\n📊 Compression report (vs exact float32 index):")
+    pca_dims = (None, args.pca) if args.pca else (None, dimension // 2, dimension // 4)
+    print_report(compression_report(embeddings, pca_dims=pca_dims, metric="ip"))
+    print()
+
+pca = None
+if args.pca:
+    pca = train_pca(embeddings, args.pca)
+    faiss.write_VectorTransform(pca, args.output.replace(".bin", ".pca.bin"))
+    print(f"✅ Trained PCA {dimension} → {args.pca}")
+
+
+def clear_generations(output):
+    """A fresh build replaces earlier compacted generations, deltas, tombstones (see corpus.py) and k-NN graph."""
+    name = output[:-len(".bin")] if output.endswith(".bin") else output
+    for path in (glob.glob(f"{name}.g*") + glob.glob(f"{name}.manifest.json") + glob.glob(f"{name}.s*")
+                 + glob.glob(f"{name}.knn.*")):
+        os.remove(path)
+
+
+def save_index(index, output, rows):
+    """Write an index with its metadata (and full-precision vectors with --rerank)."""
+    faiss.write_index(index, output)
+    metadata = {
+        "ids": [ids[i] for i in rows],
+        "texts": [texts[i] for i in rows],
+        "duplicates": {ids[i]: duplicates[ids[i]] for i in rows if ids[i] in duplicates},
+        "index_config": {"quantize": args.quantize, "pca": args.pca, "rerank": args.rerank,
+                         "shards": args.shards}
+    }
+    write_json(f"{output}.meta.json", metadata)  # compact: loaded by every API worker at startup
+    # Court / year / statutes / jurisdiction columns for filtered search
+    fields = CaseFields.extract([texts[i] for i in rows])
+    fields.save(f"{output}.fields.npz")
+    print(f"🏷️ Extracted search fields: {fields.stats()}")
+    if args.rerank:
+        # Full-precision vectors stay on disk; searches memory-map them for re-ranking
+        np.save(f"{output}.vectors.npy", embeddings[rows])
+
+
+def save_knn(index, output):
+    """Precompute the related-case graph over the whole corpus (one graph even when sharded)."""
+    prefix = output[:-len(".bin")] if output.endswith(".bin") else output
+    indptr, indices, scores = build_knn_graph(index, embeddings, k=args.knn)
+    save_knn_graph(prefix, ids, indptr, indices, scores, k=args.knn)
+    print(f"🕸️ Saved {args.knn}-NN graph ({len(indices)} edges, "
+          f"{(indptr.nbytes + indices.nbytes + scores.nbytes) / 2 ** 20:.1f} MB) as {prefix}.knn.*")
+    return prefix
+
+
+if args.shards > 1:
+    # ===============================
+    # Step 2b/3: one index per shard, assigned by id hash
+    # ===============================
+    clear_generations(args.output)
+    assignment = np.array([shard_for(i, args.shards) for i in ids])
+    base = os.path.basename(args.output)
+    name = base[:-len(".bin")] if base.endswith(".bin") else base
+    names = []
+    for shard in range(args.shards):
+        rows = np.flatnonzero(assignment == shard)
+        shard_output = args.output.replace(".bin", f".s{shard}.bin")
+        names.append(os.path.basename(shard_output)[:-len(".bin")])
+        save_index(build_index(embeddings[rows], kind=args.quantize, metric="ip", pca=pca), shard_output, rows)
+        print(f"✅ Shard {shard}: {len(rows)} vectors → {shard_output}")
+    write_json(args.output.replace(".bin", ".shards.json"), {"names": names, "shards": args.shards})
+    print(f"💾 Saved shard manifest as {args.output.replace('.bin', '.shards.json')}")
+    if args.knn:
+        save_knn(build_index(embeddings, kind=args.quantize, metric="ip", pca=pca), args.output)
+
+    # Example query through the scatter-gather layer
+    corpus = load_corpus(os.path.dirname(args.output) or ".", name)
+    hits, status = corpus.search_with_status(embeddings[0:1], 5)
+    print("\n🔎 Example Query:")
+    print("Neighbor IDs:", [h["id"] for h in hits[0]])
+    print("Scores:", [h["score"] for h in hits[0]])
+    print("Shards answered:", status["answered"], "/", status["shards"])
+    corpus.stop()
+
+else:
+    index = build_index(embeddings, kind=args.quantize, metric="ip", pca=pca)
+    print(f"✅ FAISS index built with {index.ntotal} vectors "
+          f"({args.quantize}{f' + PCA {args.pca}' if pca else ''}, {bytes_per_vector(index):.0f} bytes/vector)")
+
+    # ===============================
+    # Step 3: Save FAISS index + Metadata
+    # ===============================
+    clear_generations(args.output)
+    for stale in glob.glob(args.output.replace(".bin", ".shards.json")):
+        os.remove(stale)
+    save_index(index, args.output, np.arange(len(ids)))
+    if args.rerank:
+        print(f"💾 Saved full-precision vectors for re-ranking as {args.output}.vectors.npy")
+
+    print(f"💾 Saved index as {args.output} and metadata as {args.output}.meta.json")
+    knn_prefix = save_knn(index, args.output) if args.knn else None
+
+    # ===============================
+    # Step 4: Example Query
+    # ===============================
+    index = faiss.read_index(args.output)
+
+    query = embeddings[0].reshape(1, -1)
+
+    k = 5
+    scores, neighbors = index.search(query, k)
+
+    print("\n🔎 Example Query:")
+    print("Nearest neighbor indices:", neighbors[0])
+    print("Scores:", scores[0])
+
+    meta = read_json(f"{args.output}.meta.json")
+
+    neighbor_ids = [meta["ids"][i] for i in neighbors[0]]
+    neighbor_texts = [meta["texts"][i] for i in neighbors[0]]
+
+    print("Neighbor IDs:", neighbor_ids)
+    print("Neighbor Texts:", neighbor_texts)
+
+    if knn_prefix:
+        print("Precomputed neighbours:", [n["id"] for n in KnnGraph(knn_prefix).neighbours(ids[0], k=k)])
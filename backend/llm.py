@@ -1,6 +1,7 @@
 from utils.helpers import read_multiline_input, is_advice_request, get_friendly_response,analyze_query_intent,is_out_of_context
 from verifier import run_document_verifier
 from briefings import run_brief_mode
+from translation import translate_document, target_language
 from dotenv import load_dotenv
 import faiss
 import json
@@ -9,14 +10,16 @@ import google.generativeai as genai
 import os
 import re
 import random
-from PIL import Image
-import docx
 import pytesseract
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-from pdf2image import convert_from_path
-from langdetect import detect_langs
 
 from utils.helpers import chunk_text
+from utils.document import DocumentText
+from utils.case_fields import parse_filter
+from utils.file_loader import load_document  # shared per-page extractor (OCRs scanned pages only)
+from sharding import load_corpus
+from llm_client import llm_client, embedding_array, LLMOverloadedError, CircuitOpenError
+import asyncio
 
 # ========== CONFIG ==========
 INDEX_PATH = "data/faiss_index.bin"
@@ -31,85 +34,17 @@ if not GEMINI_API_KEY:
     raise ValueError("❌ No Gemini API key found.")
 genai.configure(api_key=GEMINI_API_KEY)
 
-# -----------------------------
-# Multi-Language OCR Helpers
-# -----------------------------
-INDIAN_LANGUAGES = ["hin", "tam", "tel", "ben", "mar", "guj", "kan", "mal", "pan"]
-
-def detect_languages(text_chunk):
-    try:
-        langs = detect_langs(text_chunk)
-        langs_sorted = sorted(langs, key=lambda x: x.prob, reverse=True)
-        tess_langs = []
-        mapping = {"hi":"hin","ta":"tam","te":"tel","bn":"ben","mr":"mar",
-                   "gu":"guj","kn":"kan","ml":"mal","pa":"pan"}
-        for l in langs_sorted:
-            if l.lang == "en":
-                tess_langs.append("eng")
-            elif l.lang in mapping:
-                tess_langs.append(mapping[l.lang])
-        return "+".join(set(tess_langs)) if tess_langs else "eng"
-    except:
-        return "eng"
-
-def load_document(path):
-    ext = os.path.splitext(path)[1].lower()
-    text = ""
-    if ext == ".txt":
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-    elif ext == ".pdf":
-        try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(path)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        except:
-            pass
-        if not text.strip():
-            images = convert_from_path(path)
-            for img in images:
-                tess_lang = detect_languages(pytesseract.image_to_string(img, lang="eng"))
-                text += pytesseract.image_to_string(img, lang=tess_lang)
-    elif ext in [".doc", ".docx"]:
-        doc = docx.Document(path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    elif ext in [".jpg", ".jpeg", ".png"]:
-        img = Image.open(path)
-        tess_lang = detect_languages(pytesseract.image_to_string(img, lang="eng"))
-        text = pytesseract.image_to_string(img, lang=tess_lang)
-    else:
-        raise ValueError(f"Unsupported file format: {ext}")
-    return text.strip()
-
 # -----------------------------
 # FAISS + Embeddings
 # -----------------------------
 def embed_texts(texts):
     if isinstance(texts, str):
         texts = [texts]
-    response = genai.embed_content(
-        model="models/embedding-001",
-        content=texts,
-        task_type="retrieval_query"
-    )
-    embeddings = []
-    if isinstance(response, dict) and "embedding" in response:
-        embeddings.append(response["embedding"])
-    elif isinstance(response, list):
-        for item in response:
-            if isinstance(item, dict) and "embedding" in item:
-                embeddings.append(item["embedding"])
-            elif isinstance(item, list):
-                for sub_item in item:
-                    if isinstance(sub_item, dict) and "embedding" in sub_item:
-                        embeddings.append(sub_item["embedding"])
-    arr = np.array(embeddings, dtype="float32")
+    arr = embedding_array(llm_client.embed_sync(texts, task_type="retrieval_query", priority="chat"))
     if arr.ndim == 1:
         arr = arr.reshape(1, -1)
     elif arr.ndim > 2:
-        arr = arr.reshape(len(embeddings), -1)
+        arr = arr.reshape(len(texts), -1)
     return arr
 
 def embed_document_chunks(doc_text):
@@ -119,20 +54,14 @@ def embed_document_chunks(doc_text):
     return chunks, embeddings
 
 def load_index():
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    return index, meta
+    # Main index + delta of newly appended judgments (see corpus.py)
+    corpus = load_corpus(os.path.dirname(INDEX_PATH))
+    return corpus, corpus.meta
 
-def search(index, meta, query, k=TOP_K):
+def search(index, meta, query, k=TOP_K, where=None):
+    """where: optional corpus filter expression (see utils.case_fields.parse_filter)."""
     q_emb = embed_texts(query)
-    scores, indices = index.search(q_emb, k)
-    results = []
-    for rank, (idx, score) in enumerate(zip(indices[0], scores[0]), start=1):
-        case_id = meta["ids"][idx]
-        case_text = meta["texts"][idx]
-        results.append({"id": case_id, "score": float(score), "text": case_text})
-    return results
+    return index.search_embeddings(q_emb, k, parse_filter(where) if where else None)[0]
 def ask_gemini(query, document=None, mode="chat", context_type=None):
     """
     Handles chunked documents for long input texts.
@@ -144,35 +73,45 @@ def ask_gemini(query, document=None, mode="chat", context_type=None):
     if friendly_resp:
         return friendly_resp
     
-    if not document or len(document.split()) <= 500:
+    doc = DocumentText(document) if document else None
+    if not doc or doc.word_count <= 500:
         # Small doc or text → process normally
         return _ask_gemini_single(query, document, mode, context_type)
     
-    # Large document → chunk processing
-    from utils.helpers import chunk_text
-    chunks = chunk_text(document, max_words=500, overlap=50)
-    combined_answers = []
-
-    for i, chunk in enumerate(chunks):
-        answer = _ask_gemini_single(
-            query,
-            chunk,
-            mode=mode,
-            context_type=context_type
-        )
-        combined_answers.append({
-            "chunk_index": i,
-            "chunk_preview": chunk[:100] + "...",
-            "answer": answer
-        })
+    # Large document → chunk processing (views over the text, tokenized once)
+    chunks = doc.windows(max_words=500, overlap=50)
+    answers = [_ask_gemini_single(query, chunk, mode=mode, context_type=context_type) for chunk in chunks]
+    return _combine_chunk_answers(answers)
+
+
+async def ask_gemini_async(query, document=None, mode="chat", context_type=None, memory=None):
+    """
+    Non-blocking ask_gemini for the API: chunks of a large document are
+    answered concurrently through the shared LLM client. With conversation
+    memory (see conversation.py) the answer is always one call; the caller
+    keeps the document bounded (retrieved clauses for long documents).
+    """
+    friendly_resp = get_friendly_response(query)
+    if friendly_resp:
+        return friendly_resp
+
+    doc = DocumentText(document) if document else None
+    if memory or not doc or doc.word_count <= 500:
+        return await _ask_gemini_single_async(query, document, mode, context_type, memory)
 
+    chunks = doc.windows(max_words=500, overlap=50)
+    answers = await asyncio.gather(*[
+        _ask_gemini_single_async(query, chunk, mode=mode, context_type=context_type) for chunk in chunks
+    ])
+    return _combine_chunk_answers(answers)
+
+
+def _combine_chunk_answers(answers):
     # Optionally combine summaries for whole-doc context
-    final_answer = "\n\n".join([f"Chunk {c['chunk_index']+1}:\n{c['answer']}" for c in combined_answers])
-    return final_answer
+    return "\n\n".join([f"Chunk {i+1}:\n{answer}" for i, answer in enumerate(answers)])
 
 
-def _ask_gemini_single(question, retrieved=None, mode="chat", context_type=None):
-    # Single chunk Gemini call
+def _build_prompt(question, retrieved=None, mode="chat", context_type=None, memory=None):
     question_lower = question.lower()
     needs_legal_terms = False
     prompt_sections = []
@@ -194,12 +133,30 @@ def _ask_gemini_single(question, retrieved=None, mode="chat", context_type=None)
             requested_language = lang
             break
     base_context = f"Document Content:\n{retrieved}\n\n" if retrieved else ""
+    if memory:
+        base_context = (f"Conversation so far (use it to resolve follow-up questions):\n{memory}\n\n"
+                        + base_context)
     prompt = f"{prefix}You are a Legal AI Assistant. When asked to translate, translate the entire answer into the requested language. Always give structured, user-friendly answers.\n{chr(10).join(prompt_sections)}\nIf the user's question is not about the document, keep the answer short and indicate it's answered from general knowledge, not the document.\nNote:\nYou MUST NOT give legal advice, recommendations, or next step guidance.\nIf the user asks any question seeking advice or instructions, politely respond:\n\"I am not qualified to give legal advice. Please consult a qualified lawyer.\"\n{base_context}\nUser Question: {question}\n"
     if requested_language:
         prompt += f"\nTranslate the entire answer into {requested_language}."
+    return prompt
+
+
+def _ask_gemini_single(question, retrieved=None, mode="chat", context_type=None):
+    # Single chunk Gemini call
+    prompt = _build_prompt(question, retrieved, mode, context_type)
+    try:
+        return llm_client.generate_sync(prompt, model=GEMINI_MODEL, priority="chat")
+    except Exception as e:
+        return f"⚠️ Error: {e}"
+
+
+async def _ask_gemini_single_async(question, retrieved=None, mode="chat", context_type=None, memory=None):
+    prompt = _build_prompt(question, retrieved, mode, context_type, memory)
     try:
-        response = genai.GenerativeModel(GEMINI_MODEL).generate_content(prompt)
-        return response.text
+        return await llm_client.generate(prompt, model=GEMINI_MODEL, priority="chat")
+    except (LLMOverloadedError, CircuitOpenError):
+        raise  # the API answers 503
     except Exception as e:
         return f"⚠️ Error: {e}"
 
@@ -305,7 +262,14 @@ def main():
         # -----------------------------
         if intent == "translate":
             if last_document and last_document.strip():
-                answer = ask_gemini(query, last_document, mode="translate", context_type="whole_doc")
+                language = target_language(query)
+                if language:
+                    # Segment-level translation memory: only unseen sentences go to Gemini
+                    result = asyncio.run(translate_document(last_document, language, priority="chat"))
+                    answer = result["translation"]
+                    print(f"🧠 {result['from_memory']}/{result['segments']} segments from translation memory")
+                else:
+                    answer = ask_gemini(query, last_document, mode="translate", context_type="whole_doc")
                 print("\n🌐 Translation:\n", answer)
                 last_answer = answer
             else:
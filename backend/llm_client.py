@@ -0,0 +1,468 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import google.generativeai as genai
+
+# ========== CONFIG ==========
+GEMINI_MODEL = "gemini-1.5-flash"
+EMBED_MODEL = "models/embedding-001"
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))  # SDK calls in flight per worker
+MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "1000"))            # waiting calls before shedding load
+GENERATE_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "20"))
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5      # seconds, doubled per attempt, full jitter
+BACKOFF_MAX = 8
+BREAKER_THRESHOLD = 5   # consecutive failures that open the circuit
+BREAKER_COOLDOWN = 30   # seconds before a half-open probe is allowed
+
+# Key pool: comma-separated keys; unset → the key configured with genai.configure()
+API_KEYS = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
+KEY_RPM = int(os.getenv("LLM_KEY_RPM", "60"))               # requests per key per minute
+KEY_TPM = int(os.getenv("LLM_KEY_TPM", "1000000"))          # (estimated) input tokens per key per minute
+QUOTA_COOLDOWN = float(os.getenv("LLM_QUOTA_COOLDOWN", "60"))  # seconds a key rests after a 429
+KEY_RESERVE = float(os.getenv("LLM_KEY_RESERVE", "0.2"))    # share of each key's budget kept for chat
+RESERVED_SLOTS = int(os.getenv("LLM_RESERVED_SLOTS", "4"))  # in-flight slots only chat may use
+
+# Lower value = served first. Calls without a priority are treated as batch work.
+PRIORITIES = {"chat": 0, "verifier": 1, "briefings": 2, "batch": 3}
+DEFAULT_PRIORITY = "batch"
+# Longest a call may wait for a slot / key before it is shed (None = defer until served)
+MAX_WAIT = {"chat": 15.0, "verifier": 60.0, "briefings": 300.0, "batch": None}
+WAIT_SAMPLES = 1000     # recent queue waits kept per priority for the metrics
+# ============================
+
+
+class LLMOverloadedError(Exception):
+    """Too many calls queued (or every key rate-limited for too long); the caller should back off."""
+
+
+class CircuitOpenError(Exception):
+    """Gemini has been failing; calls are short-circuited until the cooldown ends."""
+
+
+def _is_quota_error(err):
+    msg = str(err).lower()
+    return any(s in msg for s in ("429", "quota", "resource exhausted", "resource_exhausted", "rate limit"))
+
+
+def _is_retryable(err):
+    if isinstance(err, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    msg = str(err).lower()
+    return _is_quota_error(err) or any(s in msg for s in ("500", "502", "503", "504", "unavailable", "deadline",
+                                                          "internal", "timed out"))
+
+
+def estimate_tokens(content):
+    """Rough input token count (~4 characters per token) used for the per-key budgets."""
+    if isinstance(content, str):
+        return max(1, len(content) // 4)
+    return sum(estimate_tokens(c) for c in content)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False  # half-open: one call is testing whether Gemini is back
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def check(self):
+        """
+        Raise CircuitOpenError unless closed. Once the cooldown has passed a
+        single call is let through as a probe (returns True); the rest keep
+        being rejected until it succeeds.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "open" or self._probing:
+                raise CircuitOpenError("⚠️ Gemini is unavailable right now, please retry shortly.")
+            self._probing = True
+            return True
+
+    def end_probe(self):
+        """The probe finished without a verdict (e.g. a bad request): let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()  # a failed probe re-opens the circuit
+            self._probing = False
+
+
+class KeyPool:
+    """
+    API keys with request / token budgets over a sliding minute. Each call
+    goes to the least-loaded key with budget left; a key that returns a
+    quota error rests for QUOTA_COOLDOWN seconds. Non-chat calls may only
+    use (1 - KEY_RESERVE) of each key's budget.
+    Only touched from the client's event loop thread.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, keys, rpm=KEY_RPM, tpm=KEY_TPM, reserve=KEY_RESERVE):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.reserve = reserve
+        self.keys = [{"key": key, "label": f"key{i + 1}", "window": deque(), "tokens": 0, "rested_until": 0.0,
+                      "requests": 0, "quota_errors": 0} for i, key in enumerate(keys or [None])]
+
+    def _trim(self, entry, now):
+        window = entry["window"]
+        while window and window[0][0] <= now - self.WINDOW:
+            entry["tokens"] -= window.popleft()[1]
+
+    def acquire(self, tokens, interactive, now):
+        """(key entry, 0.0), or (None, seconds until some key may have budget again)."""
+        share = 1.0 if interactive else 1.0 - self.reserve
+        rpm, tpm = max(1, int(self.rpm * share)), max(1, int(self.tpm * share))
+        best, wait = None, float("inf")
+        for entry in self.keys:
+            self._trim(entry, now)
+            if entry["rested_until"] > now:
+                wait = min(wait, entry["rested_until"] - now)
+                continue
+            window = entry["window"]
+            if len(window) >= rpm or (window and entry["tokens"] + tokens > tpm):
+                wait = min(wait, window[0][0] + self.WINDOW - now)
+                continue
+            if best is None or len(window) < len(best["window"]):
+                best = entry
+        if best is None:
+            return None, max(wait, 0.01)
+        best["window"].append((now, tokens))
+        best["tokens"] += tokens
+        best["requests"] += 1
+        return best, 0.0
+
+    def rest(self, entry, seconds=QUOTA_COOLDOWN):
+        entry["rested_until"] = time.monotonic() + seconds
+        entry["quota_errors"] += 1
+
+    def stats(self):
+        now = time.monotonic()
+        out = []
+        for entry in self.keys:
+            self._trim(entry, now)
+            out.append({"key": entry["label"], "requests_last_minute": len(entry["window"]),
+                        "tokens_last_minute": entry["tokens"], "requests": entry["requests"],
+                        "quota_errors": entry["quota_errors"],
+                        "resting_seconds": round(max(0.0, entry["rested_until"] - now), 1)})
+        return out
+
+
+class LLMClient:
+    """
+    Shared Gemini client for the whole process.
+
+    Calls run on a dedicated event loop thread and are scheduled by
+    priority (chat > verifier > briefings > batch): a call starts when an
+    in-flight slot is free and a key from the pool has budget, highest
+    priority first, FIFO within a priority. RESERVED_SLOTS slots and part
+    of every key's budget are kept for chat, so interactive questions stay
+    fast while bulk jobs run. Calls that wait past MAX_WAIT for their
+    priority are shed; batch work is deferred until keys free up.
+
+    Each call gets a timeout; quota errors (429) rest the key and rotate to
+    another one; other retryable errors are retried with jittered
+    exponential backoff, and a circuit breaker fails fast while Gemini is
+    down. Blocking SDK calls execute on a fixed thread pool; per-key SDK
+    clients and model objects are created once, so connections are reused.
+
+    Async callers: await client.generate(..., priority="chat") / client.embed(...) / client.stats()
+    Sync callers:  client.generate_sync(...) / client.embed_sync(...)
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE, keys=API_KEYS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.breaker = CircuitBreaker()
+        self.keys = KeyPool(keys)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._models = {}
+        self._sdk_clients = {}
+        self._queue = []                 # heap of [level, seq, tokens, future, enqueued, priority]
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+        self._shed = {p: 0 for p in PRIORITIES}
+        self._timer = None               # (when, handle) of the next deferred dispatch
+        self._in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rotations = 0
+
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name="llm-client", daemon=True).start()
+        ready.wait()
+
+    @property
+    def _waiting(self):
+        return sum(self._queued.values())
+
+    # -----------------------------
+    # SDK calls (run on the executor)
+    # -----------------------------
+    def _sdk_client(self, key):
+        if key is None:
+            return None  # SDK default client (genai.configure)
+        client = self._sdk_clients.get(key)
+        if client is None:
+            from google.ai import generativelanguage as glm
+            client = self._sdk_clients[key] = glm.GenerativeServiceClient(client_options={"api_key": key})
+        return client
+
+    def _model(self, name, key=None):
+        model = self._models.get((name, key))
+        if model is None:
+            model = genai.GenerativeModel(name)
+            if key is not None:
+                model._client = self._sdk_client(key)
+            self._models[(name, key)] = model
+        return model
+
+    def _generate_blocking(self, prompt, model, timeout, key=None):
+        response = self._model(model, key).generate_content(prompt, request_options={"timeout": timeout})
+        return response.text
+
+    def _embed_blocking(self, content, task_type, model, timeout, key=None):
+        kwargs = {"client": self._sdk_client(key)} if key is not None else {}
+        return genai.embed_content(model=model, content=content, task_type=task_type,
+                                   request_options={"timeout": timeout}, **kwargs)
+
+    # -----------------------------
+    # Scheduling: priority queue → slot + key budget → shed / defer
+    # -----------------------------
+    async def _acquire(self, priority, tokens):
+        """Wait for an in-flight slot and a key; returns the key entry."""
+        level = PRIORITIES[priority]
+        if self._waiting >= self.max_queue:
+            self._shed_lowest(priority)
+        fut = self._loop.create_future()
+        heapq.heappush(self._queue, [level, next(self._seq), tokens, fut, time.monotonic(), priority])
+        self._queued[priority] += 1
+        self._dispatch()
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # got a key just as the caller gave up
+            raise
+        finally:
+            self._queued[priority] -= 1
+
+    def _shed_lowest(self, priority):
+        """Queue full: drop the newest call of a lower priority than this one, or refuse this one."""
+        live = [w for w in self._queue if not w[3].done()]
+        victim = max(live, key=lambda w: (w[0], w[1]), default=None)
+        if victim is None or victim[0] <= PRIORITIES[priority]:
+            self._shed[priority] += 1
+            raise LLMOverloadedError("⚠️ Too many requests in progress, please retry shortly.")
+        self._fail(victim, "⚠️ Too many requests in progress, please retry shortly.")
+
+    def _fail(self, waiter, message):
+        self._shed[waiter[5]] += 1
+        waiter[3].set_exception(LLMOverloadedError(message))
+
+    def _slots_for(self, level):
+        return self.max_concurrency if level == 0 else self.max_concurrency - RESERVED_SLOTS
+
+    def _dispatch(self):
+        """Hand slots and keys to waiting calls, highest priority first (runs on the loop thread)."""
+        now = time.monotonic()
+        retry_in = None
+        while self._queue:
+            level, _, tokens, fut, enqueued, priority = waiter = self._queue[0]
+            if fut.done():  # cancelled or shed
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight >= self._slots_for(level):
+                break  # a finishing call dispatches again
+            entry, retry_in = self.keys.acquire(tokens, level == 0, now)
+            if entry is None:
+                break  # every key is resting or out of budget
+            heapq.heappop(self._queue)
+            self._in_flight += 1
+            self._waits[priority].append(now - enqueued)
+            fut.set_result(entry)
+        next_deadline = self._expire(now)
+        delays = [d for d in (retry_in, next_deadline) if d]
+        if delays and self._queue:
+            self._wake_at(now + min(delays))
+
+    def _wake_at(self, when):
+        """Run _dispatch again at `when` (keys regain budget / a waiter hits its deadline)."""
+        if self._timer is not None:
+            if self._timer[0] <= when:
+                return
+            self._timer[1].cancel()
+        self._timer = (when, self._loop.call_at(self._loop.time() + when - time.monotonic(), self._wake))
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _expire(self, now):
+        """Shed calls waiting past MAX_WAIT; returns seconds until the next deadline, if any."""
+        soonest = None
+        for waiter in self._queue:
+            max_wait = MAX_WAIT.get(waiter[5])
+            if max_wait is None or waiter[3].done():
+                continue
+            left = waiter[4] + max_wait - now
+            if left <= 0:
+                self._fail(waiter, "⚠️ All API keys are busy or rate-limited, please retry shortly.")
+            else:
+                soonest = left if soonest is None else min(soonest, left)
+        return soonest
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    # -----------------------------
+    # Policy: schedule → timeout → rotate on 429 / retry → breaker
+    # -----------------------------
+    async def _call(self, fn, timeout, retries, priority, tokens):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        attempt = 0
+        rotations = 0
+        while True:
+            probe = self.breaker.check()
+            try:
+                entry = await self._acquire(priority, tokens)
+                self.calls += 1
+                try:
+                    result = await asyncio.wait_for(self._loop.run_in_executor(self._executor, fn, entry["key"]),
+                                                    timeout)
+                except Exception as e:
+                    self.failures += 1
+                    if _is_quota_error(e):
+                        # Quota says nothing about Gemini's health: rest this key and try another one
+                        self.keys.rest(entry)
+                        if rotations < len(self.keys.keys) - 1:
+                            rotations += 1
+                            self.rotations += 1
+                            continue
+                    retryable = _is_retryable(e)
+                    if retryable and not _is_quota_error(e):  # bad requests say nothing about Gemini's health
+                        self.breaker.record_failure()
+                    if attempt >= retries or not retryable:
+                        raise
+                else:
+                    self.breaker.record_success()
+                    return result
+                finally:
+                    self._release()
+            finally:
+                if probe:
+                    self.breaker.end_probe()  # no-op once a success / failure was recorded
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _generate_call(self, prompt, model, timeout, retries, priority):
+        fn = lambda key: self._generate_blocking(prompt, model, timeout, key=key)
+        return self._call(fn, timeout, retries, priority, estimate_tokens(prompt))
+
+    def _embed_call(self, content, task_type, model, timeout, retries, priority):
+        fn = lambda key: self._embed_blocking(content, task_type, model, timeout, key=key)
+        return self._call(fn, timeout, retries, priority, estimate_tokens(content))
+
+    async def generate(self, prompt, model=GEMINI_MODEL, timeout=GENERATE_TIMEOUT, retries=MAX_RETRIES,
+                       priority=DEFAULT_PRIORITY):
+        """Generate text for prompt; returns response.text."""
+        coro = self._generate_call(prompt, model, timeout, retries, priority)
+        return await asyncio.wrap_future(self._submit(coro))
+
+    async def embed(self, content, task_type="retrieval_query", model=EMBED_MODEL,
+                    timeout=EMBED_TIMEOUT, retries=MAX_RETRIES, priority=DEFAULT_PRIORITY):
+        """Raw embed_content response for a string or list of strings."""
+        coro = self._embed_call(content, task_type, model, timeout, retries, priority)
+        return await asyncio.wrap_future(self._submit(coro))
+
+    def generate_sync(self, prompt, model=GEMINI_MODEL, timeout=GENERATE_TIMEOUT, retries=MAX_RETRIES,
+                      priority=DEFAULT_PRIORITY):
+        return self._submit(self._generate_call(prompt, model, timeout, retries, priority)).result()
+
+    def embed_sync(self, content, task_type="retrieval_query", model=EMBED_MODEL,
+                   timeout=EMBED_TIMEOUT, retries=MAX_RETRIES, priority=DEFAULT_PRIORITY):
+        return self._submit(self._embed_call(content, task_type, model, timeout, retries, priority)).result()
+
+    async def stats(self):
+        # Read on the loop thread, which owns the queue and key windows; awaited, so a busy
+        # client loop never blocks the caller's event loop
+        return await asyncio.wrap_future(self._submit(self._stats()))
+
+    async def _stats(self):
+        def wait_ms(samples):
+            if not samples:
+                return None
+            ordered = sorted(samples)
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+            return {"p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1] * 1000, 1)}
+
+        return {
+            "in_flight": self._in_flight,
+            "queued": self._waiting,
+            "queued_by_priority": dict(self._queued),
+            "wait_ms_by_priority": {p: wait_ms(w) for p, w in self._waits.items()},
+            "shed_by_priority": dict(self._shed),
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "retries": self.retries,
+            "key_rotations": self.rotations,
+            "failures": self.failures,
+            "circuit": self.breaker.state,
+            "keys": self.keys.stats(),
+        }
+
+
+def embedding_array(response):
+    """float32 array from an embed_content response (single text → 1-D, list → 2-D)."""
+    return np.array(response["embedding"], dtype="float32")
+
+
+# One client per process
+llm_client = LLMClient()
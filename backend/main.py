@@ -1,37 +1,60 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import Optional
-import shutil
 import os
 import uvicorn
-import re
-import json
-import os
+import uuid
+import threading
+import asyncio
+from pydantic import BaseModel
+
+from sharding import load_corpus
 
-FAISS_META_PATH = "data/faiss_index.bin.meta.json"
-if os.path.exists(FAISS_META_PATH):
-    with open(FAISS_META_PATH, "r", encoding="utf-8") as f:
-        FAISS_DOCS = json.load(f)
-else:
-    FAISS_DOCS = {"ids": [], "texts": []}
+# Judgment corpus: main index + appended delta, compacted in the background
+corpus = load_corpus("data")  # single index, or scatter-gather over shards
 
 
 
 # -----------------------------
 # Import your tools
 # -----------------------------
-from llm import ask_gemini  # chat engine
-from verifier import run_document_verifier
-from briefings import run_brief_mode
-from utils.helpers import chunk_text
-from utils.embeddings import embed_texts
+from llm import ask_gemini_async  # chat engine
+from verifier import run_document_verifier, run_document_verifier_rules, iter_chunk_results, select_fields, \
+    VERIFY_BATCH
+from briefings import run_brief_mode_async
+from translation import translate_document
+from utils.segmenter import segment_clauses, clause_chunks  # clause-level chunks with heading paths
+from utils.document import DocumentText, ChunkView  # text stored once + word offsets; chunks are views
+from utils.embeddings import embed_texts_async, embed_documents_async
+from llm_client import llm_client, LLMOverloadedError, CircuitOpenError
+from utils.singleflight import singleflight
+from precompute import DocumentArtifacts
+from batch import BatchRun, collect_paths, BATCH_STAGES
 #from visualizer import run_visualizer
-from utils.file_loader import load_document  # text extraction
+from utils.file_loader import load_document_pages  # per-page text extraction (+ OCR of scanned pages)
+from utils.artifact_cache import ArtifactCache, new_hasher, HASH_BLOCK_SIZE
+from workspace import WorkspaceIndex
+from docstore import DocumentStore
+from conversation import ConversationMemory, render_memory, retrieval_query
+from versions import chunk_keys, diff_versions, reuse_embeddings, reuse_results
+from utils.vector_index import build_index, load_pca
+from utils.knn_graph import load_knn_graph
+from utils.case_fields import parse_filter
+from corpus import CORPUS_NAME
+from utils.serialization import jsonl_line
+from utils.responses import FastJSONResponse, CompressionMiddleware
 import numpy as np
 import faiss
 # -----------------------------
 
-app = FastAPI(title="Legal AI Assistant Prototype")
+# Responses are encoded with orjson when installed; large ones are returned as FastJSONResponse
+# directly, which also skips FastAPI's per-value jsonable_encoder pass
+app = FastAPI(title="Legal AI Assistant Prototype", default_response_class=FastJSONResponse)
+
+# gzip / brotli for responses above COMPRESS_MIN_BYTES (verifier results, briefings, NDJSON streams)
+app.add_middleware(CompressionMiddleware)
 
 # Allow CORS for web front-end (hackathon demo)
 app.add_middleware(
@@ -45,41 +68,285 @@ app.add_middleware(
 
 # Store globally
 uploaded_doc_text: Optional[str] = None
-uploaded_doc_chunks: Optional[list] = None
+uploaded_doc_chunks: Optional[ChunkView] = None  # (start, end) views into uploaded_doc_text
+uploaded_doc_segments: Optional[list] = None  # clause metadata per chunk (heading path, kind, offsets)
 uploaded_doc_embeddings: Optional[np.ndarray] = None
 uploaded_doc_index: Optional[faiss.IndexFlatL2] = None
+uploaded_doc_id: Optional[str] = None
+
+# Content-hash cache of extraction/embedding artifacts
+artifact_cache = ArtifactCache()
+
+# Optional corpus-trained PCA applied to per-upload indexes (VECTOR_USE_PCA=1)
+UPLOAD_PCA = load_pca()
+
+# All uploaded documents, searchable together or per document
+workspace = WorkspaceIndex()
+DOC_ID_LENGTH = 16  # doc_id = first hex chars of the content hash
+CHAT_FULL_DOC_WORDS = 1500  # longer active documents are answered from their most relevant clauses
+MAX_TOP_K = 100  # top_k above this (or below 1) is rejected with a 422
+
+# Verifier / briefing results stored per document (optionally precomputed after upload)
+artifacts = DocumentArtifacts()
+
+# Uploaded documents shared by every worker / restart; the globals above are this worker's cached copy
+store = DocumentStore()
+
+# Per-session chat memory (rolling summary + recent turns), kept in the docstore
+chat_memory = ConversationMemory(store)
+_synced_generation = None
+_sync_lock = threading.Lock()
+_stored_docs = {}  # doc_id -> {"doc_id", "filename", "chunks"} of every stored document
 
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
-    global uploaded_doc_text, uploaded_doc_chunks, uploaded_doc_embeddings, uploaded_doc_index
+    return await _ingest(file)
+
 
-    # Save temp file
+async def _ingest(file, parent_id=None):
+    """
+    Extract, segment, embed and index an upload. With parent_id (a revised
+    version of that document) chunks whose text is unchanged reuse the
+    parent's embeddings, so only changed clauses are embedded.
+    """
+    # Save temp file, hashing the bytes as they stream in
     temp_path = f"temp_{file.filename}"
+    hasher = new_hasher()
     with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        while True:
+            block = await file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            buffer.write(block)
+    content_hash = hasher.hexdigest()
+    doc_id = content_hash[:DOC_ID_LENGTH]
+    parent = await run_in_threadpool(store.load, parent_id) if parent_id else None
+
+    # ⚡ Cache hit → skip extraction, OCR, chunking and embedding entirely
+    cached = await run_in_threadpool(artifact_cache.get, content_hash)
+    if cached is not None:
+        os.remove(temp_path)
+        await run_in_threadpool(store.put, doc_id, file.filename, cached["doc"], cached["segments"],
+                                cached["pages"], cached["embeddings"], cached["index"])
+        changes = _record_version(doc_id, parent, chunk_keys(cached["chunks"]), cached["segments"])
+        _activate_document(doc_id, file.filename, cached["doc"], cached["segments"], cached["chunks"],
+                           cached["embeddings"], cached["index"])
+        return _upload_response(file.filename, cached["pages"], cached=True, changes=changes, embedded=0)
 
     try:
-        uploaded_doc_text = load_document(temp_path)
+        # OCR / parsing is blocking → keep it off the event loop
+        text, pages = await run_in_threadpool(load_document_pages, temp_path)
     except Exception as e:
-        os.remove(temp_path)
         raise HTTPException(status_code=400, detail=f"Error loading document: {e}")
     finally:
         os.remove(temp_path)
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="⚠️ No text could be extracted from this document.")
+
+    # ✅ Segment into clauses and embed immediately (only clauses the parent version doesn't have)
+    doc = DocumentText(text)
+    segments = segment_clauses(doc)
+    chunks = clause_chunks(doc, segments)
+    keys = chunk_keys(chunks)
+    embeddings, missing = reuse_embeddings(chunk_keys(parent["chunks"]), parent["embeddings"], keys) \
+        if parent else (None, list(range(len(chunks))))
+    if missing:
+        try:
+            new = await embed_texts_async([chunks[i] for i in missing])
+        except (LLMOverloadedError, CircuitOpenError) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        if new is None:
+            raise HTTPException(status_code=502, detail="⚠️ Failed to embed document chunks.")
+        new = new.reshape(len(missing), -1).astype("float32")
+        if embeddings is None:
+            embeddings = new
+        else:
+            embeddings[missing] = new
+    embeddings = embeddings.reshape(len(chunks), -1).astype("float32")
+
+    # ✅ Build FAISS index for this doc (float32 / fp16 / int8 per VECTOR_QUANTIZATION)
+    index = await run_in_threadpool(build_index, embeddings, metric="l2", pca=UPLOAD_PCA)
 
-    # ✅ Chunk and embed immediately
-    uploaded_doc_chunks = chunk_text(uploaded_doc_text, max_words=500, overlap=50)
-    uploaded_doc_embeddings = embed_texts(uploaded_doc_chunks).astype("float32")
-
-    # ✅ Build FAISS index for this doc
-    dim = uploaded_doc_embeddings.shape[1]
-    uploaded_doc_index = faiss.IndexFlatL2(dim)
-    uploaded_doc_index.add(uploaded_doc_embeddings)
+    try:
+        await run_in_threadpool(artifact_cache.put, content_hash, doc, segments, embeddings, index,
+                                filename=file.filename, pages=pages)
+    except Exception as e:  # the cache only saves work later; the upload itself succeeded
+        print(f"⚠️ Artifact cache write failed for {file.filename}: {e}")
+    await run_in_threadpool(store.put, doc_id, file.filename, doc, segments, pages, embeddings, index)
+    changes = _record_version(doc_id, parent, keys, segments)
+    _activate_document(doc_id, file.filename, doc, segments, chunks, embeddings, index)
+    return _upload_response(file.filename, pages, cached=False, changes=changes, embedded=len(missing))
+
+
+def _record_version(doc_id, parent, keys, segments):
+    """Store the clause diff of a new version against its parent (None for plain uploads)."""
+    if parent is None or parent["doc_id"] == doc_id:
+        return None
+    changes = diff_versions(chunk_keys(parent["chunks"]), keys, parent["segments"], segments)
+    store.put_version(doc_id, parent["doc_id"], changes)
+    return changes
+
+
+@app.post("/documents/{doc_id}/versions")
+async def upload_version(doc_id: str, file: UploadFile = File(...)):
+    """
+    Upload a revised version of doc_id. Unchanged clauses reuse the previous
+    version's embeddings and verifier results; the response lists the
+    clauses that were modified, added or removed.
+    """
+    await _sync()
+    if doc_id not in _stored_docs:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document: {doc_id}")
+    return await _ingest(file, parent_id=doc_id)
+
+
+@app.get("/documents/{doc_id}/versions")
+async def document_versions(doc_id: str):
+    """Version chain through a document (oldest first, later revisions included) with each one's clause changes."""
+    await _sync()
+    if doc_id not in _stored_docs:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document: {doc_id}")
+    chain = await run_in_threadpool(store.history, doc_id)
+    for entry in chain:
+        version = await run_in_threadpool(store.version_of, entry["doc_id"])
+        entry["changes"] = version["changes"] if version else None
+    return {"doc_id": doc_id, "versions": chain}
+
+
+def _activate_document(doc_id, filename, doc, segments, chunks, embeddings, index):
+    """Make an ingested document the active one (for every worker) and start its background stages."""
+    store.set_active(doc_id)
+    _set_active(doc_id, chunks, segments, embeddings, index)
+    workspace.add_document(doc_id, chunks, embeddings, filename=filename, segments=segments)
+    _stored_docs[doc_id] = {"doc_id": doc_id, "filename": filename, "chunks": len(chunks)}
+
+    # Re-upload invalidates stored verifier / briefing results
+    artifacts.invalidate(doc_id)
+    artifacts.schedule(doc_id, _artifact_producers(doc_id, chunks, segments, index))
+
+
+def _set_active(doc_id, chunks, segments, embeddings, index):
+    global uploaded_doc_text, uploaded_doc_chunks, uploaded_doc_segments, uploaded_doc_embeddings, \
+        uploaded_doc_index, uploaded_doc_id
+    uploaded_doc_text = chunks.doc.text if chunks is not None else None
+    uploaded_doc_chunks = chunks
+    uploaded_doc_segments = segments
+    uploaded_doc_embeddings = embeddings
+    uploaded_doc_index = index
+    uploaded_doc_id = doc_id
+
+
+def _sync_documents():
+    """
+    Bring this worker's document list and active document in line with the
+    shared store (uploads / deletes made by other workers or before a restart).
+    Costs one SQLite read when nothing changed. Other documents only join
+    this worker's workspace when a request needs them (_load_documents).
+    """
+    global _synced_generation, _stored_docs
+    with _sync_lock:
+        generation = store.generation()
+        if generation == _synced_generation:
+            return
+        stored = {d["doc_id"]: d for d in store.list_documents()}
+        for doc_id in [d for d in workspace.docs if d not in stored]:
+            workspace.remove_document(doc_id)
+            artifacts.invalidate(doc_id)
+        _stored_docs = stored
+        active = store.active_doc_id()
+        if active not in stored:
+            _set_active(None, None, None, None, None)
+        elif active != uploaded_doc_id:
+            loaded = store.load(active, with_index=True)
+            _set_active(active, loaded["chunks"], loaded["segments"], loaded["embeddings"], loaded["index"])
+        _synced_generation = generation
+
+
+async def _sync():
+    await run_in_threadpool(_sync_documents)
+
+
+def _load_documents(doc_ids=None):
+    """
+    Add stored documents (all of them for None) to this worker's workspace
+    on first use: one SQLite read each, embeddings memory-mapped.
+    """
+    with _sync_lock:
+        for doc_id in list(_stored_docs if doc_ids is None else doc_ids):
+            info = _stored_docs.get(doc_id)
+            if info is None or doc_id in workspace:
+                continue
+            loaded = store.load(doc_id)
+            if loaded is not None:  # None: deleted by another worker meanwhile
+                workspace.add_document(doc_id, loaded["chunks"], loaded["embeddings"], filename=info["filename"],
+                                       segments=loaded["segments"])
+
+
+def _artifact_producers(doc_id, chunks, segments, index):
+    text = chunks.doc.text
+
+    async def briefings():
+        # The briefing reads the whole document: only a version without clause changes can reuse it
+        inherited = await run_in_threadpool(_inherited, doc_id, "briefings")
+        if inherited is not None and not _changed(inherited[0]):
+            return inherited[1]
+        return await run_brief_mode_async("brief mode", text, segments=segments)
+
+    def verifier():
+        inherited = _inherited(doc_id, "verifier")
+        known = None
+        if inherited is not None:
+            version, previous, parent = inherited
+            known = reuse_results(chunk_keys(parent["chunks"]), previous["chunks"], chunk_keys(chunks))
+        return run_document_verifier(text, chunks, index, corpus.meta, doc_segments=segments, known=known)
 
     return {
-        "message": f"✅ Document '{file.filename}' uploaded successfully!",
+        "verifier": _stored(doc_id, "verifier", lambda: run_in_threadpool(verifier)),
+        "briefings": _stored(doc_id, "briefings", briefings),
+    }
+
+
+def _inherited(doc_id, name):
+    """(version diff, parent's stored `name` result, parent document) if doc_id is a revision, else None."""
+    version = store.version_of(doc_id)
+    if version is None:
+        return None
+    previous = store.get_artifact(version["parent_id"], name)
+    parent = store.load(version["parent_id"]) if previous is not None else None
+    return (version, previous, parent) if parent is not None else None
+
+
+def _changed(version):
+    return any(version["changes"][op] for op in ("modified", "added", "removed"))
+
+
+def _stored(doc_id, name, fn):
+    """Wrap an artifact producer so results are shared through the store (computed by one worker, read by all)."""
+    async def produce():
+        result = await run_in_threadpool(store.get_artifact, doc_id, name)
+        if result is None:
+            result = await fn()
+            await run_in_threadpool(store.put_artifact, doc_id, name, result)
+        return result
+    return produce
+
+
+def _upload_response(filename, pages, cached, changes=None, embedded=0):
+    response = {
+        "message": f"✅ Document '{filename}' uploaded successfully!",
+        "doc_id": uploaded_doc_id,
         "chunks": len(uploaded_doc_chunks),
-        "word_count": len(uploaded_doc_text.split())
+        "word_count": uploaded_doc_chunks.doc.word_count,
+        "pages": len(pages),
+        "ocr_pages": [p["page"] for p in pages if p["ocr"]],
+        "cached": cached,
+        "precomputing": sorted(artifacts.status(uploaded_doc_id)),
     }
+    if changes is not None:
+        response["changes"] = changes
+        response["embedded_chunks"] = embedded
+    return response
 
 
 
@@ -87,36 +354,352 @@ async def upload_document(file: UploadFile = File(...)):
 # Chat endpoint (always available)
 # -----------------------------
 @app.post("/chat")
-async def chat(query: str):
-    global uploaded_doc_text
-    context = uploaded_doc_text if uploaded_doc_text else None
-    answer = ask_gemini(query, document=context, mode="chat")
-    return {"query": query, "answer": answer}
+async def chat(query: str, doc_ids: Optional[str] = None, top_k: int = Query(5, ge=1, le=MAX_TOP_K),
+               session_id: Optional[str] = None):
+    """
+    Chat about the active document, or pass doc_ids (comma-separated,
+    or "all") to answer from the most relevant clauses across documents.
+    Long active documents are also answered from their most relevant clauses.
+    With a session_id, earlier turns (recent ones verbatim, older ones as a
+    rolling summary) are sent along and shape the clause search, so
+    follow-up questions work; the prompt stays bounded however long the session.
+    """
+    await _sync()
+    conversation = await chat_memory.load(session_id) if session_id else None
+    memory = render_memory(conversation) if conversation else None
+    context, sources = uploaded_doc_text or None, None
+    long_doc = uploaded_doc_text and uploaded_doc_chunks.doc.word_count > CHAT_FULL_DOC_WORDS
+    if doc_ids or long_doc:
+        selected = (None if doc_ids == "all" else _parse_doc_ids(doc_ids)) if doc_ids else [uploaded_doc_id]
+        search_text = retrieval_query(conversation, query) if conversation else query
+        try:
+            q_emb = await embed_texts_async(search_text)
+        except (LLMOverloadedError, CircuitOpenError) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        if q_emb is None:
+            raise HTTPException(status_code=502, detail="⚠️ Failed to embed query.")
+        await run_in_threadpool(_load_documents, selected)
+        hits = workspace.search(q_emb, k=top_k, doc_ids=selected)[0]
+        context = "\n\n".join(f"[{_source_label(h)}]\n{h['text']}" for h in hits) or None
+        sources = [{"doc_id": h["doc_id"], "chunk_index": h["chunk_index"], "heading": h.get("heading"),
+                    "score": h["score"]} for h in hits]
+    try:
+        answer = await ask_gemini_async(query, document=context, mode="chat", memory=memory)
+    except (LLMOverloadedError, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    response = {"query": query, "answer": answer}
+    if sources is not None:
+        response["sources"] = sources
+    if session_id:
+        conversation = await chat_memory.record(session_id, query, answer)
+        response["session_id"] = session_id
+        response["memory"] = {"turns": conversation["folded"] + len(conversation["turns"]),
+                              "summarized_turns": conversation["folded"]}
+    return response
+
+
+@app.delete("/chat/sessions/{session_id}")
+async def forget_chat_session(session_id: str):
+    """Drop a chat session's memory."""
+    if not await chat_memory.forget(session_id):
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown chat session: {session_id}")
+    return {"message": f"✅ Chat session {session_id} cleared."}
+
+
+def _source_label(hit):
+    where = hit.get("heading") or f"chunk {hit['chunk_index'] + 1}"
+    return f"{workspace.docs[hit['doc_id']]['filename']} · {where}"
+
+
+def _parse_doc_ids(doc_ids: str):
+    selected = [d.strip() for d in doc_ids.split(",") if d.strip()]
+    unknown = [d for d in selected if d not in _stored_docs]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document(s): {', '.join(unknown)}")
+    return selected
+
+
+# -----------------------------
+# Workspace: multi-document management & clause comparison
+# -----------------------------
+@app.get("/documents")
+async def list_documents():
+    await _sync()
+    return {"active_doc_id": uploaded_doc_id, "documents": list(_stored_docs.values())}
+
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    await _sync()
+    if not await run_in_threadpool(store.delete, doc_id):
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document: {doc_id}")
+    workspace.remove_document(doc_id)
+    _stored_docs.pop(doc_id, None)
+    artifacts.invalidate(doc_id)
+    if doc_id == uploaded_doc_id:
+        _set_active(None, None, None, None, None)
+    return {"message": f"✅ Document {doc_id} removed from workspace."}
+
+
+@app.get("/documents/{doc_id}/artifacts")
+async def document_artifacts(doc_id: str):
+    """Background stage status per artifact: pending / ready / failed."""
+    await _sync()
+    if doc_id not in _stored_docs:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document: {doc_id}")
+    return {"doc_id": doc_id, "artifacts": artifacts.status(doc_id)}
+
+
+@app.get("/compare")
+async def compare_documents(doc_id: str, against: Optional[str] = None, top_k: int = Query(1, ge=1, le=MAX_TOP_K)):
+    """
+    Clause comparison: align each chunk of doc_id with the closest chunks
+    of the other documents (all others unless `against` is given).
+    """
+    await _sync()
+    if doc_id not in _stored_docs:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown document: {doc_id}")
+    others = _parse_doc_ids(against) if against else None
+    await run_in_threadpool(_load_documents, None if others is None else [doc_id, *others])
+    return FastJSONResponse({"doc_id": doc_id, "alignment": workspace.compare(doc_id, others, k=top_k)})
 
 # -----------------------------
 # Document Verifier endpoint
 # -----------------------------
 @app.get("/verifier")
-async def document_verifier():
+async def document_verifier(wait: bool = True):
+    """
+    Returns the precomputed result, joins the run in progress, or starts one;
+    double-clicks / several tabs on the same document share one run.
+    wait=false answers 202 while the run is in progress, for clients that poll.
+    """
+    await _sync()
     if not uploaded_doc_text or uploaded_doc_index is None:
         raise HTTPException(status_code=400, detail="⚠️ Upload a document first to run the verifier.")
-    result = run_document_verifier(uploaded_doc_text, uploaded_doc_chunks, uploaded_doc_index, FAISS_DOCS)
-
-    return result
-
+    producers = _artifact_producers(uploaded_doc_id, uploaded_doc_chunks, uploaded_doc_segments,
+                                     uploaded_doc_index)
+    task = artifacts.start(uploaded_doc_id, "verifier", producers["verifier"])
+    if not wait and not task.done():
+        return _pending(uploaded_doc_id)
+    result = await asyncio.shield(task)
+    return FastJSONResponse(result)
+
+
+
+@app.get("/verifier/stream")
+async def document_verifier_stream(offset: int = 0, limit: Optional[int] = None, fields: Optional[str] = None,
+                                   batch_size: int = VERIFY_BATCH):
+    """
+    Verifier results as NDJSON: a {"type": "rules"} line with the rule
+    checklist and score first, then one {"type": "chunk"} line per chunk in
+    [offset, offset + limit), written batch by batch as FAISS answers, then
+    {"type": "end", "next": offset of the next page or null}.
+    fields selects chunk fields, e.g. "heading,similar_cases.id,similar_cases.similarity_score"
+    to leave out the case summaries. A finished verifier run is paged
+    instead of searching again.
+    """
+    await _sync()
+    if not uploaded_doc_text or uploaded_doc_index is None:
+        raise HTTPException(status_code=400, detail="⚠️ Upload a document first to run the verifier.")
+    if offset < 0 or (limit is not None and limit < 1) or batch_size < 1:
+        raise HTTPException(status_code=400, detail="⚠️ offset must be >= 0, limit and batch_size >= 1.")
+    # Snapshot: a concurrent upload must not switch documents halfway through the stream
+    doc_id, chunks, segments, index = uploaded_doc_id, uploaded_doc_chunks, uploaded_doc_segments, uploaded_doc_index
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    stop = len(chunks) if limit is None else min(offset + limit, len(chunks))
+
+    finished = artifacts.ready(doc_id, "verifier")
+    if finished is None:
+        finished = await run_in_threadpool(store.get_artifact, doc_id, "verifier")
+
+    def lines():
+        if finished is not None:
+            rules, score = finished["rule_checklist"], finished["sufficiency_score"]
+            results = iter(finished["chunks"][offset:stop])
+        else:
+            rules, score = run_document_verifier_rules(chunks.doc.text)
+            results = iter_chunk_results(chunks, index, corpus.meta, doc_segments=segments, start=offset,
+                                         stop=stop, batch_size=batch_size)
+        yield jsonl_line({"type": "rules", "doc_id": doc_id, "sufficiency_score": score, "rule_checklist": rules,
+                          "chunks": len(chunks)})
+        for result in results:
+            yield jsonl_line({"type": "chunk", **select_fields(result, selected)})
+        yield jsonl_line({"type": "end", "next": stop if stop < len(chunks) else None})
+
+    # A sync generator: Starlette iterates it in the threadpool, so FAISS searches don't block the event loop
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _pending(doc_id):
+    return FastJSONResponse(status_code=202, content={"doc_id": doc_id, "status": "pending"})
 
 
 # -----------------------------
 # Briefings endpoint
 # -----------------------------
 @app.get("/briefings")
-async def document_briefings():
+async def document_briefings(wait: bool = True):
+    await _sync()
     if not uploaded_doc_text:
         raise HTTPException(status_code=400, detail="⚠️ Upload a document first to run briefings.")
-    brief_json = run_brief_mode("brief mode", uploaded_doc_text)
-    return {"briefings": brief_json}
+    producers = _artifact_producers(uploaded_doc_id, uploaded_doc_chunks, uploaded_doc_segments,
+                                     uploaded_doc_index)
+    task = artifacts.start(uploaded_doc_id, "briefings", producers["briefings"])
+    if not wait and not task.done():
+        return _pending(uploaded_doc_id)
+    try:
+        brief_json = await asyncio.shield(task)
+    except (LLMOverloadedError, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return FastJSONResponse({"briefings": brief_json})
+
+
 
 
+# -----------------------------
+# Translation endpoint (segment-level translation memory)
+# -----------------------------
+@app.post("/translate")
+async def translate_active_document(language: str):
+    """Translate the active document; segments translated before (in any document) are reused."""
+    await _sync()
+    if not uploaded_doc_text:
+        raise HTTPException(status_code=400, detail="⚠️ Upload a document first to translate it.")
+    try:
+        return FastJSONResponse(await translate_document(uploaded_doc_text, language))
+    except (LLMOverloadedError, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+# -----------------------------
+# Corpus updates (append / delete without a full rebuild)
+# -----------------------------
+class CorpusRecord(BaseModel):
+    id: str
+    text: str
+
+
+@app.on_event("startup")
+async def start_corpus_compactor():
+    corpus.start_background_compaction()
+
+
+@app.post("/corpus/records")
+async def append_corpus_records(records: list[CorpusRecord]):
+    if not records:
+        raise HTTPException(status_code=400, detail="⚠️ No records given.")
+    texts = [r.text.strip() for r in records]
+    try:
+        embeddings = await embed_documents_async(texts)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"⚠️ Failed to embed records: {e}")
+    # Writes take the corpus file lock (and may wait on another worker's write): keep them off the event loop
+    await run_in_threadpool(corpus.append, [r.id for r in records], texts, embeddings)
+    stats = await run_in_threadpool(corpus.stats)
+    return {"message": f"✅ Added {len(records)} records to the corpus.", "corpus": stats}
+
+
+@app.delete("/corpus/records/{case_id}")
+async def delete_corpus_record(case_id: str):
+    await run_in_threadpool(corpus.delete, [case_id])
+    stats = await run_in_threadpool(corpus.stats)
+    return {"message": f"✅ Record {case_id} removed from the corpus.", "corpus": stats}
+
+
+@app.get("/corpus/search")
+async def search_corpus(query: str, top_k: int = Query(5, ge=1, le=MAX_TOP_K), where: Optional[str] = None):
+    """
+    where filters on fields extracted at index time, inside the FAISS search
+    (top_k matching hits, no over-fetching), e.g.
+    "court=supreme court AND year>=2015 AND statute=Section 138 of the NI Act".
+    """
+    try:
+        clauses = parse_filter(where) if where else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"⚠️ {e}")
+    try:
+        q_emb = await embed_texts_async(query)
+    except (LLMOverloadedError, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if q_emb is None:
+        raise HTTPException(status_code=502, detail="⚠️ Failed to embed query.")
+    if hasattr(corpus, "search_with_status"):
+        # Sharded corpus: shards that time out are left out and reported
+        results, status = await run_in_threadpool(corpus.search_with_status, q_emb, top_k, clauses)
+    else:
+        results, status = await run_in_threadpool(corpus.search_embeddings, q_emb, top_k, clauses), None
+    hits = [{**h, "text": h["text"][:300]} for h in results[0]]
+    return {"query": query, "results": hits, **({"shards": status} if status else {})}
+
+
+@app.get("/corpus/records/{case_id}/neighbours")
+async def related_cases(case_id: str, k: int = 10, hops: int = 1, limit: int = 50):
+    """
+    Related judgments from the precomputed k-NN graph (python indexing.py --knn K):
+    no embedding or vector search. hops > 1 also follows neighbours of
+    neighbours, ranked by path similarity. Deleted records are skipped.
+    """
+    if k < 1 or not 1 <= hops <= 3 or limit < 1:
+        raise HTTPException(status_code=400, detail="⚠️ k and limit must be >= 1 and hops between 1 and 3.")
+    graph = load_knn_graph("data", CORPUS_NAME)
+    if graph is None:
+        raise HTTPException(status_code=404, detail="⚠️ No k-NN graph: run `python indexing.py --knn K` first.")
+    deleted = await run_in_threadpool(lambda: corpus.tombstones)
+    if hops == 1:
+        related = graph.neighbours(case_id, k=min(k, limit), exclude=deleted)
+    else:
+        related = graph.expand(case_id, hops=hops, k=k, limit=limit, exclude=deleted)
+    if related is None or case_id in deleted:
+        raise HTTPException(status_code=404, detail=f"⚠️ {case_id} is not in the k-NN graph.")
+    return {"id": case_id, "hops": hops, "related": related}
+
+
+@app.get("/corpus/stats")
+async def corpus_stats():
+    return await run_in_threadpool(corpus.stats)
+
+
+# -----------------------------
+# Batch jobs (directory / manifest of documents on the server)
+# -----------------------------
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "data/batch")
+batch_jobs = {}  # job_id -> (BatchRun, asyncio.Task)
+
+
+class BatchRequest(BaseModel):
+    source: Optional[str] = None        # directory or manifest file
+    paths: Optional[list[str]] = None   # or explicit file paths
+    stages: list[str] = list(BATCH_STAGES)
+    job_id: Optional[str] = None        # re-submit an existing job id to resume it
+
+
+@app.post("/batch")
+async def start_batch(req: BatchRequest):
+    if not req.source and not req.paths:
+        raise HTTPException(status_code=400, detail="⚠️ Give a source directory/manifest or a list of paths.")
+    try:
+        paths = list(req.paths or []) + (collect_paths(req.source) if req.source else [])
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=f"⚠️ Cannot read batch source: {e}")
+    job_id = req.job_id or uuid.uuid4().hex[:12]
+    if job_id in batch_jobs and not batch_jobs[job_id][1].done():
+        raise HTTPException(status_code=409, detail=f"⚠️ Batch {job_id} is still running.")
+
+    # Results (and checkpoints) go to one NDJSON file per job
+    run = BatchRun(paths, os.path.join(BATCH_OUTPUT_DIR, f"{job_id}.ndjson"), stages=req.stages)
+    batch_jobs[job_id] = (run, asyncio.create_task(run.run()))
+    return {"job_id": job_id, **run.progress()}
+
+
+@app.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    if job_id not in batch_jobs:
+        raise HTTPException(status_code=404, detail=f"⚠️ Unknown batch job: {job_id}")
+    run, task = batch_jobs[job_id]
+    if task.done() and task.exception() is not None:
+        return {"job_id": job_id, **run.report(), "status": "error", "error": str(task.exception())}
+    return {"job_id": job_id, **run.report()}
 
 
 # -----------------------------
@@ -137,18 +720,30 @@ async def document_briefings():
 async def health_check():
     return {"status": "✅ Legal AI Assistant is up and running!"}
 
+@app.get("/stats")
+async def service_stats():
+    return {
+        "llm": await llm_client.stats(),
+        "artifact_cache": artifact_cache.stats(),
+        "corpus": await run_in_threadpool(corpus.stats),
+        "workspace": {"documents": len(_stored_docs), "loaded": len(workspace.docs), "chunks": workspace.ntotal},
+        "docstore": store.stats(),
+        "singleflight": singleflight.stats(),
+        "chat_memory": chat_memory.stats(),
+    }
+
 @app.get("/")
 def root():
     return {"message": "Levi Legal AI API is running! Use /docs to explore endpoints."}
 
 @app.post("/reset")
 async def reset_system():
-    global uploaded_doc_text, uploaded_doc_chunks, uploaded_doc_embeddings, uploaded_doc_index
-
-    uploaded_doc_text = None
-    uploaded_doc_chunks = None
-    uploaded_doc_embeddings = None
-    uploaded_doc_index = None
+    # Shared state: clears the documents of every worker
+    await run_in_threadpool(store.clear)
+    _set_active(None, None, None, None, None)
+    workspace.clear()
+    _stored_docs.clear()
+    artifacts.invalidate()
 
     return {"message": "✅ System reset successfully. All uploaded data cleared."}
 
@@ -0,0 +1,92 @@
+import os
+import asyncio
+
+from utils.singleflight import singleflight
+
+# ========== CONFIG ==========
+# Artifacts computed in the background right after ingestion, e.g. "verifier,briefings".
+# Empty (default) keeps the old on-demand behaviour.
+PRECOMPUTE_ARTIFACTS = [a.strip() for a in os.getenv("PRECOMPUTE_ARTIFACTS", "").split(",") if a.strip()]
+ARTIFACT_TASKS_MAX = 256   # finished tasks kept in memory (results stay in the docstore); running ones are never dropped
+# ============================
+
+
+class DocumentArtifacts:
+    """
+    Per-document results of expensive stages (verifier, briefings).
+    Each artifact is an asyncio task: GET endpoints await it, which returns
+    immediately once done or attaches to the computation in progress.
+    """
+
+    def __init__(self, precompute=PRECOMPUTE_ARTIFACTS, max_tasks=ARTIFACT_TASKS_MAX):
+        self.precompute = set(precompute)
+        self.max_tasks = max_tasks
+        self._tasks = {}  # (doc_id, name) -> asyncio.Task, oldest first
+
+    def _start(self, doc_id, name, fn):
+        task = asyncio.ensure_future(singleflight.do((name, doc_id), fn))
+
+        def _log_failure(t):
+            if not t.cancelled() and t.exception() is not None:
+                print(f"❌ {name} for {doc_id} failed: {t.exception()}")
+        task.add_done_callback(_log_failure)
+        self._tasks.pop((doc_id, name), None)  # re-inserted as the newest
+        self._tasks[(doc_id, name)] = task
+        self._prune()
+        return task
+
+    def _prune(self):
+        """Forget the oldest finished tasks once more than max_tasks are held."""
+        excess = len(self._tasks) - self.max_tasks
+        for key in [k for k, t in self._tasks.items() if t.done()][:max(excess, 0)]:
+            del self._tasks[key]
+
+    def schedule(self, doc_id, producers):
+        """Kick off background computation of the configured artifacts. producers: name -> fn."""
+        for name, fn in producers.items():
+            if name in self.precompute:
+                self._start(doc_id, name, fn)
+
+    def start(self, doc_id, name, fn):
+        """Task for artifact `name`, started now unless it is already running or done (failed runs restart)."""
+        task = self._tasks.get((doc_id, name))
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = self._start(doc_id, name, fn)
+        return task
+
+    async def get(self, doc_id, name, fn):
+        """Result of artifact `name`, computing it now if it was not precomputed (or failed)."""
+        return await asyncio.shield(self.start(doc_id, name, fn))
+
+    def ready(self, doc_id, name):
+        """Result of artifact `name` if it finished successfully in this worker, else None."""
+        task = self._tasks.get((doc_id, name))
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    def status(self, doc_id):
+        out = {}
+        for (d, name), task in self._tasks.items():
+            if d != doc_id:
+                continue
+            if not task.done():
+                out[name] = "pending"
+            elif task.cancelled() or task.exception() is not None:
+                out[name] = "failed"
+            else:
+                out[name] = "ready"
+        return out
+
+    def invalidate(self, doc_id=None):
+        """
+        Drop stored results for one document (or all), cancelling work in
+        progress. The shared singleflight computation is cancelled too: the
+        task here only awaits it through a shield.
+        """
+        for key in list(self._tasks):
+            if doc_id is None or key[0] == doc_id:
+                task = self._tasks.pop(key)
+                if not task.done():
+                    task.cancel()
+                    singleflight.cancel((key[1], key[0]))
@@ -0,0 +1,341 @@
+import os
+import sys
+import json
+import zlib
+import heapq
+import argparse
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+import numpy as np
+
+from corpus import CorpusIndex, CORPUS_DIR, CORPUS_NAME
+from utils.serialization import read_json
+
+# ========== CONFIG ==========
+# How shards listed in <name>.shards.json are served:
+#   "local"   → in-process, searched from a thread pool (FAISS releases the GIL)
+#   "process" → one worker process per shard (local stand-in for shard servers)
+#   "http://host:port,http://host:port" → shard servers (python sharding.py serve ...), listed in shard order
+CORPUS_SHARDS = os.getenv("CORPUS_SHARDS", "local")
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "2.0"))   # seconds; late shards are left out of the merge
+# ============================
+
+
+def shard_for(case_id, num_shards):
+    """Stable shard of a record id (used at build time and to route appends/deletes)."""
+    return zlib.crc32(str(case_id).encode("utf-8")) % num_shards
+
+
+def shard_name(name, shard):
+    return f"{name}.s{shard}"
+
+
+def shards_manifest_path(corpus_dir=CORPUS_DIR, name=CORPUS_NAME):
+    return os.path.join(corpus_dir, f"{name}.shards.json")
+
+
+# -----------------------------
+# Shard backends: search / append / delete / meta / stats
+# -----------------------------
+class LocalShard:
+    """Shard loaded in this process."""
+
+    def __init__(self, corpus_dir, name):
+        self.label = name
+        self.corpus = CorpusIndex(corpus_dir, name)
+
+    def call(self, op, *args):
+        if op == "search":
+            return self.corpus.search_embeddings(*args)
+        if op == "meta":
+            return {"ids": self.corpus.meta["ids"], "texts": self.corpus.meta["texts"]}
+        if op == "tombstones":
+            return sorted(self.corpus.tombstones)
+        if op == "start_compaction":
+            self.corpus.start_background_compaction()
+            return None
+        return getattr(self.corpus, op)(*args)
+
+    def close(self):
+        self.corpus.stop()
+
+
+def _shard_worker(conn, corpus_dir, name):
+    shard = LocalShard(corpus_dir, name)
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        req_id, op, args = msg
+        try:
+            conn.send((req_id, True, shard.call(op, *args)))
+        except Exception as e:
+            conn.send((req_id, False, f"{type(e).__name__}: {e}"))
+
+
+class ProcessShard:
+    """
+    Shard held by a dedicated worker process, talking over a pipe.
+    Requests are multiplexed by id, so a slow search does not block the
+    caller past its timeout.
+    """
+
+    def __init__(self, corpus_dir, name):
+        self.label = name
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(target=_shard_worker, args=(child, corpus_dir, name),
+                                 name=f"shard-{name}", daemon=True)
+        self._proc.start()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, name=f"shard-{name}-rx", daemon=True).start()
+
+    def _receive(self):
+        while True:
+            try:
+                req_id, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                for fut in self._pending.values():
+                    fut.set_exception(ConnectionError(f"shard {self.label} exited"))
+                self._pending.clear()
+                return
+            fut = self._pending.pop(req_id, None)
+            if fut is None:
+                continue  # caller already gave up (timeout)
+            if ok:
+                fut.set_result(result)
+            else:
+                fut.set_exception(RuntimeError(result))
+
+    def call(self, op, *args, timeout=None):
+        fut = Future()
+        req_id = next(self._ids)
+        self._pending[req_id] = fut
+        with self._send_lock:
+            self._conn.send((req_id, op, args))
+        try:
+            return fut.result(timeout=timeout)
+        finally:
+            self._pending.pop(req_id, None)
+
+    def close(self):
+        with self._send_lock:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+        self._proc.join(timeout=5)
+
+
+class HttpShard:
+    """Shard served by a remote shard server (see serve())."""
+
+    def __init__(self, url):
+        import requests
+        self.label = url.rstrip("/")
+        self._session = requests.Session()
+
+    def call(self, op, *args, timeout=None):
+        if op == "search":
+            q_emb, k, where = (*args, None)[:3]
+            payload = {"embeddings": np.atleast_2d(q_emb).astype("float32").tolist(), "k": k, "where": where}
+        elif op in ("append", "delete"):
+            payload = {"args": [a.tolist() if isinstance(a, np.ndarray) else a for a in args]}
+        else:
+            payload = {}
+        resp = self._session.post(f"{self.label}/{op}", json=payload, timeout=timeout or SHARD_TIMEOUT * 10)
+        resp.raise_for_status()
+        return resp.json()["result"]
+
+    def close(self):
+        self._session.close()
+
+
+# -----------------------------
+# Scatter-gather over shards
+# -----------------------------
+class ShardedCorpus:
+    """
+    Corpus split into shards at build time (indexing.py --shards N).
+    Same interface as CorpusIndex: searches go to every shard in
+    parallel and the per-shard top-k lists are merged by score; writes
+    are routed to the shard owning each id. A shard that misses
+    SHARD_TIMEOUT is left out, so callers get partial results instead
+    of waiting on the slowest shard.
+    """
+
+    def __init__(self, shards, timeout=SHARD_TIMEOUT):
+        self.shards = shards
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max(4, len(shards) * 2), thread_name_prefix="shard")
+        self._meta = None
+        self.searches = 0
+        self.partial_searches = 0
+        self.shard_timeouts = {s.label: 0 for s in shards}
+
+    def _call(self, shard, op, *args):
+        if isinstance(shard, LocalShard):
+            return shard.call(op, *args)
+        return shard.call(op, *args, timeout=self.timeout if op == "search" else None)
+
+    def search_with_status(self, q_emb, k=5, where=None):
+        """(results, status): status lists shards that failed or timed out. where: see CorpusIndex.search_embeddings."""
+        futures = {self._pool.submit(self._call, s, "search", q_emb, k, where): s for s in self.shards}
+        done, _ = wait(futures, timeout=self.timeout)
+        n_queries = len(np.atleast_2d(q_emb))
+        per_query = [[] for _ in range(n_queries)]
+        missing = []
+        for fut, shard in futures.items():
+            if fut not in done:
+                missing.append({"shard": shard.label, "error": "timeout"})
+                self.shard_timeouts[shard.label] += 1
+                continue
+            try:
+                for q, hits in enumerate(fut.result()):
+                    per_query[q] += hits
+            except Exception as e:
+                missing.append({"shard": shard.label, "error": str(e) or type(e).__name__})
+
+        self.searches += 1
+        if missing:
+            self.partial_searches += 1
+        results = [heapq.nlargest(k, hits, key=lambda h: h["score"]) for hits in per_query]
+        status = {"shards": len(self.shards), "answered": len(self.shards) - len(missing), "missing": missing}
+        return results, status
+
+    def search_embeddings(self, q_emb, k=5, where=None):
+        return self.search_with_status(q_emb, k, where)[0]
+
+    def _by_shard(self, ids):
+        groups = {}
+        for i, case_id in enumerate(ids):
+            groups.setdefault(shard_for(case_id, len(self.shards)), []).append(i)
+        return groups
+
+    def append(self, ids, texts, embeddings):
+        vectors = np.array(embeddings, dtype="float32").reshape(len(ids), -1)
+        for shard, rows in self._by_shard(ids).items():
+            self._call(self.shards[shard], "append", [ids[i] for i in rows], [texts[i] for i in rows], vectors[rows])
+        self._meta = None
+
+    def delete(self, ids):
+        ids = list(ids)
+        for shard, rows in self._by_shard(ids).items():
+            self._call(self.shards[shard], "delete", [ids[i] for i in rows])
+        self._meta = None
+
+    @property
+    def meta(self):
+        """ids / texts of all shards, concatenated (fetched once, refreshed after writes)."""
+        if self._meta is None:
+            meta = {"ids": [], "texts": []}
+            for shard in self.shards:
+                part = self._call(shard, "meta")
+                meta["ids"] += part["ids"]
+                meta["texts"] += part["texts"]
+            self._meta = meta
+        return self._meta
+
+    @property
+    def tombstones(self):
+        """Deleted / superseded ids of all shards."""
+        deleted = set()
+        for shard in self.shards:
+            deleted.update(self._call(shard, "tombstones"))
+        return deleted
+
+    def start_background_compaction(self):
+        for shard in self.shards:
+            self._call(shard, "start_compaction")
+
+    def stop(self):
+        for shard in self.shards:
+            shard.close()
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        per_shard = []
+        for shard in self.shards:
+            try:
+                per_shard.append({"shard": shard.label, **self._call(shard, "stats")})
+            except Exception as e:
+                per_shard.append({"shard": shard.label, "error": str(e)})
+        return {
+            "shards": per_shard,
+            "main": sum(s.get("main", 0) for s in per_shard),
+            "delta": sum(s.get("delta", 0) for s in per_shard),
+            "tombstones": sum(s.get("tombstones", 0) for s in per_shard),
+            "searches": self.searches,
+            "partial_searches": self.partial_searches,
+            "shard_timeouts": self.shard_timeouts,
+        }
+
+
+def load_corpus(corpus_dir=CORPUS_DIR, name=CORPUS_NAME, mode=CORPUS_SHARDS):
+    """
+    The corpus to search: a ShardedCorpus if indexing.py wrote a shard
+    manifest (or shard servers are configured), else a single CorpusIndex.
+    """
+    if mode.startswith("http"):
+        return ShardedCorpus([HttpShard(url.strip()) for url in mode.split(",") if url.strip()])
+    manifest = shards_manifest_path(corpus_dir, name)
+    if not os.path.exists(manifest):
+        return CorpusIndex(corpus_dir, name)
+    names = read_json(manifest)["names"]
+    shard_cls = ProcessShard if mode == "process" else LocalShard
+    return ShardedCorpus([shard_cls(corpus_dir, n) for n in names])
+
+
+# -----------------------------
+# Shard server
+# -----------------------------
+def serve(corpus_dir, name, host="0.0.0.0", port=8100):
+    """Serve one shard over HTTP for HttpShard clients."""
+    import uvicorn
+    from fastapi import FastAPI, Body
+
+    shard = LocalShard(corpus_dir, name)
+    shard.call("start_compaction")
+    app = FastAPI(title=f"Corpus shard {name}")
+
+    @app.post("/search")
+    def search(payload: dict = Body(...)):
+        return {"result": shard.call("search", np.array(payload["embeddings"], dtype="float32"), payload["k"],
+                                     payload.get("where"))}
+
+    @app.post("/{op}")
+    def other(op: str, payload: dict = Body(default={})):
+        if op not in ("append", "delete", "meta", "tombstones", "stats"):
+            return {"result": None}
+        return {"result": shard.call(op, *payload.get("args", []))}
+
+    uvicorn.run(app, host=host, port=port)
+
+
+def main():
+    """
+    python sharding.py serve --shard faiss_index.s0 --port 8101   # one shard server
+    python sharding.py stats                                       # per-shard sizes
+    """
+    parser = argparse.ArgumentParser(description="Corpus shard server / tools")
+    parser.add_argument("command", choices=["serve", "stats"])
+    parser.add_argument("--dir", default=CORPUS_DIR)
+    parser.add_argument("--shard", help="shard name, e.g. faiss_index.s0")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    if args.command == "serve":
+        if not args.shard:
+            sys.exit("--shard is required")
+        serve(args.dir, args.shard, args.host, args.port)
+    else:
+        corpus = load_corpus(args.dir)
+        print("📊", json.dumps(corpus.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+
+from llm_client import llm_client, GEMINI_MODEL
+from briefings import extract_json
+
+# ========== CONFIG ==========
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "data/translation_memory.sqlite")
+BATCH_MAX_SEGMENTS = 40      # segments per translation prompt
+BATCH_MAX_CHARS = 6000       # source characters per translation prompt
+LOOKUP_CHUNK = 500           # hashes per SQLite IN (...) query
+# ============================
+
+# Sentence ends: . ; ! ? followed by whitespace and an upper-case letter / opening quote, or end of line
+_SENTENCE = re.compile(r"\S.*?(?:[.;!?](?=\s+[A-Z\"“(])|$)", re.M)
+# Sentences ending in these are continued (Pvt. Ltd., Sec. 5, Rs. 500 ...)
+_ABBREVIATIONS = {"pvt.", "ltd.", "no.", "nos.", "sec.", "s.", "rs.", "mr.", "mrs.", "ms.", "dr.", "co.", "inc.",
+                  "vs.", "v.", "i.e.", "e.g.", "viz.", "art.", "cl.", "para.", "st."}
+_LANGUAGE = re.compile(r"\b(?:to|into|in)\s+([a-z]+)\b", re.I)
+
+
+def split_segments(text):
+    """(start, end) spans of the sentence / clause-line segments of text; everything between them is whitespace."""
+    spans = []
+    for m in _SENTENCE.finditer(text):
+        start, end = m.start(), m.end()
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if spans and "\n" not in text[spans[-1][1]:start] and \
+                text[spans[-1][0]:spans[-1][1]].rsplit(None, 1)[-1].lower() in _ABBREVIATIONS:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def segment_key(segment):
+    """Translation memory key of a segment: whitespace-normalized SHA-256."""
+    return hashlib.sha256(" ".join(segment.split()).encode("utf-8")).hexdigest()
+
+
+def target_language(query):
+    """'translate this to Hindi' → 'hindi' (None if no target language is named)."""
+    m = _LANGUAGE.search(query.lower().split("translate", 1)[-1])
+    return m.group(1).lower() if m and m.group(1).lower() not in ("the", "a", "an", "this", "it") else None
+
+
+class TranslationMemory:
+    """
+    Persistent segment translations keyed by (segment hash, target language),
+    in SQLite so every worker and the CLI share it.
+    """
+
+    def __init__(self, path=TRANSLATION_MEMORY_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS memory (segment_hash TEXT NOT NULL, language TEXT NOT NULL, "
+                         "source TEXT NOT NULL, target TEXT NOT NULL, model TEXT, created REAL NOT NULL, "
+                         "PRIMARY KEY (segment_hash, language))")
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def lookup(self, keys, language):
+        """{segment hash: translation} for the keys already translated into language."""
+        keys = list(keys)
+        found = {}
+        with self._db() as conn:
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                part = keys[i:i + LOOKUP_CHUNK]
+                rows = conn.execute(f"SELECT segment_hash, target FROM memory WHERE language = ? AND segment_hash "
+                                    f"IN ({','.join('?' * len(part))})", [language, *part])
+                found.update(rows)
+        return found
+
+    def store(self, entries, language, model=None):
+        """entries: [(segment hash, source, translation)]."""
+        now = time.time()
+        with self._db() as conn:
+            conn.executemany("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?)",
+                             [(key, language, source, target, model, now) for key, source, target in entries])
+
+    def stats(self):
+        with self._db() as conn:
+            rows = conn.execute("SELECT language, COUNT(*) FROM memory GROUP BY language").fetchall()
+        return dict(rows)
+
+
+_memory = None
+
+
+def get_memory():
+    """Process-wide translation memory, opened on first use."""
+    global _memory
+    if _memory is None:
+        _memory = TranslationMemory()
+    return _memory
+
+
+def _batch_prompt(segments, language):
+    return f"""
+You are a legal translator. Translate each segment of the JSON array below into {language}.
+- Keep clause numbers, defined terms, party names, dates, amounts and references exactly as written.
+- Do not merge, split, summarize or explain segments.
+- Return ONLY a JSON array of exactly {len(segments)} strings, the translations in the same order.
+
+Segments:
+{json.dumps(segments, ensure_ascii=False)}
+"""
+
+
+def _single_prompt(segment, language):
+    return (f"Translate this legal text into {language}. Keep clause numbers, defined terms, names, dates and "
+            f"amounts as written. Return only the translation.\n\n{segment}")
+
+
+def _batches(items):
+    """Group (key, segment) pairs into prompts bounded by BATCH_MAX_SEGMENTS / BATCH_MAX_CHARS."""
+    batch, chars = [], 0
+    for key, segment in items:
+        if batch and (len(batch) >= BATCH_MAX_SEGMENTS or chars + len(segment) > BATCH_MAX_CHARS):
+            yield batch
+            batch, chars = [], 0
+        batch.append((key, segment))
+        chars += len(segment)
+    if batch:
+        yield batch
+
+
+async def _translate_batch(segments, language, model, priority):
+    """Translations of segments, in order. A malformed batch answer is retried as two halves."""
+    if len(segments) == 1:
+        text = await llm_client.generate(_single_prompt(segments[0], language), model=model, priority=priority)
+        return [text.strip()]
+    text = await llm_client.generate(_batch_prompt(segments, language), model=model, priority=priority)
+    result = extract_json(text)
+    if isinstance(result, list) and len(result) == len(segments) and all(isinstance(t, str) for t in result):
+        return [t.strip() for t in result]
+    mid = len(segments) // 2
+    left, right = await asyncio.gather(_translate_batch(segments[:mid], language, model, priority),
+                                       _translate_batch(segments[mid:], language, model, priority))
+    return left + right
+
+
+async def translate_document(text, language, model=GEMINI_MODEL, memory=None, priority="briefings"):
+    """
+    Translate a document segment by segment. Segments already in the
+    translation memory are reused; the rest (deduplicated) are translated in
+    batches, all batches in parallel, and stored. Whitespace between
+    segments is kept, so the output follows the original layout.
+    Returns {"language", "translation", "segments", "from_memory", "translated", "batches"}.
+    """
+    language = language.strip().lower()
+    memory = memory or await asyncio.to_thread(get_memory)
+    spans = split_segments(text)
+    segments = [text[s:e] for s, e in spans]
+    # Numbers, clause labels and punctuation-only segments are kept as they are
+    keys = [segment_key(seg) if any(c.isalpha() for c in seg) else None for seg in segments]
+
+    # SQLite reads / writes run in a thread, off the event loop
+    known = await asyncio.to_thread(memory.lookup, {k for k in keys if k}, language)
+    missing = {}
+    for key, seg in zip(keys, segments):
+        if key and key not in known:
+            missing.setdefault(key, seg)
+
+    batches = list(_batches(missing.items()))
+    results = await asyncio.gather(*[
+        _translate_batch([seg for _, seg in batch], language, model, priority) for batch in batches
+    ], return_exceptions=True)
+    new, error = [], None
+    for batch, translations in zip(batches, results):
+        if isinstance(translations, BaseException):
+            error = error or translations
+            continue
+        for (key, seg), translated in zip(batch, translations):
+            known[key] = translated
+            new.append((key, seg, translated))
+    if new:
+        # Batches that succeeded are kept even if another one failed: a retry only translates the rest
+        await asyncio.to_thread(memory.store, new, language, model)
+    if error is not None:
+        raise error
+
+    parts, pos = [], 0
+    for (start, end), key, seg in zip(spans, keys, segments):
+        parts.append(text[pos:start])
+        parts.append(known[key] if key else seg)
+        pos = end
+    parts.append(text[pos:])
+    return {
+        "language": language,
+        "translation": "".join(parts),
+        "segments": len(segments),
+        "from_memory": sum(1 for k in keys if k and k not in missing),
+        "translated": len(missing),
+        "batches": len(batches),
+    }
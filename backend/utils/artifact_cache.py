@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+import faiss
+
+from utils.file_loader import EXTRACTOR_VERSION
+from utils.embeddings import EMBED_MODEL
+from utils.vector_index import QUANTIZATION, USE_PCA
+from utils.segmenter import SEGMENTER_VERSION, CLAUSE_MAX_WORDS, clause_chunks
+from utils.document import DocumentText
+
+# ========== CONFIG ==========
+CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", "data/artifact_cache")
+CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_MB", "2048")) * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024   # bytes read per step while streaming uploads
+CACHE_LAYOUT = "2"              # bump when the on-disk entry format changes
+EVICT_INTERVAL = 300            # seconds between background eviction passes
+# ============================
+
+
+def cache_namespace():
+    """
+    Version tag for cached artifacts. Any change to the extractor, the
+    embedding model, the clause segmentation or the vector storage type
+    lands in a new namespace, so stale artifacts are never served.
+    """
+    model = EMBED_MODEL.replace("/", "_")
+    storage = QUANTIZATION + ("-pca" if USE_PCA else "")
+    return f"l{CACHE_LAYOUT}-x{EXTRACTOR_VERSION}-{model}-seg{SEGMENTER_VERSION}w{CLAUSE_MAX_WORDS}-{storage}"
+
+
+def new_hasher():
+    return hashlib.sha256()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactCache:
+    """
+    Persistent content-addressed cache of ingestion artifacts
+    (extracted text, its word offset table, page offsets, clause headings
+    and offsets, embeddings, per-document FAISS index). Clause texts are
+    not stored separately; they are views over the text.
+    Entries are keyed by the SHA-256 of the uploaded bytes and evicted
+    least-recently-used, in a background pass, once the cache grows past
+    max_bytes. Entries of older namespaces are not served and age out first.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, namespace=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.namespace = namespace or cache_namespace()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._evicting = threading.Lock()
+        self._last_evict = 0.0
+        os.makedirs(self._ns_dir(), exist_ok=True)
+
+    def _ns_dir(self):
+        return os.path.join(self.root, self.namespace)
+
+    def _entry_dir(self, content_hash):
+        return os.path.join(self._ns_dir(), content_hash[:2], content_hash)
+
+    def get(self, content_hash, mmap=True):
+        """
+        Return cached artifacts for content_hash, or None on a miss.
+        Embeddings and word offsets are memory-mapped from disk unless mmap=False.
+        """
+        entry = self._entry_dir(content_hash)
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            self.misses += 1
+            return None
+        try:
+            with open(os.path.join(entry, "text.txt"), "r", encoding="utf-8") as f:
+                text = f.read()
+            doc = DocumentText(text, np.load(os.path.join(entry, "words.npy"), mmap_mode="r" if mmap else None))
+            with open(os.path.join(entry, "segments.json"), "r", encoding="utf-8") as f:
+                segments = json.load(f)
+            embeddings = np.load(os.path.join(entry, "embeddings.npy"), mmap_mode="r" if mmap else None)
+            index = faiss.read_index(os.path.join(entry, "index.faiss"))
+            with open(meta_path, "r", encoding="utf-8") as f:
+                pages = json.load(f).get("pages", [])
+        except Exception:
+            # Corrupt / half-evicted entry → treat as miss and drop it
+            shutil.rmtree(entry, ignore_errors=True)
+            self.misses += 1
+            return None
+
+        os.utime(meta_path)  # mark as recently used for LRU eviction
+        self.hits += 1
+        return {"doc": doc, "segments": segments, "chunks": clause_chunks(doc, segments),
+                "embeddings": embeddings, "index": index, "pages": pages}
+
+    def put(self, content_hash, doc, segments, embeddings, index, filename=None, pages=None):
+        """
+        Store artifacts atomically (a concurrent put of the same bytes wins
+        harmlessly), then schedule an eviction pass.
+        """
+        entry = self._entry_dir(content_hash)
+        if os.path.exists(entry):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = f"{entry}.tmp-{os.getpid()}-{time.time_ns()}"
+        os.makedirs(tmp)
+        try:
+            with open(os.path.join(tmp, "text.txt"), "w", encoding="utf-8") as f:
+                f.write(doc.text)
+            np.save(os.path.join(tmp, "words.npy"), np.asarray(doc.starts))
+            with open(os.path.join(tmp, "segments.json"), "w", encoding="utf-8") as f:
+                json.dump(segments, f, ensure_ascii=False)
+            np.save(os.path.join(tmp, "embeddings.npy"), np.asarray(embeddings, dtype="float32"))
+            faiss.write_index(index, os.path.join(tmp, "index.faiss"))
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"filename": filename, "created": time.time(), "pages": pages or []}, f)
+            try:
+                os.replace(tmp, entry)
+            except OSError:
+                # Another upload of the same bytes stored the entry first (ENOTEMPTY)
+                if not os.path.exists(entry):
+                    raise
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self._schedule_evict()
+
+    def _schedule_evict(self):
+        """Run evict() in a background thread, at most once per EVICT_INTERVAL."""
+        if time.time() - self._last_evict < EVICT_INTERVAL or not self._evicting.acquire(blocking=False):
+            return
+        self._last_evict = time.time()
+
+        def run():
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"⚠️ Artifact cache eviction failed: {e}")
+            finally:
+                self._evicting.release()
+
+        threading.Thread(target=run, name="artifact-cache-evict", daemon=True).start()
+
+    def evict(self):
+        """Drop least-recently-used entries (any namespace) until the cache is under max_bytes."""
+        if not os.path.isdir(self.root):
+            return
+        entries = []
+        for ns in os.listdir(self.root):
+            ns_dir = os.path.join(self.root, ns)
+            if not os.path.isdir(ns_dir):
+                continue
+            for prefix in os.listdir(ns_dir):
+                prefix_dir = os.path.join(ns_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for name in os.listdir(prefix_dir):
+                    entry = os.path.join(prefix_dir, name)
+                    try:
+                        used = os.path.getmtime(os.path.join(entry, "meta.json"))
+                    except OSError:
+                        continue  # being written
+                    # Entries of older namespaces are never read again: evict them first
+                    entries.append((ns == self.namespace, used, _dir_size(entry), entry))
+
+        total = sum(size for _, _, size, _ in entries)
+        for _, _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self.evicted += 1
+
+    def stats(self):
+        return {"namespace": self.namespace, "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
@@ -0,0 +1,291 @@
+import os
+import re
+from collections import Counter
+import numpy as np
+import faiss
+
+# ========== CONFIG ==========
+FIELDS_HEAD_CHARS = 4000     # court / date / jurisdiction are read from the start of a judgment
+YEAR_RANGE = (1900, 2100)
+# ============================
+
+FIELDS = ("court", "year", "statute", "jurisdiction")
+
+# Jurisdictions: Indian states / union territories, and seats of courts named after cities
+_PLACES = [
+    "andhra pradesh", "arunachal pradesh", "assam", "bihar", "chhattisgarh", "goa", "gujarat", "haryana",
+    "himachal pradesh", "jharkhand", "karnataka", "kerala", "madhya pradesh", "maharashtra", "manipur",
+    "meghalaya", "mizoram", "nagaland", "odisha", "orissa", "punjab", "rajasthan", "sikkim", "tamil nadu",
+    "telangana", "tripura", "uttar pradesh", "uttarakhand", "west bengal", "delhi", "jammu and kashmir",
+    "ladakh", "chandigarh", "puducherry", "bombay", "calcutta", "madras", "allahabad", "patna", "gauhati",
+]
+_SEATS = {"bombay": "maharashtra", "calcutta": "west bengal", "madras": "tamil nadu", "allahabad": "uttar pradesh",
+          "patna": "bihar", "gauhati": "assam", "orissa": "odisha", "punjab": "punjab and haryana"}
+_PLACE = "|".join(sorted((re.escape(p) for p in _PLACES), key=len, reverse=True))
+
+_COURTS = [
+    (re.compile(r"\bsupreme\s+court\s+of\s+india\b|\bin\s+the\s+supreme\s+court\b", re.I), "supreme court"),
+    (re.compile(rf"\bhigh\s+court\s+(?:of\s+(?:judicature\s+(?:at|for)\s+)?)?({_PLACE})\b", re.I), "high court"),
+    (re.compile(rf"\b({_PLACE})(?:\s+and\s+haryana)?\s+high\s+court\b", re.I), "high court"),
+    (re.compile(r"\bnational\s+company\s+law\s+appellate\s+tribunal\b|\bNCLAT\b", re.I), "nclat"),
+    (re.compile(r"\bnational\s+company\s+law\s+tribunal\b|\bNCLT\b", re.I), "nclt"),
+    (re.compile(r"\bincome\s+tax\s+appellate\s+tribunal\b|\bITAT\b", re.I), "itat"),
+    (re.compile(r"\bconsumer\s+(?:disputes\s+redressal\s+)?(?:commission|forum)\b", re.I), "consumer commission"),
+    (re.compile(r"\b(?:district|sessions|civil)\s+(?:and\s+sessions\s+)?(?:court|judge)\b", re.I), "district court"),
+    (re.compile(r"\bsupreme\s+court\b", re.I), "supreme court"),
+    (re.compile(r"\bhigh\s+court\b", re.I), "high court"),
+]
+_AT_PLACE = re.compile(rf"\b(?:at|bench)\s*[:,]?\s*(?:new\s+)?({_PLACE})\b", re.I)
+_PLACE_ANYWHERE = re.compile(rf"\b({_PLACE})\b", re.I)
+
+_MONTHS = r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+_DATED = re.compile(
+    rf"\b(?:decided|dated|pronounced|delivered|judgment)\b[^\n]{{0,40}}?"
+    rf"(?:\d{{1,2}}[./-]\d{{1,2}}[./-]((?:19|20)\d\d)|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:{_MONTHS})[,.]?\s+((?:19|20)\d\d)"
+    rf"|(?:{_MONTHS})\s+\d{{1,2}},?\s+((?:19|20)\d\d))", re.I)
+_CITATION_YEAR = re.compile(r"\((?:19|20)\d\d\)\s+\d+\s+SCC|\bAIR\s+(?:19|20)\d\d\b|\b(?:19|20)\d\d\s+SCC\b|"
+                            r"\b(?:19|20)\d\d\s+\(\d+\)\s+SCC\b")
+_YEAR = re.compile(r"(?:19|20)\d\d")
+
+_ACT_ABBREVIATIONS = {
+    "ni act": "negotiable instruments act", "ipc": "indian penal code", "crpc": "code of criminal procedure",
+    "cr.p.c": "code of criminal procedure", "cpc": "code of civil procedure", "c.p.c": "code of civil procedure",
+    "ibc": "insolvency and bankruptcy code", "it act": "income tax act", "mv act": "motor vehicles act",
+}
+_ABBREVIATION = "|".join(re.escape(a) for a in sorted(_ACT_ABBREVIATIONS, key=len, reverse=True))
+# Act names are capitalized words ending in Act / Code (case-sensitive, so "the Act" in prose is not one)
+_WORD = r"[A-Z][A-Za-z()&]*"
+_ACT = (rf"(?i:the\s+)?({_WORD}(?:\s+(?:(?:of|and|for|the)\s+)*{_WORD}){{0,6}}\s+(?:Act|Code)"
+        rf"|Code\s+of\s+(?:Criminal|Civil)\s+Procedure|(?i:{_ABBREVIATION})\b)")
+_SECTION = re.compile(rf"\b(?i:sections?|sec\.|s\.|u/s\.?)\s*(\d{{1,4}}[A-Z]?)(?:\s*\(\w{{1,4}}\))*"
+                      rf"(?:\s+(?i:of)\s+{_ACT})?")
+_ACT_ALONE = re.compile(rf"\b{_ACT}(?:,\s*(?:19|20)\d\d)?")
+_FILTER_CLAUSE = re.compile(r"^\s*(court|year|statute|jurisdiction)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$", re.I)
+
+
+def normalize_act(name):
+    name = " ".join(re.sub(r"[,.]?\s*(?:19|20)\d\d$", "", name).lower().replace(".", ". ").split()).replace(". ", ".")
+    name = re.sub(r"^the\s+", "", name)
+    return _ACT_ABBREVIATIONS.get(name, name)
+
+
+def normalize_statute(value):
+    """
+    Canonical statute value, as stored and as accepted in filters:
+    "Section 138 of the NI Act" → "negotiable instruments act s.138",
+    "Sec. 138" → "s.138", "Indian Penal Code, 1860" → "indian penal code".
+    """
+    m = _SECTION.fullmatch(value.strip())
+    if m:
+        section = f"s.{m.group(1).lower()}"
+        return f"{normalize_act(m.group(2))} {section}" if m.group(2) else section
+    return normalize_act(value.strip())
+
+
+def normalize_place(value):
+    place = " ".join(value.lower().replace("new delhi", "delhi").split())
+    return _SEATS.get(place, place)
+
+
+def extract_fields(text):
+    """{"court", "year", "statutes", "jurisdiction"} of one judgment (None / [] when not found)."""
+    head = text[:FIELDS_HEAD_CHARS]
+    court = jurisdiction = None
+    for pattern, name in _COURTS:
+        m = pattern.search(head)
+        if m:
+            court = name
+            if m.groups() and m.group(1):
+                jurisdiction = normalize_place(m.group(1))
+            break
+    if jurisdiction is None and court != "supreme court":
+        m = _AT_PLACE.search(head) or _PLACE_ANYWHERE.search(head)
+        jurisdiction = normalize_place(m.group(1)) if m else None
+    if court == "supreme court":
+        jurisdiction = "india"
+
+    year = None
+    m = _DATED.search(head)
+    if m:
+        year = int(next(g for g in m.groups() if g))
+    else:
+        m = _CITATION_YEAR.search(head)
+        if m:
+            year = int(_YEAR.search(m.group()).group())
+    if year is not None and not YEAR_RANGE[0] <= year < YEAR_RANGE[1]:
+        year = None
+
+    statutes = set()
+    for m in _SECTION.finditer(text):
+        section = f"s.{m.group(1).lower()}"
+        statutes.add(section)
+        if m.group(2):
+            act = normalize_act(m.group(2))
+            statutes.update((act, f"{act} {section}"))
+    for m in _ACT_ALONE.finditer(text):
+        statutes.add(normalize_act(m.group(1)))
+    return {"court": court, "year": year, "statutes": sorted(statutes), "jurisdiction": jurisdiction}
+
+
+def parse_filter(expr):
+    """
+    Filter expression → [(field, op, [values])]. Clauses are joined by AND
+    (or ";"), alternatives by "|":
+        "court=supreme court AND year>=2015 AND statute=Section 138 | Section 141"
+    court / jurisdiction / statute take = and !=, year also < <= > >=.
+    Raises ValueError for anything else.
+    """
+    clauses = []
+    for part in re.split(r"\s+and\s+|;", expr, flags=re.I):
+        if not part.strip():
+            continue
+        m = _FILTER_CLAUSE.match(part)
+        if not m:
+            raise ValueError(f"Bad filter clause {part.strip()!r} (expected e.g. court=supreme court, year>=2015)")
+        field, op, raw = m.group(1).lower(), m.group(2), m.group(3)
+        values = [v.strip() for v in raw.split("|") if v.strip()]
+        if field == "year":
+            try:
+                values = [int(v) for v in values]
+            except ValueError:
+                raise ValueError(f"Bad year in filter: {raw!r}")
+            if op not in ("=", "!=") and len(values) != 1:
+                raise ValueError(f"year{op} takes one value")
+        elif op not in ("=", "!="):
+            raise ValueError(f"{field} only supports = and !=")
+        elif field == "statute":
+            values = [normalize_statute(v) for v in values]
+        elif field == "jurisdiction":
+            values = [normalize_place(v) for v in values]
+        else:
+            values = [" ".join(v.lower().split()) for v in values]
+        clauses.append((field, op, values))
+    if not clauses:
+        raise ValueError("Empty filter")
+    return clauses
+
+
+class CaseFields:
+    """
+    Structured fields of every corpus record, stored by column:
+    court / jurisdiction as int16 codes into a vocabulary, year as int16
+    (0 = unknown) and statutes as a CSR list of codes per record. Filters
+    are evaluated on whole columns with NumPy into one bitmap, which FAISS
+    takes as an ID selector, so filtered search scans only matching rows
+    and still returns k hits.
+    """
+
+    def __init__(self, court, year, jurisdiction, statute_ptr, statute_codes, vocab):
+        self.court = court
+        self.year = year
+        self.jurisdiction = jurisdiction
+        self.statute_ptr = statute_ptr
+        self.statute_codes = statute_codes
+        self.vocab = vocab  # field -> [value], code = position
+        self._codes = {field: {v: i for i, v in enumerate(values)} for field, values in vocab.items()}
+
+    def __len__(self):
+        return len(self.year)
+
+    @classmethod
+    def extract(cls, texts):
+        return cls.from_records([extract_fields(t) for t in texts])
+
+    @classmethod
+    def from_records(cls, records):
+        vocab = {"court": [], "jurisdiction": [], "statute": []}
+        codes = {field: {} for field in vocab}
+
+        def code(field, value):
+            if value not in codes[field]:
+                codes[field][value] = len(vocab[field])
+                vocab[field].append(value)
+            return codes[field][value]
+
+        n = len(records)
+        court = np.full(n, -1, dtype=np.int16)
+        jurisdiction = np.full(n, -1, dtype=np.int16)
+        year = np.zeros(n, dtype=np.int16)
+        ptr = np.zeros(n + 1, dtype=np.int64)
+        statute_codes = []
+        for i, rec in enumerate(records):
+            if rec["court"]:
+                court[i] = code("court", rec["court"])
+            if rec["jurisdiction"]:
+                jurisdiction[i] = code("jurisdiction", rec["jurisdiction"])
+            year[i] = rec["year"] or 0
+            statute_codes += [code("statute", s) for s in rec["statutes"]]
+            ptr[i + 1] = len(statute_codes)
+        return cls(court, year, jurisdiction, ptr, np.array(statute_codes, dtype=np.int32), vocab)
+
+    def records(self, rows=None):
+        """Per-record dicts again (for take / concat, which re-code the vocabularies)."""
+        rows = range(len(self)) if rows is None else rows
+        v = self.vocab
+        return [{
+            "court": v["court"][self.court[r]] if self.court[r] >= 0 else None,
+            "jurisdiction": v["jurisdiction"][self.jurisdiction[r]] if self.jurisdiction[r] >= 0 else None,
+            "year": int(self.year[r]) or None,
+            "statutes": [v["statute"][c] for c in self.statute_codes[self.statute_ptr[r]:self.statute_ptr[r + 1]]],
+        } for r in rows]
+
+    def save(self, path):
+        tmp = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp, court=self.court, year=self.year, jurisdiction=self.jurisdiction,
+                 statute_ptr=self.statute_ptr, statute_codes=self.statute_codes,
+                 **{f"vocab_{field}": np.array(values, dtype=str) for field, values in self.vocab.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            vocab = {field: [str(v) for v in z[f"vocab_{field}"]] for field in ("court", "jurisdiction", "statute")}
+            return cls(z["court"], z["year"], z["jurisdiction"], z["statute_ptr"], z["statute_codes"], vocab)
+
+    def mask(self, clauses):
+        """Boolean row mask of the records matching every clause of parse_filter()."""
+        keep = np.ones(len(self), dtype=bool)
+        for field, op, values in clauses:
+            if field == "year":
+                hit = {"=": np.isin(self.year, values), "!=": ~np.isin(self.year, values),
+                       ">=": self.year >= values[0], "<=": self.year <= values[0],
+                       ">": self.year > values[0], "<": self.year < values[0]}[op]
+                if op != "!=":
+                    hit &= self.year > 0  # unknown years never satisfy a year condition
+            elif field == "statute":
+                wanted = [self._codes["statute"][v] for v in values if v in self._codes["statute"]]
+                rows = np.repeat(np.arange(len(self)), np.diff(self.statute_ptr))
+                hit = np.zeros(len(self), dtype=bool)
+                hit[rows[np.isin(self.statute_codes, wanted)]] = True
+                hit = ~hit if op == "!=" else hit
+            else:
+                column = self.court if field == "court" else self.jurisdiction
+                wanted = [self._codes[field][v] for v in values if v in self._codes[field]]
+                hit = np.isin(column, wanted)
+                hit = ~hit if op == "!=" else hit
+            keep &= hit
+        return keep
+
+    def stats(self):
+        return {
+            "records": len(self),
+            "court": dict(Counter(self.vocab["court"][c] for c in self.court if c >= 0).most_common(10)),
+            "with_year": int((self.year > 0).sum()),
+            "statutes": len(self.vocab["statute"]),
+            "jurisdiction": len(self.vocab["jurisdiction"]),
+        }
+
+
+def concat(parts):
+    """One CaseFields of several, rows in order."""
+    return CaseFields.from_records([rec for part in parts for rec in part.records()])
+
+
+def bitmap_params(mask):
+    """faiss.SearchParameters restricting a search to the rows set in mask (None if every row is)."""
+    if mask.all():
+        return None
+    bits = np.packbits(mask, bitorder="little")
+    params = faiss.SearchParameters(sel=faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)))
+    params._bits = bits  # the selector only points at the bitmap: keep it alive with the params
+    return params
@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import json
+import zlib
+import hashlib
+from multiprocessing import Pool
+import numpy as np
+
+# ========== CONFIG ==========
+NUM_PERM = 64           # MinHash signature length
+BANDS = 16              # LSH bands (NUM_PERM / BANDS rows per band)
+SHINGLE_SIZE = 5        # word n-grams
+THRESHOLD = 0.8         # estimated Jaccard at/above which records are duplicates
+EMBED_DIM = 768         # models/embedding-001
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# ============================
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(42)  # fixed seed → same signatures in every process
+_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype("uint64")
+_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype("uint64")
+_ROWS = NUM_PERM // BANDS
+
+
+def record_text(r):
+    """Text used for embedding a dataset record (same rule as utils/embeddings.py)."""
+    return (r.get("output") or r.get("input") or r.get("text", "")).strip()
+
+
+def record_id(r, i):
+    return r.get("id", f"record_{i}")
+
+
+def _normalize(text):
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def minhash(text):
+    """MinHash signature (uint32[NUM_PERM]) over word shingles."""
+    words = _normalize(text)
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles),
+                         dtype="uint64", count=len(shingles))
+    perms = (np.outer(hashes, _A) + _B) % _PRIME
+    return perms.min(axis=0).astype("uint32")
+
+
+def _signature_line(item):
+    i, line = item
+    line = line.strip()
+    if not line:
+        return None
+    r = json.loads(line)
+    text = record_text(r)
+    if not text:
+        return None
+    exact = hashlib.blake2b(" ".join(_normalize(text)).encode("utf-8"), digest_size=16).digest()
+    return i, record_id(r, i), exact, minhash(text), len(text.encode("utf-8"))
+
+
+def _read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            yield i, line
+
+
+def find_duplicates(data_path, workers=WORKERS, threshold=THRESHOLD):
+    """
+    Stream the dataset through a process pool computing MinHash signatures,
+    then cluster near-duplicates with LSH banding. The first record of each
+    cluster is its representative.
+    Returns (dup_map {duplicate_id: representative_id}, stats dict).
+    """
+    exact_reps = {}     # normalized-text hash -> representative id
+    buckets = {}        # (band, band hash) -> [representative slots]
+    rep_ids = []
+    rep_sigs = []
+    dup_map = {}
+    records = 0
+    dup_text_bytes = 0
+
+    with Pool(workers) as pool:
+        for res in pool.imap(_signature_line, _read_lines(data_path), chunksize=256):
+            if res is None:
+                continue
+            _, rid, exact, sig, nbytes = res
+            records += 1
+
+            if exact in exact_reps:
+                dup_map[rid] = exact_reps[exact]
+                dup_text_bytes += nbytes
+                continue
+
+            keys = [(b, sig[b * _ROWS:(b + 1) * _ROWS].tobytes()) for b in range(BANDS)]
+            rep = None
+            for slot in {s for k in keys for s in buckets.get(k, ())}:
+                if np.mean(rep_sigs[slot] == sig) >= threshold:
+                    rep = rep_ids[slot]
+                    break
+
+            if rep is not None:
+                dup_map[rid] = rep
+                dup_text_bytes += nbytes
+            else:
+                slot = len(rep_ids)
+                rep_ids.append(rid)
+                rep_sigs.append(sig)
+                exact_reps[exact] = rid
+                for k in keys:
+                    buckets.setdefault(k, []).append(slot)
+
+    dups = len(dup_map)
+    stats = {
+        "records": records,
+        "clusters": len(rep_ids),
+        "duplicates": dups,
+        "embedding_calls_saved": dups,
+        "index_bytes_saved": dups * EMBED_DIM * 4,
+        "metadata_bytes_saved": dup_text_bytes,
+    }
+    return dup_map, stats
+
+
+def load_or_build_dedup_map(data_path, map_path, workers=WORKERS):
+    """Reuse a saved duplicate map (keeps resumed embedding runs consistent)."""
+    if os.path.exists(map_path):
+        with open(map_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        return saved["duplicates"], saved["stats"]
+    dup_map, stats = find_duplicates(data_path, workers=workers)
+    with open(map_path, "w", encoding="utf-8") as f:
+        json.dump({"duplicates": dup_map, "stats": stats}, f, ensure_ascii=False)
+    return dup_map, stats
+
+
+def group_by_representative(dup_map):
+    groups = {}
+    for dup, rep in dup_map.items():
+        groups.setdefault(rep, []).append(dup)
+    return groups
+
+
+def print_report(stats):
+    print(f"🧹 Near-duplicate pass: {stats['records']} records → {stats['clusters']} clusters")
+    print(f"   Duplicates skipped:     {stats['duplicates']}")
+    print(f"   Embedding calls saved:  {stats['embedding_calls_saved']}")
+    print(f"   Index bytes saved:      {stats['index_bytes_saved'] / 1e6:.1f} MB "
+          f"(+ {stats['metadata_bytes_saved'] / 1e6:.1f} MB of metadata text)")
+
+
+if __name__ == "__main__":
+    # python -m utils.dedup merged_dataset.jsonl dedup_map.json
+    data = sys.argv[1] if len(sys.argv) > 1 else "merged_dataset.jsonl"
+    out = sys.argv[2] if len(sys.argv) > 2 else "dedup_map.json"
+    if os.path.exists(out):
+        os.remove(out)
+    _, stats = load_or_build_dedup_map(data, out)
+    print_report(stats)
+    print(f"💾 Saved duplicate map to {out}")
@@ -0,0 +1,129 @@
+import re
+import zlib
+from collections.abc import Sequence
+import numpy as np
+
+_WORD = re.compile(r"\S+")
+# Gaps between words that always allow a cut: a blank line, or a line break before a clause label (1. / (a) / ii))
+_BREAK = re.compile(r"\n[^\S\n]*\n|\n\s*(?:\d{1,3}(?:\.\d{1,3})*[.)]|\([a-z0-9]{1,4}\)|[ivx]{1,4}[.)])\s")
+
+
+class DocumentText:
+    """
+    Normalized document text, kept once, plus a word offset table:
+    starts[i] is the character offset of word i. Word counts, word
+    windows and clause sizes are answered from the table, so the text is
+    tokenized once per document and never re-split or re-joined.
+    """
+
+    __slots__ = ("text", "starts")
+
+    def __init__(self, text, starts=None):
+        self.text = text
+        if starts is None:
+            starts = np.fromiter((m.start() for m in _WORD.finditer(text)), dtype=np.int64)
+            starts = starts.astype(np.int32 if len(text) < 2 ** 31 else np.int64)
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.text)
+
+    @property
+    def word_count(self):
+        return len(self.starts)
+
+    def _word_end(self, i):
+        return _WORD.match(self.text, int(self.starts[i])).end()
+
+    def word_index(self, offset):
+        """Index of the first word starting at or after a character offset."""
+        return int(np.searchsorted(self.starts, offset, side="left"))
+
+    def words_between(self, start, end):
+        """Number of words starting inside text[start:end]."""
+        return self.word_index(end) - self.word_index(start)
+
+    def word_windows(self, max_words, overlap=0, start=0, end=None):
+        """
+        (start, end) character spans of windows of max_words words, each
+        overlapping the previous one by `overlap` words, covering text[start:end].
+        """
+        first = self.word_index(start)
+        last = self.word_index(len(self.text) if end is None else end)  # exclusive
+        n = last - first
+        if n <= 0:
+            return np.empty((0, 2), dtype=np.int64)
+        step = max(1, max_words - overlap)
+        count = 1 if n <= max_words else 1 + -(-(n - max_words) // step)
+        firsts = first + step * np.arange(count)
+        lasts = np.minimum(firsts + max_words, last) - 1
+        return np.array([(int(self.starts[a]), self._word_end(b)) for a, b in zip(firsts, lasts)],
+                        dtype=np.int64).reshape(-1, 2)
+
+    def content_windows(self, max_words, overlap=0, start=0, end=None):
+        """
+        Like word_windows(), but window boundaries are chosen by the content:
+        a cut is made after a word when a rolling hash of the last few words
+        hits a fixed pattern, or at a paragraph / clause break, once the
+        window has a quarter of its words (and always at max_words). An edit
+        only moves the boundaries next to it, so the unchanged text around
+        it produces the same windows as before.
+        """
+        end = len(self.text) if end is None else end
+        first, stop = self.word_index(start), self.word_index(end)  # words of text[start:end], from the table
+        if first >= stop:
+            return np.empty((0, 2), dtype=np.int64)
+        step = max(1, max_words - overlap)  # new words per window; the rest is overlap
+        min_words = max(1, step // 4)
+        mask = (1 << min_words.bit_length()) - 1  # average window ~ step / 2 words
+        text, starts = self.text, self.starts
+        lasts, size, h = [], 0, 0
+        for j in range(first, stop - 1):
+            word_end = self._word_end(j)
+            # Gear hash: each word shifts the older ones left, so the low bits only see the last few words
+            h = ((h << 1) + zlib.crc32(text[int(starts[j]):word_end].encode("utf-8", "surrogatepass"))) & 0xFFFFFFFF
+            size += 1
+            if size >= step or (size >= min_words and ((h & mask) == 0 or _BREAK.match(text, word_end))):
+                lasts.append(j)
+                size = 0
+        lasts.append(stop - 1)
+
+        spans, window_first = [], first
+        for last in lasts:
+            a = max(first, window_first - overlap) if spans else first
+            spans.append((int(starts[a]), min(self._word_end(last), end)))
+            window_first = last + 1
+        return np.array(spans, dtype=np.int64).reshape(-1, 2)
+
+    def view(self, spans):
+        return ChunkView(self, spans)
+
+    def windows(self, max_words=500, overlap=50):
+        """Content-defined word chunks of at most max_words words as a ChunkView."""
+        return self.view(self.content_windows(max_words, overlap))
+
+
+class ChunkView(Sequence):
+    """
+    Read-only list of chunks stored as (start, end) offsets into one
+    DocumentText. A chunk string is only built when it is accessed.
+    """
+
+    __slots__ = ("doc", "spans")
+
+    def __init__(self, doc, spans):
+        self.doc = doc
+        self.spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ChunkView(self.doc, self.spans[i])
+        start, end = self.spans[i]
+        return self.doc.text[start:end]
+
+    def word_counts(self):
+        starts = self.doc.starts
+        return np.searchsorted(starts, self.spans[:, 1]) - np.searchsorted(starts, self.spans[:, 0])
@@ -1,85 +1,51 @@
 import os
 import json
-import time
+import hashlib
 import numpy as np
 import google.generativeai as genai
 from tqdm import tqdm
 from dotenv import load_dotenv
 
+# 🔑 Load environment variables (before llm_client reads the GEMINI_API_KEYS pool)
+load_dotenv()
+
+from llm_client import llm_client, embedding_array, API_KEYS, LLMOverloadedError, CircuitOpenError
+from utils.singleflight import singleflight
+from utils.serialization import read_jsonl, jsonl_line
+from utils.dedup import record_text, record_id, load_or_build_dedup_map, group_by_representative, print_report
+
 # ========== CONFIG ==========
 DATA_PATH = "merged_dataset.jsonl"
 EMB_PATH = "embeddings.jsonl"
 BATCH_SIZE = 50         # batch for speed + quota
-MAX_RETRIES = 5
-RETRY_DELAY = 10        # exponential backoff
-SLEEP_ON_ALL_KEYS = 60  # wait if all keys exhausted
+MAX_RETRIES = 5         # transient errors; quota errors rotate / wait through the key pool
 EMBED_MODEL = "models/embedding-001"  # 768-dim
+DEDUP = True            # embed only one representative per near-duplicate cluster
+DEDUP_MAP_PATH = "dedup_map.json"
 # ============================
 
-# 🔑 Load environment variables
-load_dotenv()
-API_KEYS = ["YOU API KEY 1 HERE","IF YOU HAVE ANOTHER BILLING KEY THEN KEY 2"]
-API_KEYS = [k.strip() for k in API_KEYS if k.strip()]
-if not API_KEYS:
-    raise ValueError("❌ GEMINI_KEYS not found in .env (format: GEMINI_KEYS=key1,key2)")
-
-# Keep rotating index
-key_index = -1
-def switch_key():
-    """Rotate API key."""
-    global key_index
-    key_index = (key_index + 1) % len(API_KEYS)
-    genai.configure(api_key=API_KEYS[key_index])
-    print(f"🔑 Using API key {key_index+1}/{len(API_KEYS)}")
-
-# Initialize first key
-switch_key()
-
-def get_embeddings_batch(texts, batch_id=0, attempt=1, tried_keys=None):
-    """Get embeddings for a batch of texts with retries + multi-key rotation."""
-    global key_index
-    if tried_keys is None:
-        tried_keys = set()
+# Keys: GEMINI_API_KEYS=key1,key2 (llm_client's pool), or a single GEMINI_API_KEY
+if not API_KEYS and os.getenv("GEMINI_API_KEY"):
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
 
+def get_embeddings_batch(texts, batch_id=0):
+    """
+    Embeddings for a batch of texts through the shared client: on a quota
+    error the key rests and the call moves to another key of the pool (or
+    waits until one has budget again); other errors are retried with backoff.
+    """
     try:
-        print(f"\n🔍 DEBUG: Embedding batch {batch_id}, attempt {attempt}, using key {key_index+1}")
-        embeddings = []
-        for t in texts:
-            resp = genai.embed_content(
-                model=EMBED_MODEL,
-                content=t,
-                task_type="retrieval_document"
-            )
-            emb = np.array(resp["embedding"], dtype="float32")
-            embeddings.append(emb)
+        print(f"\n🔍 DEBUG: Embedding batch {batch_id}")
+        resp = llm_client.embed_sync(texts, task_type="retrieval_document", model=EMBED_MODEL, retries=MAX_RETRIES)
+        embeddings = [np.array(e, dtype="float32") for e in resp["embedding"]]
 
         print(f"✅ Success: Got {len(embeddings)} embeddings of length {len(embeddings[0])}")
         return embeddings
-
-
     except Exception as e:
-        err = str(e).lower()
-        print(f"❌ Error on batch {batch_id}, attempt {attempt}: {e}")
-
-        # Handle quota/rate errors
-        if "quota" in err or "429" in err:
-            tried_keys.add(key_index)
-            if len(tried_keys) >= len(API_KEYS):
-                print(f"⏳ All {len(API_KEYS)} API keys exhausted. Sleeping {SLEEP_ON_ALL_KEYS}s...")
-                time.sleep(SLEEP_ON_ALL_KEYS)
-                tried_keys.clear()
-            switch_key()
-            return get_embeddings_batch(texts, batch_id, attempt, tried_keys)
-
-        # Other errors → exponential backoff
-        elif attempt < MAX_RETRIES:
-            wait_time = RETRY_DELAY * attempt
-            print(f"⏳ Waiting {wait_time}s before retry...")
-            time.sleep(wait_time)
-            return get_embeddings_batch(texts, batch_id, attempt + 1, tried_keys)
-        else:
-            print(f"🚨 Failed batch {batch_id} after {MAX_RETRIES} retries")
-            return [None] * len(texts)
+        print(f"🚨 Failed batch {batch_id} after {MAX_RETRIES} retries: {e}")
+        return [None] * len(texts)
+
 # 🔧 Force resume batch number
 RESUME_BATCH = 2957  # 👈 change this if needed
 
@@ -88,25 +54,52 @@ def embed_texts(text: str):
     Get embedding vector for a single document (float32 numpy array).
     """
     try:
-        resp = genai.embed_content(
-            model=EMBED_MODEL,
-            content=text,
-            task_type="retrieval_query"   # query mode for search
-        )
-        return np.array(resp["embedding"], dtype="float32")
+        resp = llm_client.embed_sync(text, task_type="retrieval_query", model=EMBED_MODEL,
+                                    priority="chat")  # query mode for search
+        return embedding_array(resp)
     except Exception as e:
         print(f"❌ Failed to embed single text: {e}")
         return None
 
 
+async def embed_texts_async(text, priority="chat"):
+    """
+    Non-blocking embed_texts for the API (str → 1-D, list → 2-D array).
+    Identical concurrent requests share one embedding call. Overload and an
+    open circuit are raised (the API answers 503); other failures return None.
+    """
+    key = ("embed", EMBED_MODEL, hashlib.sha256(json.dumps(text).encode("utf-8")).hexdigest())
+    try:
+        resp = await singleflight.do(
+            key, lambda: llm_client.embed(text, task_type="retrieval_query", model=EMBED_MODEL, priority=priority))
+        return embedding_array(resp)
+    except (LLMOverloadedError, CircuitOpenError):
+        raise
+    except Exception as e:
+        print(f"❌ Failed to embed single text: {e}")
+        return None
+
+
+async def embed_documents_async(texts):
+    """Document-side embeddings for corpus records (one batched request)."""
+    resp = await llm_client.embed(texts, task_type="retrieval_document", model=EMBED_MODEL, priority="batch")
+    return embedding_array(resp)
+
+
 
 def main():
     print(f"📖 Reading dataset: {DATA_PATH}")
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        records = [json.loads(line) for line in f]
+    records = read_jsonl(DATA_PATH)
 
     print(f"✅ Loaded {len(records)} records")
 
+    # 🧹 Near-duplicate clustering (map is saved, so resumed runs skip the same records)
+    dup_map, groups = {}, {}
+    if DEDUP:
+        dup_map, dedup_stats = load_or_build_dedup_map(DATA_PATH, DEDUP_MAP_PATH)
+        groups = group_by_representative(dup_map)
+        print_report(dedup_stats)
+
     # ✅ Force resume from specific batch
     processed = RESUME_BATCH * BATCH_SIZE
     print(f"🔄 Forcing resume from record {processed} (batch {RESUME_BATCH})")
@@ -118,13 +111,13 @@ def main():
             texts, meta = [], []
 
             for j, r in enumerate(batch_records):
-                text = r.get("output") or r.get("input") or r.get("text", "")
-                if not text.strip():
+                text = record_text(r)
+                rid = record_id(r, i + j)
+                if not text or rid in dup_map:
                     continue
-                text = text.strip()
                 texts.append(text)
                 meta.append({
-                    "id": r.get("id", f"record_{i+j}"),
+                    "id": rid,
                     "text": text
                 })
 
@@ -136,11 +129,14 @@ def main():
             for m, emb in zip(meta, embeddings):
                 if emb is None:
                     continue
-                out_f.write(json.dumps({
+                out = {
                     "id": m["id"],
                     "text": m["text"],
-                    "embedding": emb.tolist()
-                }, ensure_ascii=False) + "\n")
+                    "embedding": emb  # float32 array, encoded directly (no list of Python floats)
+                }
+                if m["id"] in groups:
+                    out["duplicates"] = groups[m["id"]]  # provenance of skipped near-duplicates
+                out_f.write(jsonl_line(out))
 
                 snippet = m["text"][:60].replace("\n", " ")
                 print(f"✅ Embedded ({m['id']}): {snippet}...")
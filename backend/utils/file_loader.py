@@ -1,11 +1,24 @@
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import pytesseract
 import docx
 from pdf2image import convert_from_path
 from langdetect import detect_langs
 
+from utils.ocr_preprocess import preprocess
+
+# Bump whenever extraction output changes (invalidates the artifact cache)
+EXTRACTOR_VERSION = "3"
+
+# ========== CONFIG ==========
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))   # pages with less text than this are OCR'd
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+PAGE_SEPARATOR = "\n\n"
+# ============================
+
 # List of supported Indian languages for OCR
 INDIAN_LANGUAGES = ["hin", "tam", "tel", "ben", "mar", "guj", "kan", "mal", "pan"]
 
@@ -26,47 +39,128 @@ def detect_languages(text_chunk):
         return "eng"
 
 
-def load_document(path: str) -> str:
+def _clean(text):
+    """Collapse runs of spaces inside lines and drop blank lines (keeps line structure)."""
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _ocr_image(img, source="photo"):
+    """Tesseract on the preprocessed image (see utils/ocr_preprocess.py): a detection pass, then the real one."""
+    img = preprocess(img, source)
+    tess_lang = detect_languages(pytesseract.image_to_string(img, lang="eng"))
+    return pytesseract.image_to_string(img, lang=tess_lang)
+
+
+def _ocr_pdf_page(path, page_no):
+    images = convert_from_path(path, dpi=OCR_DPI, first_page=page_no, last_page=page_no)
+    return "\n".join(_ocr_image(img, "scan") for img in images)
+
+
+def _native_pdf_pages(path):
     """
-    Load document from path and return extracted text.
-    Supports .txt, .pdf, .docx, .jpg/.png
+    Per-page text layer using the fastest backend installed:
+    pypdfium2 → PyMuPDF → PyPDF2. Returns None if no backend can read the file.
+    """
+    try:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            pages = []
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+    except Exception:
+        pass
+
+    try:
+        import fitz  # PyMuPDF
+        with fitz.open(path) as doc:
+            return [page.get_text() for page in doc]
+    except Exception:
+        pass
+
+    try:
+        from PyPDF2 import PdfReader
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    except Exception:
+        return None
+
+
+def _pdf_pages(path):
+    """Per-page texts plus the indices of pages that were OCR'd (only low-text pages, in parallel)."""
+    page_texts = _native_pdf_pages(path)
+    if page_texts is None:
+        # Unreadable text layer → OCR every page
+        page_texts = [_clean(_ocr_image(img, "scan")) for img in convert_from_path(path, dpi=OCR_DPI)]
+        return page_texts, set(range(len(page_texts)))
+
+    page_texts = [_clean(t) for t in page_texts]
+    # Scanned pages (signature pages, annexures...) have little or no text layer
+    low_text = [i for i, t in enumerate(page_texts) if len(t.replace(" ", "")) < OCR_MIN_CHARS]
+    ocr_done = set()
+    if low_text:
+        with ThreadPoolExecutor(max_workers=min(OCR_WORKERS, len(low_text))) as pool:
+            results = pool.map(lambda i: _ocr_pdf_page(path, i + 1), low_text)
+            for i, ocr_text in zip(low_text, results):
+                ocr_text = _clean(ocr_text)
+                if len(ocr_text) > len(page_texts[i]):
+                    page_texts[i] = ocr_text
+                    ocr_done.add(i)
+    return page_texts, ocr_done
+
+
+def load_document_pages(path: str):
+    """
+    Extract a document page by page.
+    Returns (text, pages): text is the pages joined by PAGE_SEPARATOR, and each
+    page is {"page": 1-based number, "start": offset, "end": offset, "ocr": bool}
+    so text[start:end] is that page's text.
     """
     ext = os.path.splitext(path)[1].lower()
-    text = ""
+    ocr = set()
 
     if ext == ".txt":
         with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
+            page_texts = [_clean(f.read())]
 
     elif ext == ".pdf":
-        try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(path)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        except:
-            pass
-
-        # fallback to OCR if PDF is scanned
-        if not text.strip():
-            images = convert_from_path(path)
-            for img in images:
-                tess_lang = detect_languages(pytesseract.image_to_string(img, lang="eng"))
-                text += pytesseract.image_to_string(img, lang=tess_lang)
+        page_texts, ocr = _pdf_pages(path)
 
     elif ext in [".doc", ".docx"]:
         doc = docx.Document(path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        page_texts = [_clean("\n".join(para.text for para in doc.paragraphs))]
 
     elif ext in [".jpg", ".jpeg", ".png"]:
-        img = Image.open(path)
-        tess_lang = detect_languages(pytesseract.image_to_string(img, lang="eng"))
-        text = pytesseract.image_to_string(img, lang=tess_lang)
+        page_texts = [_clean(_ocr_image(Image.open(path)))]
+        ocr = {0}
 
     else:
         raise ValueError(f"Unsupported file format: {ext}")
 
-    # Clean extra spaces
-    text = re.sub(r'\s+', ' ', text).strip()
+    parts, pages, offset = [], [], 0
+    for i, page_text in enumerate(page_texts):
+        if not page_text:
+            continue
+        if parts:
+            parts.append(PAGE_SEPARATOR)
+            offset += len(PAGE_SEPARATOR)
+        parts.append(page_text)
+        pages.append({"page": i + 1, "start": offset, "end": offset + len(page_text), "ocr": i in ocr})
+        offset += len(page_text)
+    return "".join(parts), pages
+
+
+def load_document(path: str) -> str:
+    """
+    Load document from path and return extracted text.
+    Supports .txt, .pdf, .docx, .jpg/.png
+    """
+    text, _ = load_document_pages(path)
     return text
@@ -1,9 +1,13 @@
+import os
 import random
 import re
 import json
 import numpy as np
 import faiss
 from utils.embeddings import embed_texts  # your existing embedding function
+from sharding import load_corpus
+from utils.document import DocumentText
+from utils.case_fields import parse_filter
 
 # -----------------------------
 # FAISS helpers
@@ -12,22 +16,25 @@ INDEX_PATH = "data/faiss_index.bin"
 META_PATH = "data/faiss_index.bin.meta.json"
 TOP_K = 5
 
-def load_faiss_index():
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    return index, meta
+_corpus = None
 
-def search_similar_docs(query_text, top_k=TOP_K):
-    index, meta = load_faiss_index()
+def load_faiss_index():
+    # Loaded once; picks up appended records / compactions on its own
+    global _corpus
+    if _corpus is None:
+        _corpus = load_corpus(os.path.dirname(INDEX_PATH))
+    return _corpus, _corpus.meta
+
+def search_similar_docs(query_text, top_k=TOP_K, where=None):
+    """where: filter expression, e.g. "court=supreme court AND year>=2015 AND statute=Section 138"."""
+    corpus, _ = load_faiss_index()
     q_emb = embed_texts(query_text)
-    scores, indices = index.search(q_emb, top_k)
     results = []
-    for idx, score in zip(indices[0], scores[0]):
+    for hit in corpus.search_embeddings(q_emb, top_k, parse_filter(where) if where else None)[0]:
         results.append({
-            "doc_id": meta["ids"][idx],
-            "snippet": meta["texts"][idx][:200],
-            "similarity": float(score)
+            "doc_id": hit["id"],
+            "snippet": hit["text"][:200],
+            "similarity": hit["score"]
         })
     return results
 
@@ -88,16 +95,9 @@ def chunk_text(text, max_words=500, overlap=50):
     Split text into chunks for processing.
     - max_words: maximum words per chunk
     - overlap: words to repeat between chunks
+    Chunks are cut from the original text by word offsets (no split/join).
     """
-    words = text.split()
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = min(start + max_words, len(words))
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk)
-        start += max_words - overlap
-    return chunks
+    return list(DocumentText(text).windows(max_words, overlap))
 # --- Advice detection ---
 advice_keywords = [
     "what should i do", "next steps", "can i", "how do i proceed", "is it okay to", 
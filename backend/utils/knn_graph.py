@@ -0,0 +1,151 @@
+import os
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils.serialization import read_json, write_json
+
+# ========== CONFIG ==========
+KNN_K = 16                     # neighbours stored per corpus record
+KNN_BATCH = 4096               # records searched per FAISS call while building
+KNN_THREADS = os.cpu_count() or 4
+KNN_MIN_SCORE = 0.0            # edges below this similarity are not stored
+# ============================
+
+# Layout next to the corpus index (faiss_index.knn.*):
+#   .knn.indptr.npy   int64 [n + 1]  row r's edges are indices[indptr[r]:indptr[r + 1]]
+#   .knn.indices.npy  int32 [edges]  neighbour rows, best first
+#   .knn.scores.npy   float16 [edges] cosine similarity of each edge
+#   .knn.json         {"k", "ids"}    row -> corpus id
+
+
+def _paths(prefix):
+    return {part: f"{prefix}.knn.{part}.npy" for part in ("indptr", "indices", "scores")}
+
+
+def build_knn_graph(index, vectors, k=KNN_K, batch_size=KNN_BATCH, threads=KNN_THREADS, min_score=KNN_MIN_SCORE):
+    """
+    k-NN graph of the rows of an inner-product index, as CSR arrays
+    (indptr, indices, scores). vectors[i] must be the vector of row i.
+    Rows are searched in batches, several batches at a time (FAISS releases
+    the GIL), each batch asking for k + 1 hits so the row itself can be dropped.
+    """
+    n = len(vectors)
+    kk = min(k + 1, n)
+    neighbours = np.full((n, k), -1, dtype=np.int32)
+    similarity = np.zeros((n, k), dtype=np.float16)
+
+    def search(start):
+        queries = np.ascontiguousarray(vectors[start:start + batch_size], dtype="float32")
+        D, I = index.search(queries, kk)
+        rows = np.arange(start, start + len(queries))[:, None]
+        valid = (I >= 0) & (I != rows) & (D >= min_score)
+        # Move each row's kept hits to the front (still best first), then keep k of them
+        order = np.argsort(~valid, axis=1, kind="stable")[:, :k]
+        kept = np.take_along_axis(valid, order, axis=1)
+        end = start + len(queries)
+        neighbours[start:end, :order.shape[1]] = np.where(kept, np.take_along_axis(I, order, axis=1), -1)
+        similarity[start:end, :order.shape[1]] = np.take_along_axis(D, order, axis=1)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(search, range(0, n, batch_size)))
+
+    stored = neighbours >= 0
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(stored.sum(axis=1), out=indptr[1:])
+    return indptr, neighbours[stored], similarity[stored]
+
+
+def save_knn_graph(prefix, ids, indptr, indices, scores, k=KNN_K):
+    """Write the graph files atomically (readers never see a half-written graph)."""
+    for part, array in zip(("indptr", "indices", "scores"), (indptr, indices, scores)):
+        path = _paths(prefix)[part]
+        tmp = f"{path}.tmp-{os.getpid()}.npy"
+        np.save(tmp, array)
+        os.replace(tmp, path)
+    write_json(f"{prefix}.knn.json", {"k": k, "ids": list(ids)})
+
+
+class KnnGraph:
+    """
+    Precomputed related-case graph over the corpus (built by
+    `python indexing.py --knn K`). The CSR arrays are memory-mapped, so
+    a lookup reads one row of edges from the page cache: no vector search.
+    """
+
+    def __init__(self, prefix):
+        paths = _paths(prefix)
+        self.indptr = np.load(paths["indptr"], mmap_mode="r")
+        self.indices = np.load(paths["indices"], mmap_mode="r")
+        self.scores = np.load(paths["scores"], mmap_mode="r")
+        info = read_json(f"{prefix}.knn.json")
+        self.k = info["k"]
+        self.ids = info["ids"]
+        self._rows = {case_id: row for row, case_id in enumerate(self.ids)}
+
+    def __contains__(self, case_id):
+        return case_id in self._rows
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _edges(self, row):
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.scores[start:end]
+
+    def neighbours(self, case_id, k=None, exclude=()):
+        """[{"id", "score"}] of the stored nearest neighbours of case_id, best first (None if unknown)."""
+        row = self._rows.get(case_id)
+        if row is None:
+            return None
+        rows, scores = self._edges(row)
+        out = [{"id": self.ids[r], "score": float(s)} for r, s in zip(rows, scores) if self.ids[r] not in exclude]
+        return out[:k] if k else out
+
+    def expand(self, case_id, hops=2, k=None, limit=50, exclude=()):
+        """
+        Related cases up to `hops` edges away: [{"id", "score", "hop", "via"}],
+        ranked by path score (product of edge similarities), each case once.
+        k limits the edges followed per case. None if case_id is unknown.
+        """
+        start = self._rows.get(case_id)
+        if start is None:
+            return None
+        best = {start: (1.0, 0, None)}  # row -> (path score, hop, previous row)
+        frontier = [start]
+        for hop in range(1, hops + 1):
+            reached = []
+            for row in frontier:
+                rows, scores = self._edges(row)
+                rows, scores = (rows[:k], scores[:k]) if k else (rows, scores)
+                for r, s in zip(rows.tolist(), scores.tolist()):
+                    if self.ids[r] in exclude:
+                        continue
+                    score = best[row][0] * s
+                    if r not in best:
+                        reached.append(r)
+                    if r not in best or (best[r][1] == hop and score > best[r][0]):
+                        best[r] = (score, hop, row)
+            frontier = reached
+        ranked = heapq.nlargest(limit, (r for r in best if r != start), key=lambda r: best[r][0])
+        return [{"id": self.ids[r], "score": float(best[r][0]), "hop": best[r][1], "via": self.ids[best[r][2]]}
+                for r in ranked]
+
+
+_loaded = {}  # prefix -> (mtime of .knn.json, KnnGraph)
+
+
+def load_knn_graph(corpus_dir, name):
+    """
+    The corpus k-NN graph, or None if indexing.py was run without --knn.
+    Reopened only when indexing.py has written a new graph since the last call.
+    """
+    prefix = os.path.join(corpus_dir, name)
+    try:
+        mtime = os.stat(f"{prefix}.knn.json").st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(prefix)
+    if cached is None or cached[0] != mtime:
+        cached = _loaded[prefix] = (mtime, KnnGraph(prefix))
+    return cached[1]
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from PIL import Image
+
+# ========== CONFIG ==========
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1") == "1"   # 0 = hand Tesseract the raw image
+# Per source type: phone photos / image uploads, and PDF pages rasterized at OCR_DPI
+PREPROCESS_PROFILES = {
+    "photo": {"target_dpi": 300, "max_width": 2480, "binarize": True, "deskew": True, "crop": True},
+    "scan": {"target_dpi": None, "max_width": 2480, "binarize": True, "deskew": True, "crop": True},
+    "none": {"target_dpi": None, "max_width": None, "binarize": False, "deskew": False, "crop": False},
+}
+BINARIZE_WINDOW = 1 / 40     # local threshold window, as a fraction of the page width
+BINARIZE_OFFSET = 0.15       # a pixel is ink when darker than (1 - offset) × its local mean
+DESKEW_MAX_ANGLE = 5.0       # degrees searched either way
+DESKEW_STEP = 0.25
+DESKEW_SAMPLE_WIDTH = 1000   # skew is estimated on a copy this wide
+DESKEW_MIN_ANGLE = 0.3       # smaller skews are left alone (a rotation costs more than it helps)
+CROP_PADDING = 20            # pixels of white kept around the ink
+# ============================
+
+
+def _downscale(img, profile):
+    """Shrink to the target resolution (never upscales): DPI metadata when present, else max_width."""
+    scale = 1.0
+    dpi = img.info.get("dpi")
+    if profile["target_dpi"] and dpi and dpi[0] and dpi[0] > profile["target_dpi"]:
+        scale = profile["target_dpi"] / float(dpi[0])
+    if profile["max_width"] and img.width * scale > profile["max_width"]:
+        scale = profile["max_width"] / img.width
+    if scale >= 0.95:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+def binarize(gray):
+    """
+    Adaptive (local mean) threshold of a grayscale uint8 array: ink → 0,
+    background → 255. Local means come from running sums, so the cost
+    is a few passes over the page whatever the window size; uneven lighting
+    and shadows in phone photos don't swallow the text as a global threshold would.
+    """
+    h, w = gray.shape
+    r = max(3, int(w * BINARIZE_WINDOW)) // 2
+    # Box sums, separably: windowed row sums, then windowed column sums of those (int32 is enough for both).
+    # Edge-padding the running sums clips the window at the borders and keeps every step a plain slice.
+    rows = np.zeros((h, w + 1), dtype=np.int32)
+    np.cumsum(gray, axis=1, dtype=np.int32, out=rows[:, 1:])
+    rows = np.pad(rows, ((0, 0), (r, r)), mode="edge")
+    rows = rows[:, 2 * r + 1:2 * r + 1 + w] - rows[:, :w]
+    cols = np.zeros((h + 1, w), dtype=np.int32)
+    np.cumsum(rows, axis=0, dtype=np.int32, out=cols[1:])
+    cols = np.pad(cols, ((r, r), (0, 0)), mode="edge")
+    total = cols[2 * r + 1:2 * r + 1 + h] - cols[:h]
+    ys, xs = np.arange(h), np.arange(w)
+    area = ((np.minimum(ys + r + 1, h) - np.maximum(ys - r, 0))[:, None]
+            * (np.minimum(xs + r + 1, w) - np.maximum(xs - r, 0))[None, :]).astype(np.float32)
+    ink = gray < total / area * (1 - BINARIZE_OFFSET)
+    return np.where(ink, 0, 255).astype(np.uint8)
+
+
+def estimate_skew(binary):
+    """
+    Skew angle in degrees (projection-profile method): text lines give the
+    sharpest row histogram of ink pixels when sheared by the right angle.
+    Each candidate angle costs one bincount over the (subsampled) ink coordinates.
+    """
+    step = max(1, binary.shape[1] // DESKEW_SAMPLE_WIDTH)
+    ys, xs = np.nonzero(binary[::step, ::step] == 0)
+    if len(ys) < 100:
+        return 0.0
+    angles = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP)
+    height = binary.shape[0] // step
+    pad = int(np.ceil(binary.shape[1] / step * np.tan(np.radians(DESKEW_MAX_ANGLE)))) + 1
+    scores = np.empty(len(angles))
+    for i, angle in enumerate(angles):
+        rows = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64) + pad
+        profile = np.bincount(rows, minlength=height + 2 * pad)
+        scores[i] = np.square(profile, dtype=np.float64).sum()
+    return float(angles[int(np.argmax(scores))])
+
+
+def crop_margins(binary):
+    """Bounding box of the ink plus CROP_PADDING (the whole image if it is blank)."""
+    ink = binary == 0
+    rows = np.flatnonzero(ink.sum(axis=1) > 1)
+    cols = np.flatnonzero(ink.sum(axis=0) > 1)
+    if not len(rows) or not len(cols):
+        return binary
+    top, bottom = max(0, rows[0] - CROP_PADDING), min(binary.shape[0], rows[-1] + CROP_PADDING + 1)
+    left, right = max(0, cols[0] - CROP_PADDING), min(binary.shape[1], cols[-1] + CROP_PADDING + 1)
+    return binary[top:bottom, left:right]
+
+
+def preprocess(img, source="photo"):
+    """
+    Prepare an image for Tesseract according to its source profile:
+    downscale to the target resolution, grayscale, adaptive binarization,
+    deskew and blank-margin cropping. Returns a PIL image.
+    """
+    profile = PREPROCESS_PROFILES[source]
+    if not OCR_PREPROCESS or source == "none":
+        return img
+    img = _downscale(img, profile).convert("L")
+    if not profile["binarize"]:
+        return img
+    binary = binarize(np.asarray(img))
+    if profile["deskew"]:
+        angle = estimate_skew(binary)
+        if abs(angle) >= DESKEW_MIN_ANGLE:
+            # A shear by +angle straightens the lines, i.e. the page is rotated by -angle
+            rotated = Image.fromarray(binary).rotate(angle, resample=Image.NEAREST, expand=True, fillcolor=255)
+            binary = np.asarray(rotated)
+    if profile["crop"]:
+        binary = crop_margins(binary)
+    return Image.fromarray(binary)
@@ -0,0 +1,115 @@
+import os
+import zlib
+import anyio
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.serialization import dumps_bytes
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# ========== CONFIG ==========
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))   # smaller responses are sent as is
+GZIP_LEVEL = 6                 # 9 costs ~2x the CPU for a few % on JSON
+BROTLI_QUALITY = 4             # fast setting for dynamic responses (11 is for static assets)
+COMPRESS_THREAD_BYTES = 128 * 1024   # larger bodies are compressed off the event loop
+# ============================
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with utils.serialization (orjson when installed, numpy values allowed)."""
+
+    def render(self, content):
+        return dumps_bytes(content)
+
+
+class _Encoder:
+    """One response's compressor: feed() returns the compressed bytes to send so far."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)  # gzip container
+
+    def feed(self, body, more_body):
+        # Streamed (NDJSON) bodies are flushed chunk by chunk so the client sees each line as it is produced
+        if self.encoding == "br":
+            out = self._compressor.process(body)
+            return out + (self._compressor.flush() if more_body else self._compressor.finish())
+        out = self._compressor.compress(body)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+def _accepted_encoding(scope):
+    """"br" or "gzip" when the client accepts it (brotli preferred), else None."""
+    header = Headers(scope=scope).get("Accept-Encoding", "")
+    accepted = {part.split(";")[0].strip().lower() for part in header.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    return "gzip" if "gzip" in accepted else None
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least COMPRESS_MIN_BYTES: brotli when the
+    client accepts it and the brotli package is installed, else gzip.
+    Streaming responses are compressed chunk by chunk. Plain ASGI, so it
+    depends on no Starlette internals.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = _accepted_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None     # http.response.start, held until the first body chunk decides
+        encoder = None   # set once the response is being compressed
+        passthrough = False
+
+        async def compress(body, more_body):
+            if len(body) >= COMPRESS_THREAD_BYTES:
+                return await anyio.to_thread.run_sync(encoder.feed, body, more_body)
+            return encoder.feed(body, more_body)
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                headers = Headers(raw=start["headers"])
+                if "content-encoding" in headers or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                body = await compress(body, more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            await send({"type": "http.response.body", "body": await compress(body, more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
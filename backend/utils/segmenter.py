@@ -0,0 +1,134 @@
+import re
+
+from utils.document import DocumentText
+
+# ========== CONFIG ==========
+SEGMENTER_VERSION = "3"   # bump whenever segmentation output changes (invalidates the artifact cache)
+CLAUSE_MAX_WORDS = 300    # longer clauses are split into overlapping windows
+CLAUSE_MIN_WORDS = 8      # shorter units (bare headings) are merged into the next unit
+WINDOW_OVERLAP = 30
+LABEL_MAX_CHARS = 60
+# ============================
+
+# Heading patterns, tried in order on each line of the extracted text
+_TOP = re.compile(r"^(schedule|annexure|annex|appendix|exhibit|part|chapter|article)\b[\s\-–—:.]*([0-9IVXLC]+|[A-Z])?\b",
+                  re.I)
+_RECITALS = re.compile(r"^(recitals|background|preamble)\W*$", re.I)
+_WHEREAS = re.compile(r"^(and\s+)?whereas\b", re.I)
+_OPERATIVE = re.compile(r"^now,?\s+(therefore|this\s+(agreement|deed))\b", re.I)
+_NUMBERED = re.compile(r"^(?:(section|clause)\s+)?(\d{1,3}(?:\.\d{1,3})*)([.)])?\s+(?=\S)", re.I)
+_DEFINITION = re.compile(r"^[\"“']([^\"”']{1,80})[\"”']\s+(?:shall\s+)?(?:means?|includes?|has\s+the\s+meaning|refers?)\b",
+                         re.I)
+_FIELD = re.compile(r":\s*\S")   # "PAN: AAATI5256J" - a label followed by its value
+_SCHEDULE_WORDS = ("schedule", "annexure", "annex", "appendix", "exhibit")
+
+
+def _label(line):
+    return line if len(line) <= LABEL_MAX_CHARS else line[:LABEL_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def _is_caps_heading(line):
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 2 or len(line.split()) > 10 or not all(c.isupper() for c in letters):
+        return False
+    # All-caps field lines are not headings: "PAN: AAATI5256J", "GSTIN 29ABCDE1234F1Z5", "TEL 080 2345 6789"
+    if _FIELD.search(line) or sum(c.isdigit() for c in line) > len(letters):
+        return False
+    return not any(any(c.isalpha() for c in token) and sum(c.isdigit() for c in token) >= 2
+                   for token in line.split())
+
+
+def _classify(line, depth):
+    """(level, kind) if the line opens a new unit, else None. Level 0 resets the heading path."""
+    m = _TOP.match(line)
+    if m and (m.group(2) or _is_caps_heading(line)):
+        return 0, "schedule" if m.group(1).lower() in _SCHEDULE_WORDS else "section"
+    if _RECITALS.match(line):
+        return 1, "recital"
+    if _WHEREAS.match(line):
+        return 2, "recital"
+    if _OPERATIVE.match(line):
+        return 1, "clause"
+    m = _NUMBERED.match(line)
+    if m and (m.group(1) or m.group(3) or "." in m.group(2)):
+        return m.group(2).count(".") + 1, "section" if (m.group(1) or "").lower() == "section" else "clause"
+    if _DEFINITION.match(line):
+        return depth + 1, "definition"
+    if _is_caps_heading(line):
+        return 1, "section"
+    return None
+
+
+def segment_clauses(doc, max_words=CLAUSE_MAX_WORDS, min_words=CLAUSE_MIN_WORDS, overlap=WINDOW_OVERLAP):
+    """
+    Split a legal document (a DocumentText, or plain text) into clause-level units.
+
+    Detects schedules/annexures, parts/articles, numbered clauses and
+    sections (1., 2.3, Section 4), recitals (WHEREAS ...) and definition
+    entries ("X" means ...). Each unit is a dict:
+        {"path": [heading labels, outermost first], "kind", "start", "end"}
+    with character offsets into the text (clause_chunks() gives the texts).
+    Kinds: preamble, recital, clause, section, schedule, definition, window.
+    Units over max_words are split into overlapping content-defined windows
+    (see DocumentText.content_windows), as is text without any detectable
+    structure, so an edit does not shift the windows after it.
+    """
+    if not isinstance(doc, DocumentText):
+        doc = DocumentText(doc)
+    text = doc.text
+
+    # Unit boundaries: (start offset, kind, heading path)
+    heads = []
+    stack = []  # (level, kind, label)
+    offset = 0
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped:
+            # Definition entries nest under the closest non-definition heading
+            depth = next((lvl for lvl, k, _ in reversed(stack) if k != "definition"), 0)
+            found = _classify(stripped, depth)
+            if found:
+                level, kind = found
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, kind, _label(stripped)))
+                heads.append((offset + line.index(stripped), kind, [label for _, _, label in stack]))
+        offset += len(line) + 1
+
+    if not heads:
+        return [{"path": [], "kind": "window", "start": int(s), "end": int(e)}
+                for s, e in doc.content_windows(max_words, overlap)]
+
+    units = []
+    if text[:heads[0][0]].strip():
+        units.append([0, "preamble", []])
+    units += [[start, kind, path] for start, kind, path in heads]
+
+    segments = []
+    pending_start = None  # start of a too-short unit merged into the next one
+    for i, (start, kind, path) in enumerate(units):
+        end = units[i + 1][0] if i + 1 < len(units) else len(text)
+        if pending_start is not None:
+            start, pending_start = pending_start, None
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        n_words = doc.words_between(start, end)
+        if i + 1 < len(units) and n_words < min_words:
+            pending_start = start
+            continue
+        if kind in ("clause", "section") and any(re.search(r"definition|interpretation", p, re.I) for p in path):
+            kind = "definition"
+        spans = doc.content_windows(max_words, overlap, start, end) if n_words > max_words else [(start, end)]
+        for s, e in spans:
+            segments.append({"path": path, "kind": kind, "start": int(s), "end": int(e)})
+    return segments
+
+
+def clause_chunks(doc, segments):
+    """Clause texts as a ChunkView over the document (no copies until accessed)."""
+    return doc.view([(seg["start"], seg["end"]) for seg in segments])
+
+
+def heading(segment):
+    """Readable heading path, e.g. "SCHEDULE 1 › 2. Payment › 2.1 The Buyer shall…"."""
+    return " › ".join(segment["path"])
@@ -0,0 +1,71 @@
+import os
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+# ========== CONFIG ==========
+FAST_JSON = orjson is not None and os.getenv("FAST_JSON", "1") == "1"   # 0 = always use stdlib json
+# ============================
+
+JSON_BACKEND = "orjson" if FAST_JSON else "json"
+
+# numpy arrays / scalars (scores, ids) and int keys are encoded natively instead of raising
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj, indent=False):
+    """UTF-8 JSON (non-ASCII kept as is, compact unless indent)."""
+    if FAST_JSON:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    return dumps(obj, indent).encode("utf-8")
+
+
+def dumps(obj, indent=False):
+    """JSON text, same output rules as dumps_bytes()."""
+    if FAST_JSON:
+        return dumps_bytes(obj, indent).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=_default, indent=2 if indent else None,
+                      separators=None if indent else (",", ":"))
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    return orjson.loads(data) if FAST_JSON else json.loads(data)
+
+
+def read_json(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_json(path, obj, indent=False):
+    """Write compact JSON atomically (readers never see a half-written file)."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(dumps_bytes(obj, indent))
+    os.replace(tmp, path)
+
+
+def read_jsonl(path):
+    """Records of a JSON-lines file (blank lines skipped)."""
+    with open(path, "rb") as f:
+        return [loads(line) for line in f if line.strip()]
+
+
+def jsonl_line(obj):
+    """One JSON-lines record, newline included."""
+    return dumps(obj) + "\n"
@@ -0,0 +1,60 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async work: while a computation for a
+    key is in flight, further callers with the same key await the same
+    result instead of starting their own. Keys are tuples whose first
+    element names the operation, e.g. ("verifier", doc_hash, top_k).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.counters = {}   # op -> {"executed": n, "coalesced": n}
+
+    def _count(self, key, field):
+        op = key[0] if isinstance(key, tuple) else str(key)
+        counts = self.counters.setdefault(op, {"executed": 0, "coalesced": 0})
+        counts[field] += 1
+
+    async def do(self, key, fn):
+        """
+        Run fn() (a zero-argument coroutine function) once per key at a time.
+        The shared task is shielded, so one caller disconnecting does not
+        cancel the work the others are waiting on.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(key, "coalesced")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        self._count(key, "executed")
+
+        def _done(t):
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def cancel(self, key):
+        """Cancel the shared computation for key (its result is no longer wanted by anyone)."""
+        task = self._inflight.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def in_flight(self, key):
+        return key in self._inflight
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "operations": self.counters,
+            "coalesced_total": sum(c["coalesced"] for c in self.counters.values()),
+        }
+
+
+# Shared by the API endpoints and the async embedding helpers
+singleflight = SingleFlight()
@@ -0,0 +1,153 @@
+import os
+import time
+import numpy as np
+import faiss
+
+# ========== CONFIG ==========
+# Per-deployment trade-off between memory and recall (see `python indexing.py --report`)
+QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "flat")   # flat | fp16 | int8
+PCA_PATH = os.getenv("VECTOR_PCA_PATH", "data/faiss_index.pca.bin")
+USE_PCA = os.getenv("VECTOR_USE_PCA", "0") == "1"
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))  # candidates per hit re-scored at full precision
+TRAIN_SAMPLE = 100_000
+# ============================
+
+_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def make_index(dim, kind=QUANTIZATION, metric="l2", pca=None):
+    """
+    Empty index of the requested storage type.
+    kind: flat (float32), fp16 or int8 scalar quantization.
+    pca: optional trained faiss.PCAMatrix applied before storage.
+    """
+    metric_type = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+    d = pca.d_out if pca is not None else dim
+    if kind == "flat":
+        base = faiss.IndexFlat(d, metric_type)
+    elif kind in _SQ_TYPES:
+        base = faiss.IndexScalarQuantizer(d, _SQ_TYPES[kind], metric_type)
+    else:
+        raise ValueError(f"Unknown vector storage type: {kind}")
+    if pca is not None:
+        return faiss.IndexPreTransform(pca, base)
+    return base
+
+
+def train_pca(vectors, out_dim, sample=TRAIN_SAMPLE):
+    pca = faiss.PCAMatrix(vectors.shape[1], out_dim)
+    pca.train(np.ascontiguousarray(vectors[:sample], dtype="float32"))
+    return pca
+
+
+def load_pca(path=PCA_PATH):
+    """Corpus-trained PCA matrix, or None when disabled / not built."""
+    if not USE_PCA or not os.path.exists(path):
+        return None
+    return faiss.read_VectorTransform(path)
+
+
+def build_index(vectors, kind=QUANTIZATION, metric="l2", pca=None, sample=TRAIN_SAMPLE):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = make_index(vectors.shape[1], kind, metric, pca)
+    if not index.is_trained:
+        index.train(vectors[:sample])
+    index.add(vectors)
+    return index
+
+
+def bytes_per_vector(index):
+    """Serialized size per stored vector (includes amortized PCA / quantizer tables)."""
+    return len(faiss.serialize_index(index)) / max(index.ntotal, 1)
+
+
+class RerankIndex:
+    """
+    Compressed index for candidate generation + full-precision vectors
+    (usually a read-only np.memmap on disk) for exact re-scoring of the
+    top k * factor candidates. Exposes the faiss search() signature.
+    """
+
+    def __init__(self, index, vectors, factor=RERANK_FACTOR, metric="ip"):
+        self.index = index
+        self.vectors = vectors
+        self.factor = factor
+        self.metric = metric
+
+    def __getattr__(self, name):  # ntotal, d, reconstruct, ...
+        return getattr(self.index, name)
+
+    def search(self, queries, k, params=None):
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        kk = min(k * self.factor, self.index.ntotal)
+        if params is not None:
+            _, I = self.index.search(queries, kk, params=params)
+        else:
+            _, I = self.index.search(queries, kk)
+
+        D_out = np.full((len(queries), k), -np.inf if self.metric == "ip" else np.inf, dtype="float32")
+        I_out = np.full((len(queries), k), -1, dtype="int64")
+        for q, cand in enumerate(I):
+            cand = np.sort(cand[cand >= 0])  # sorted reads are friendlier to the memmap
+            if not len(cand):
+                continue
+            full = np.asarray(self.vectors[cand], dtype="float32")
+            if self.metric == "ip":
+                scores = full @ queries[q]
+                order = np.argsort(-scores)[:k]
+            else:
+                scores = ((full - queries[q]) ** 2).sum(axis=1)
+                order = np.argsort(scores)[:k]
+            D_out[q, :len(order)] = scores[order]
+            I_out[q, :len(order)] = cand[order]
+        return D_out, I_out
+
+
+def recall_at_k(exact, approx, queries, k=10):
+    _, I_true = exact.search(queries, k)
+    _, I = approx.search(queries, k)
+    hits = sum(len(set(t[t >= 0]) & set(a[a >= 0])) for t, a in zip(I_true, I))
+    return hits / (len(queries) * k)
+
+
+def compression_report(vectors, kinds=("flat", "fp16", "int8"), pca_dims=(None,), metric="ip",
+                       k=10, n_queries=500, rerank_factor=RERANK_FACTOR):
+    """
+    Memory per vector and recall@k against the exact float32 index for
+    each storage option, with and without full-precision re-ranking.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    exact = build_index(vectors, "flat", metric)
+
+    rows = []
+    for pca_dim in pca_dims:
+        pca = train_pca(vectors, pca_dim) if pca_dim else None
+        for kind in kinds:
+            if kind == "flat" and pca is None:
+                index = exact
+            else:
+                index = build_index(vectors, kind, metric, pca)
+            t0 = time.perf_counter()
+            recall = recall_at_k(exact, index, queries, k)
+            search_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            rerank = RerankIndex(index, vectors, rerank_factor, metric)
+            rows.append({
+                "config": kind + (f"+pca{pca_dim}" if pca_dim else ""),
+                "bytes_per_vector": round(bytes_per_vector(index), 1),
+                f"recall@{k}": round(recall, 4),
+                f"recall@{k}_rerank": round(recall_at_k(exact, rerank, queries, k), 4),
+                "search_ms_per_query": round(search_ms, 3),
+            })
+    return rows
+
+
+def print_report(rows):
+    keys = list(rows[0].keys())
+    print(" | ".join(f"{k:>20}" for k in keys))
+    for r in rows:
+        print(" | ".join(f"{str(r[k]):>20}" for k in keys))
@@ -1,6 +1,8 @@
 import re
 import numpy as np
 
+from utils.segmenter import heading
+
 # Rule-based checker
 def run_document_verifier_rules(text: str):
     checks = {
@@ -13,35 +15,86 @@ def run_document_verifier_rules(text: str):
     return checks, score
 
 
-# Main verifier — uses precomputed chunks & FAISS index
-def run_document_verifier(doc_text, doc_chunks, doc_index, faiss_docs, top_k=3):
-    rules, sufficiency_score = run_document_verifier_rules(doc_text)
+VERIFY_BATCH = 64  # chunks searched per FAISS call
 
-    chunk_results = []
-    for i, chunk in enumerate(doc_chunks):
-        try:
-            # Find nearest neighbors from prebuilt FAISS index
-            emb = np.array([doc_index.reconstruct(i)], dtype="float32")
-            D, I = doc_index.search(emb, top_k)
-
-            similar_cases = []
-            for idx, score in zip(I[0], D[0]):
-                if 0 <= idx < len(faiss_docs["ids"]):
-                    doc_meta = {
-                        "id": faiss_docs["ids"][idx],
-                        "summary": faiss_docs["texts"][idx][:300] + "...",
-                        "similarity_score": float(score)
-                    }
-                    similar_cases.append(doc_meta)
 
+def _similar_cases(idx_row, score_row, faiss_docs):
+    similar_cases = []
+    for idx, score in zip(idx_row, score_row):
+        if 0 <= idx < len(faiss_docs["ids"]):
+            similar_cases.append({
+                "id": faiss_docs["ids"][idx],
+                "summary": faiss_docs["texts"][idx][:300] + "...",
+                "similarity_score": float(score)
+            })
+    return similar_cases
+
+
+def iter_chunk_results(doc_chunks, doc_index, faiss_docs, top_k=3, doc_segments=None, start=0, stop=None,
+                       batch_size=VERIFY_BATCH, known=None):
+    """
+    Per-chunk verifier results for chunks [start, stop), computed one batch
+    of chunks at a time (one FAISS search per batch), so results can be
+    streamed while later batches are still being searched.
+    known: {chunk index: similar_cases} already found (e.g. unchanged
+    chunks of a previous version); only the other chunks are searched.
+    """
+    known = known or {}
+    stop = len(doc_chunks) if stop is None else min(stop, len(doc_chunks))
+    for batch_start in range(start, stop, batch_size):
+        n = min(batch_size, stop - batch_start)
+        todo = [i for i in range(batch_start, batch_start + n) if i not in known]
+        cases = {}
+        try:
+            if todo:
+                # Nearest neighbours of the chunks' own vectors from the prebuilt FAISS index
+                if len(todo) == n:
+                    embs = doc_index.reconstruct_n(batch_start, n)
+                else:
+                    embs = np.vstack([doc_index.reconstruct(i) for i in todo])
+                D, I = doc_index.search(np.asarray(embs, dtype="float32"), top_k)
+                cases.update((i, _similar_cases(I[j], D[j], faiss_docs)) for j, i in enumerate(todo))
         except Exception:
-            similar_cases = []
+            pass
 
-        chunk_results.append({
-            "chunk_index": i,
-            "chunk_preview": chunk[:100] + "...",
-            "similar_cases": similar_cases
-        })
+        for i in range(batch_start, batch_start + n):
+            result = {
+                "chunk_index": i,
+                "chunk_preview": doc_chunks[i][:100] + "...",
+                "similar_cases": cases[i] if i in cases else known.get(i, [])
+            }
+            if doc_segments:
+                # Clause-level results: report which clause was checked and where it is
+                seg = doc_segments[i]
+                result.update(heading=heading(seg), kind=seg["kind"], start=seg["start"], end=seg["end"])
+            yield result
+
+
+def select_fields(result, fields):
+    """
+    Keep only the requested fields of a chunk result (chunk_index is always kept).
+    Nested fields of the similar cases are named like "similar_cases.id".
+    """
+    if not fields:
+        return result
+    out = {"chunk_index": result["chunk_index"]}
+    nested = {}
+    for field in fields:
+        name, _, inner = field.partition(".")
+        if inner:
+            nested.setdefault(name, set()).add(inner)
+        elif name in result:
+            out[name] = result[name]
+    for name, inner in nested.items():
+        if isinstance(result.get(name), list):
+            out[name] = [{k: v for k, v in item.items() if k in inner} for item in result[name]]
+    return out
+
+
+# Main verifier — uses precomputed chunks & FAISS index
+def run_document_verifier(doc_text, doc_chunks, doc_index, faiss_docs, top_k=3, doc_segments=None, known=None):
+    rules, sufficiency_score = run_document_verifier_rules(doc_text)
+    chunk_results = list(iter_chunk_results(doc_chunks, doc_index, faiss_docs, top_k, doc_segments, known=known))
 
     return {
         "sufficiency_score": sufficiency_score,
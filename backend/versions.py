@@ -0,0 +1,67 @@
+import hashlib
+from difflib import SequenceMatcher
+import numpy as np
+
+from utils.segmenter import heading
+
+# ========== CONFIG ==========
+MAX_REPORTED_CHANGES = 200   # changed regions listed per version (counts always cover all)
+# ============================
+
+
+def chunk_keys(chunks):
+    """Whitespace-normalized SHA-256 of each chunk: equal keys ⇒ same text ⇒ reusable embedding / results."""
+    return [hashlib.sha256(" ".join(chunk.split()).encode("utf-8")).hexdigest() for chunk in chunks]
+
+
+def _clause(segments, i):
+    seg = segments[i] if segments else None
+    return {"chunk_index": i, "heading": heading(seg) if seg else None}
+
+
+def diff_versions(old_keys, new_keys, old_segments=None, new_segments=None):
+    """
+    Clause-level diff of two versions from their chunk keys:
+    {"unchanged", "modified", "added", "removed", "changes": [{"op", "old", "new"}]}
+    where old / new list the affected clauses (chunk index + heading path).
+    """
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    counts = {"unchanged": 0, "modified": 0, "added": 0, "removed": 0}
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            counts["unchanged"] += i2 - i1
+            continue
+        op = {"replace": "modified", "insert": "added", "delete": "removed"}[tag]
+        counts[op] += max(i2 - i1, j2 - j1)
+        if len(changes) < MAX_REPORTED_CHANGES:
+            changes.append({"op": op,
+                            "old": [_clause(old_segments, i) for i in range(i1, i2)],
+                            "new": [_clause(new_segments, j) for j in range(j1, j2)]})
+    return {**counts, "changes": changes}
+
+
+def reuse_embeddings(old_keys, old_embeddings, new_keys):
+    """
+    Embedding rows for new_keys copied from the previous version where the
+    chunk text is unchanged. Returns (embeddings or None, indexes still to embed).
+    """
+    rows = {key: i for i, key in enumerate(old_keys)}
+    missing = [j for j, key in enumerate(new_keys) if key not in rows]
+    if old_embeddings is None or len(missing) == len(new_keys):
+        return None, missing
+    out = np.zeros((len(new_keys), old_embeddings.shape[1]), dtype="float32")
+    for j, key in enumerate(new_keys):
+        if key in rows:
+            out[j] = old_embeddings[rows[key]]
+    return out, missing
+
+
+def reuse_results(old_keys, old_chunk_results, new_keys):
+    """{new chunk index: similar_cases} from a previous verifier run, for unchanged chunks."""
+    by_key = {}
+    for result in old_chunk_results:
+        i = result["chunk_index"]
+        if i < len(old_keys):
+            by_key[old_keys[i]] = result["similar_cases"]
+    return {j: by_key[key] for j, key in enumerate(new_keys) if key in by_key}
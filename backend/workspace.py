@@ -0,0 +1,215 @@
+import threading
+import numpy as np
+import faiss
+
+from utils.vector_index import make_index, load_pca, TRAIN_SAMPLE
+from utils.segmenter import heading
+
+# Each chunk id packs (document number, chunk index) into one int64:
+# the high 32 bits identify the document, the low 32 bits the chunk.
+# Filtering / removing a whole document is then a single id range.
+CHUNK_BITS = 32
+
+# ========== CONFIG ==========
+RETRAIN_GROWTH = 2   # int8 ranges are retrained each time the workspace grows this many times over
+# ============================
+
+
+def _chunk_id(doc_num, chunk_index):
+    return (doc_num << CHUNK_BITS) | chunk_index
+
+
+def _split_id(chunk_id):
+    return chunk_id >> CHUNK_BITS, chunk_id & ((1 << CHUNK_BITS) - 1)
+
+
+class WorkspaceIndex:
+    """
+    One FAISS index holding the chunks of every uploaded document.
+    Documents are added / removed incrementally (no rebuild) and searches
+    can be restricted to a subset of documents.
+    """
+
+    def __init__(self):
+        self.index = None          # faiss.IndexIDMap2, created on first add
+        self.docs = {}             # doc_id -> {"num", "filename", "chunks", "segments", "embeddings"}
+        self._num_to_doc = {}
+        self._next_num = 1
+        self._trained_on = 0       # vectors held when the int8 ranges were last trained (0: nothing to train)
+        self._lock = threading.RLock()
+
+    def __contains__(self, doc_id):
+        return doc_id in self.docs
+
+    @property
+    def ntotal(self):
+        return 0 if self.index is None else self.index.ntotal
+
+    def add_document(self, doc_id, chunks, embeddings, filename=None, segments=None):
+        """
+        Add (or replace) a document's chunk embeddings. segments: optional
+        clause metadata per chunk (heading path, kind, offsets).
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        with self._lock:
+            if doc_id in self.docs:
+                self.remove_document(doc_id)
+            if self.index is None:
+                # Storage type follows VECTOR_QUANTIZATION / VECTOR_USE_PCA
+                self.index = self._new_index(embeddings)
+
+            num = self._next_num
+            self._next_num += 1
+            self.index.add_with_ids(embeddings, self._ids(num, len(chunks)))
+
+            self.docs[doc_id] = {
+                "num": num,
+                "filename": filename,
+                "chunks": chunks,
+                "segments": segments,
+                "embeddings": embeddings,
+            }
+            self._num_to_doc[num] = doc_id
+            if self._trained_on and self.index.ntotal >= RETRAIN_GROWTH * self._trained_on:
+                self._retrain()
+
+    @staticmethod
+    def _ids(num, count):
+        return np.array([_chunk_id(num, i) for i in range(count)], dtype="int64")
+
+    def _new_index(self, train_vectors):
+        base = make_index(train_vectors.shape[1], metric="l2", pca=load_pca())
+        self._trained_on = 0
+        if not base.is_trained:
+            base.train(train_vectors[:TRAIN_SAMPLE])
+            self._trained_on = len(train_vectors)
+        return faiss.IndexIDMap2(base)
+
+    def _retrain(self):
+        """
+        Retrain the int8 ranges on every stored vector and re-add them: ranges
+        from the first document alone clip the values of later documents.
+        """
+        docs = list(self.docs.values())
+        index = self._new_index(np.concatenate([d["embeddings"] for d in docs]))
+        for d in docs:
+            index.add_with_ids(d["embeddings"], self._ids(d["num"], len(d["embeddings"])))
+        self.index = index
+
+    def remove_document(self, doc_id):
+        """Remove a document's chunks from the index. Returns False if unknown."""
+        with self._lock:
+            doc = self.docs.pop(doc_id, None)
+            if doc is None:
+                return False
+            num = doc["num"]
+            self.index.remove_ids(faiss.IDSelectorRange(_chunk_id(num, 0), _chunk_id(num + 1, 0)))
+            del self._num_to_doc[num]
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.index = None
+            self._trained_on = 0
+            self.docs.clear()
+            self._num_to_doc.clear()
+
+    def list_documents(self):
+        return [
+            {"doc_id": doc_id, "filename": d["filename"], "chunks": len(d["chunks"])}
+            for doc_id, d in self.docs.items()
+        ]
+
+    def _selector(self, doc_ids):
+        nums = [self.docs[d]["num"] for d in doc_ids if d in self.docs]
+        if len(nums) == 1:
+            return faiss.IDSelectorRange(_chunk_id(nums[0], 0), _chunk_id(nums[0] + 1, 0))
+        ids = np.concatenate([
+            np.array([_chunk_id(n, i) for i in range(len(self.docs[self._num_to_doc[n]]["chunks"]))],
+                     dtype="int64")
+            for n in nums
+        ]) if nums else np.empty(0, dtype="int64")
+        return faiss.IDSelectorBatch(ids)
+
+    def search(self, query_embeddings, k=5, doc_ids=None):
+        """
+        Batched search over the workspace.
+        query_embeddings: (n, dim) array. doc_ids: optional list restricting the search.
+        Returns one list of hits per query.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(query_embeddings), dtype="float32")
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(queries))]
+            if doc_ids is not None:
+                selector = self._selector(doc_ids)
+                params = faiss.SearchParameters(sel=selector)
+                D, I = self.index.search(queries, k, params=params)
+            else:
+                D, I = self.index.search(queries, k)
+
+            results = []
+            for dists, ids in zip(D, I):
+                hits = []
+                for dist, chunk_id in zip(dists, ids):
+                    if chunk_id < 0:
+                        continue
+                    num, chunk_index = _split_id(int(chunk_id))
+                    doc_id = self._num_to_doc[num]
+                    hit = {
+                        "doc_id": doc_id,
+                        "chunk_index": chunk_index,
+                        "score": float(dist),
+                        "text": self.docs[doc_id]["chunks"][chunk_index],
+                    }
+                    hit.update(self._clause_info(self.docs[doc_id]["segments"], chunk_index))
+                    hits.append(hit)
+                results.append(hits)
+            return results
+
+    @staticmethod
+    def _clause_info(segments, chunk_index):
+        if not segments:
+            return {}
+        seg = segments[chunk_index]
+        return {"heading": heading(seg), "kind": seg["kind"], "start": seg["start"], "end": seg["end"]}
+
+    def compare(self, doc_id, other_doc_ids=None, k=1):
+        """
+        Align every chunk of doc_id with its closest chunks in the other
+        documents, using a single batched search.
+        """
+        with self._lock:
+            if doc_id not in self.docs:
+                raise KeyError(doc_id)
+            if other_doc_ids is None:
+                other_doc_ids = [d for d in self.docs if d != doc_id]
+            other_doc_ids = [d for d in other_doc_ids if d != doc_id and d in self.docs]
+            doc = self.docs[doc_id]
+            if not other_doc_ids:
+                matches = [[] for _ in doc["chunks"]]
+            else:
+                # Over-fetch so every other document is likely to get its k matches
+                candidates = sum(len(self.docs[d]["chunks"]) for d in other_doc_ids)
+                k_fetch = min(candidates, max(k * len(other_doc_ids) * 4, 64))
+                matches = self.search(doc["embeddings"], k=k_fetch, doc_ids=other_doc_ids)
+
+        aligned = []
+        for i, (chunk, hits) in enumerate(zip(doc["chunks"], matches)):
+            best = {}
+            for hit in hits:  # keep the top-k matches per other document
+                best.setdefault(hit["doc_id"], [])
+                if len(best[hit["doc_id"]]) < k:
+                    best[hit["doc_id"]].append({
+                        "chunk_index": hit["chunk_index"],
+                        "heading": hit.get("heading"),
+                        "score": hit["score"],
+                        "preview": hit["text"][:200] + "...",
+                    })
+            aligned.append({
+                "chunk_index": i,
+                "chunk_preview": chunk[:200] + "...",
+                "matches": best,
+                **self._clause_info(doc["segments"], i),
+            })
+        return aligned
@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
 import os
+import time
+import uuid
+import json
 
 st.set_page_config(
     page_title="Levi Legal AI Assistant",
@@ -15,6 +18,99 @@ st.subheader("Upload, Analyze & Understand Legal Documents Easily")
 # API URL from environment (fallback to localhost)
 # -----------------------------
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+CONNECT_TIMEOUT = 5        # seconds
+READ_TIMEOUT = 120         # long enough for a chat answer (LLM timeout + retries)
+POLL_INTERVAL = 1.5        # seconds between verifier / briefings status checks
+POLL_TIMEOUT = 600
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+VERIFIER_PAGE_SIZE = 50    # chunk results per "Show more"
+
+
+class NotReady(Exception):
+    """The backend is still computing this result."""
+
+
+@st.cache_resource
+def get_session():
+    """One keep-alive connection pool shared by every rerun and browser tab."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def api(method, path, timeout=READ_TIMEOUT, **kwargs):
+    return get_session().request(method, f"{API_URL}{path}", timeout=(CONNECT_TIMEOUT, timeout), **kwargs)
+
+
+def _multipart_stream(uploaded_file, boundary):
+    """multipart/form-data body for /upload, yielded in chunks instead of built in memory."""
+    filename = uploaded_file.name.replace('"', "%22")
+    yield (f"--{boundary}\r\n"
+           f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+           f"Content-Type: {uploaded_file.type or 'application/octet-stream'}\r\n\r\n").encode("utf-8")
+    uploaded_file.seek(0)
+    while True:
+        block = uploaded_file.read(UPLOAD_CHUNK_SIZE)
+        if not block:
+            break
+        yield block
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+
+def upload(uploaded_file):
+    boundary = uuid.uuid4().hex
+    response = api("POST", "/upload", data=_multipart_stream(uploaded_file, boundary),
+                   headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def fetch_result(doc_id, name):
+    """
+    Verifier / briefings result of a document, cached per doc_id. Raises
+    NotReady while the backend is still computing (exceptions are not cached).
+    """
+    response = api("GET", f"/{name}", timeout=30, params={"wait": "false"})
+    if response.status_code == 202:
+        raise NotReady(name)
+    response.raise_for_status()
+    return response.json()
+
+
+def poll_result(doc_id, name, label):
+    """Poll until the result is ready, showing progress instead of one long blocking request."""
+    try:
+        return fetch_result(doc_id, name)
+    except NotReady:
+        pass
+    start = time.monotonic()
+    with st.status(label, expanded=False) as status:
+        while time.monotonic() - start < POLL_TIMEOUT:
+            time.sleep(POLL_INTERVAL)
+            try:
+                result = fetch_result(doc_id, name)
+            except NotReady:
+                status.update(label=f"{label} ({time.monotonic() - start:.0f}s)")
+                continue
+            status.update(label=f"{label} done", state="complete")
+            return result
+        status.update(label=f"{label} timed out", state="error")
+    raise TimeoutError(f"{name} did not finish within {POLL_TIMEOUT}s")
+
+
+def stream_lines(path, **params):
+    """Parsed lines of an NDJSON endpoint, as the backend writes them."""
+    with api("GET", path, params=params, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+doc_id = st.session_state.get("doc_id")
 
 # -----------------------------
 # Sidebar: Global Reset Button
@@ -22,9 +118,14 @@ API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
 st.sidebar.header("Controls")
 if st.sidebar.button("🔄 Reset System"):
     try:
-        res = requests.post(f"{API_URL}/reset")
+        res = api("POST", "/reset", timeout=30)
         if res.status_code == 200:
             st.sidebar.success(res.json().get("message", "System reset successfully!"))
+            fetch_result.clear()
+            for key in ("doc_id", "upload_result", "uploaded_key", "requested", "verifier_limit", "chat_session",
+                        "last_answer"):
+                st.session_state.pop(key, None)
+            doc_id = None
         else:
             st.sidebar.error("Failed to reset system")
     except Exception as e:
@@ -39,6 +140,9 @@ mode = st.sidebar.radio(
     ["Upload Document", "Chat / QA", "Document Verifier", "Briefings"]
 )
 
+# Results the user asked for; shown again from cache when switching modes
+requested = st.session_state.setdefault("requested", set())
+
 # -----------------------------
 # Upload Document
 # -----------------------------
@@ -49,21 +153,31 @@ if mode == "Upload Document":
         type=["pdf", "docx", "txt", "jpg", "jpeg", "png"]
     )
     if uploaded_file:
-        with st.spinner("Uploading document..."):
-            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-            try:
-                response = requests.post(f"{API_URL}/upload", files=files)
-                result = response.json()
-                st.success(result.get("message", "File uploaded successfully!"))
-                st.info(f"Chunks: {result.get('chunks')}, Word count: {result.get('word_count')}")
-            except Exception as e:
-                st.error(f"⚠️ Upload failed: {e}")
+        # The uploader keeps the file across reruns; only send it once
+        key = (uploaded_file.name, uploaded_file.size)
+        if st.session_state.get("uploaded_key") != key:
+            with st.spinner("Uploading document..."):
+                try:
+                    result = upload(uploaded_file)
+                    st.session_state["upload_result"] = result
+                    st.session_state["uploaded_key"] = key
+                    st.session_state["doc_id"] = doc_id = result.get("doc_id")
+                    st.session_state.pop("verifier_limit", None)
+                    st.session_state.pop("chat_session", None)  # a new document starts a new conversation
+                except Exception as e:
+                    st.error(f"⚠️ Upload failed: {e}")
+        result = st.session_state.get("upload_result")
+        if result:
+            st.success(result.get("message", "File uploaded successfully!"))
+            st.info(f"Chunks: {result.get('chunks')}, Word count: {result.get('word_count')}")
 
 # -----------------------------
 # Chat / QA
 # -----------------------------
 elif mode == "Chat / QA":
     st.header("💬 Ask Questions About Your Document")
+    # The backend remembers the conversation per session (follow-up questions)
+    chat_session = st.session_state.setdefault("chat_session", uuid.uuid4().hex)
     query = st.text_area("Enter your question", height=100)
     if st.button("Ask"):
         if not query.strip():
@@ -71,39 +185,62 @@ elif mode == "Chat / QA":
         else:
             with st.spinner("Generating answer..."):
                 try:
-                    response = requests.post(f"{API_URL}/chat", params={"query": query})
+                    response = api("POST", "/chat", params={"query": query, "session_id": chat_session})
                     answer = response.json().get("answer")
-                    st.markdown(f"**Answer:**\n\n{answer}")
+                    st.session_state["last_answer"] = answer
                 except Exception as e:
                     st.error(f"⚠️ Error connecting to API: {e}")
+    if st.button("🧹 New conversation"):
+        st.session_state["chat_session"] = uuid.uuid4().hex
+        st.session_state.pop("last_answer", None)
+    if st.session_state.get("last_answer"):
+        st.markdown(f"**Answer:**\n\n{st.session_state['last_answer']}")
 
 # -----------------------------
 # Document Verifier
 # -----------------------------
 elif mode == "Document Verifier":
     st.header("📝 Document Verifier")
-    if st.button("Run Verifier"):
-        with st.spinner("Analyzing document..."):
-            try:
-                response = requests.get(f"{API_URL}/verifier")
-                result = response.json()
-                st.json(result)
-            except Exception as e:
-                st.error(f"⚠️ Error connecting to API: {e}")
+    if st.button("Run Verifier") and doc_id:
+        requested.add((doc_id, "verifier"))
+    if not doc_id:
+        st.info("Upload a document first.")
+    elif (doc_id, "verifier") in requested:
+        summaries = st.checkbox("Show case summaries", value=False)
+        limit = st.session_state.setdefault("verifier_limit", VERIFIER_PAGE_SIZE)
+        fields = None if summaries else "chunk_preview,heading,kind,similar_cases.id,similar_cases.similarity_score"
+        try:
+            # Rules first, then chunk results as each batch is searched
+            next_offset = None
+            for line in stream_lines("/verifier/stream", limit=limit, fields=fields):
+                if line["type"] == "rules":
+                    st.metric("Sufficiency score", line["sufficiency_score"])
+                    st.json(line["rule_checklist"])
+                    st.caption(f"{line['chunks']} chunks")
+                elif line["type"] == "chunk":
+                    st.json(line, expanded=False)
+                else:
+                    next_offset = line["next"]
+            if next_offset is not None and st.button("Show more"):
+                st.session_state["verifier_limit"] = limit + VERIFIER_PAGE_SIZE
+                st.rerun()
+        except Exception as e:
+            st.error(f"⚠️ Error connecting to API: {e}")
 
 # -----------------------------
 # Briefings
 # -----------------------------
 elif mode == "Briefings":
     st.header("📑 Generate Document Briefings")
-    if st.button("Generate Briefings"):
-        with st.spinner("Generating briefings..."):
-            try:
-                response = requests.get(f"{API_URL}/briefings")
-                briefings = response.json().get("briefings")
-                st.json(briefings)
-            except Exception as e:
-                st.error(f"⚠️ Error connecting to API: {e}")
+    if st.button("Generate Briefings") and doc_id:
+        requested.add((doc_id, "briefings"))
+    if not doc_id:
+        st.info("Upload a document first.")
+    elif (doc_id, "briefings") in requested:
+        try:
+            st.json(poll_result(doc_id, "briefings", "Generating briefings...").get("briefings"))
+        except Exception as e:
+            st.error(f"⚠️ Error connecting to API: {e}")
 
 # -----------------------------
 # Footer